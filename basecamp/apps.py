@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class BasecampConfig(AppConfig):
     name = 'basecamp'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+        from .db import apply_pragmas, check_connections
+        from .instrumentation import install_query_recorder
+
+        connection_created.connect(apply_pragmas, dispatch_uid='basecamp.db.apply_pragmas')
+        connection_created.connect(install_query_recorder, dispatch_uid='basecamp.instrumentation.install_query_recorder')
+        request_started.connect(check_connections, dispatch_uid='basecamp.db.check_connections')
@@ -0,0 +1,27 @@
+from django.db import connections
+
+# DATABASES 의 연결별 설정을 연결이 만들어질 때 / 요청이 시작될 때 적용한다. (BasecampConfig.ready 에서 등록)
+#
+#   'PRAGMAS': SQLite 연결마다 실행할 PRAGMA (순서대로 실행한다)
+#   'CONN_HEALTH_CHECKS': CONN_MAX_AGE 로 재사용하는 연결을 요청 시작 때 확인하고 끊어졌으면 닫는다.
+#                         (Django 4.1 의 같은 이름 설정과 같은 역할)
+#                         SQLite 는 파일을 여는 것이라 끊어질 일이 없으므로 is_usable() 이 항상 True 이고 아무것도 하지 않는다.
+#                         PostgreSQL / MySQL 로 바꿨을 때를 위한 설정이다.
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+
+    pragmas = connection.settings_dict.get('PRAGMAS') or {}
+    # connection.cursor() 를 쓰면 쿼리 로그 / assertNumQueries 에 잡히므로 sqlite3 연결에 바로 실행한다.
+    for name, value in pragmas.items():
+        connection.connection.execute('PRAGMA {} = {}'.format(name, value))
+
+
+def check_connections(**kwargs):
+    for connection in connections.all():
+        if connection.connection is None or not connection.settings_dict.get('CONN_HEALTH_CHECKS'):
+            continue
+        if not connection.is_usable():
+            connection.close()
@@ -0,0 +1,116 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# 요청 하나에서 쓴 시간을 DB 쿼리 / Markdown 렌더링 / 템플릿 렌더링으로 나눠서 모은다.
+# RequestTimingMiddleware 가 요청마다 RequestTimings 를 만들고, 응답에 Server-Timing 헤더와 로그로 남긴다.
+# async view 가 다른 thread 에서 실행한 쿼리도 같은 요청으로 모이도록 ContextVar 를 쓴다.
+
+logger = logging.getLogger('basecamp.timing')
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.query_count = 0
+        self.durations = Counter()
+        self.query_keys = Counter()
+        self.query_sql = {}
+
+    def add(self, name, duration):
+        with self.lock:
+            self.durations[name] += duration
+
+    def add_query(self, alias, sql, params, many, duration):
+        # 같은 DB 에 같은 SQL, 같은 인자로 두 번 이상 보낸 쿼리를 중복으로 본다.
+        key = (alias, sql, repr(params), many)
+        with self.lock:
+            self.query_count += 1
+            self.durations['db'] += duration
+            self.query_keys[key] += 1
+            self.query_sql[key] = sql
+
+    def get_duplicate_queries(self):
+        return [(self.query_sql[key], count) for key, count in self.query_keys.items() if count > 1]
+
+    def get_server_timing(self, total):
+        duplicates = sum(count - 1 for sql, count in self.get_duplicate_queries())
+        metrics = ['db;dur={:.1f};desc="{} queries, {} duplicate"'.format(
+            self.durations['db'] * 1000, self.query_count, duplicates
+        )]
+        for name in ('markdown', 'template'):
+            if name in self.durations:
+                metrics.append('{};dur={:.1f}'.format(name, self.durations[name] * 1000))
+        metrics.append('total;dur={:.1f}'.format(total * 1000))
+        return ', '.join(metrics)
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(context['connection'].alias, sql, params, many, time.perf_counter() - start)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # connection_created 는 같은 연결 객체가 다시 연결할 때마다 오므로 한 번만 넣는다.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def timer(name):
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view = getattr(match.func, 'view_class', match.func)
+    return '{}.{}'.format(view.__module__, view.__qualname__)
+
+
+def log_timings(request, response, timings, total):
+    view_name = get_view_name(request)
+    logger.info(json.dumps({
+        'event': 'request_timing',
+        'method': request.method,
+        'path': request.path,
+        'view': view_name,
+        'status': response.status_code,
+        'total_ms': round(total * 1000, 2),
+        'db_ms': round(timings.durations['db'] * 1000, 2),
+        'queries': timings.query_count,
+        'markdown_ms': round(timings.durations['markdown'] * 1000, 2),
+        'template_ms': round(timings.durations['template'] * 1000, 2),
+    }, ensure_ascii=False))
+
+    duplicates = timings.get_duplicate_queries()
+    if duplicates:
+        logger.warning(json.dumps({
+            'event': 'duplicate_queries',
+            'path': request.path,
+            'view': view_name,
+            'queries': [{'sql': sql, 'count': count} for sql, count in duplicates],
+        }, ensure_ascii=False))
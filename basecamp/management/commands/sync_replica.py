@@ -0,0 +1,27 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = '로컬 개발용: default SQLite DB 를 복제본(replica) 파일로 복사합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='replica')
+
+    def handle(self, *args, **options):
+        primary = connections['default']
+        replica = connections[options['database']]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('sync_replica 는 SQLite 끼리만 복사할 수 있습니다. 실제 복제본은 DB 의 복제 기능을 쓰세요.')
+
+        replica.close()
+        primary.ensure_connection()
+        # 온라인 backup API 는 다른 연결이 쓰는 중이어도 일관된 사본을 만든다.
+        target = sqlite3.connect(str(replica.settings_dict['NAME']))
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
+        self.stdout.write('{} -> {}'.format(primary.settings_dict['NAME'], replica.settings_dict['NAME']))
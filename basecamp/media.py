@@ -0,0 +1,188 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, FileResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+# MEDIA_ROOT 의 업로드 파일과 STATIC_ROOT 의 정적 파일을 내려준다.
+# 업로드 파일은 MEDIA_SENDFILE_BACKEND 가 설정되어 있으면 파일 전송은 앞단(nginx, apache)에 넘기고,
+# 아니면 FileResponse(wsgi.file_wrapper -> sendfile)로 보내며 Range / 조건부 요청을 처리한다.
+
+CHUNK_SIZE = 64 * 1024
+
+# 날짜별 폴더에 올라간 파일과 해시 경로의 축소본은 같은 이름으로 내용이 바뀌지 않는다.
+IMMUTABLE_PATH_RE = re.compile(
+    r'^(blog/\d{4}/\d{2}-\d{2}/|markdownx/\d{4}/\d{2}/\d{2}/|renditions/[0-9a-f]{2}/[0-9a-f]{40}/)'
+)
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# ManifestStaticFilesStorage 가 붙이는 12자리 해시 (ex: bootstrap.3f2a1b9c0d4e.css)
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^/]+$')
+PRECOMPRESSED_VARIANTS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def get_cache_control(path):
+    if IMMUTABLE_PATH_RE.match(path):
+        return IMMUTABLE_CACHE_CONTROL
+    return DEFAULT_CACHE_CONTROL
+
+
+def parse_range(header, size):
+    """
+    'bytes=start-end' 형식의 단일 range 만 처리한다. (여러 range 는 전체 파일로 응답)
+    (start, end) 를 돌려주고, 만족할 수 없는 range 면 ValueError 를 낸다.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    start, end = match.groups()
+    if start == '':
+        # bytes=-500 => 마지막 500 바이트
+        length = int(end)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def iter_file_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def stat_file(root, path):
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404('"{}" does not exist'.format(path))
+
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('"{}" does not exist'.format(path))
+    if not os.path.isfile(full_path):
+        raise Http404('"{}" does not exist'.format(path))
+    return full_path, stat
+
+
+def serve_file(request, full_path, stat, cache_control, content_type, accel_path=None):
+    last_modified = int(stat.st_mtime)
+    etag = quote_etag('{:x}-{:x}'.format(stat.st_mtime_ns, stat.st_size))
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+    backend = getattr(settings, 'MEDIA_SENDFILE_BACKEND', None) if accel_path else None
+    if backend == 'x-accel-redirect':
+        # nginx: location /_media/ { internal; alias <MEDIA_ROOT>/; }
+        # 한글 파일 이름을 그대로 넣으면 Django 가 헤더를 MIME 인코딩(=?utf-8?b?...?=)해서 nginx 가 찾지 못한다.
+        # 퍼센트 인코딩해서 넘기면 nginx / mod_xsendfile 이 디코딩한다.
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/_media/') + quote(accel_path)
+    elif backend == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = quote(full_path)
+    else:
+        response = None
+        range_header = request.META.get('HTTP_RANGE')
+        if range_header and if_range_matches(request, etag, last_modified):
+            try:
+                byte_range = parse_range(range_header, stat.st_size)
+            except ValueError:
+                response = HttpResponse(status=416, content_type=content_type)
+                response['Content-Range'] = 'bytes */{}'.format(stat.st_size)
+                return response
+
+            if byte_range is not None:
+                start, end = byte_range
+                length = end - start + 1
+                response = StreamingHttpResponse(
+                    iter_file_range(full_path, start, length), status=206, content_type=content_type
+                )
+                response['Content-Length'] = str(length)
+                response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, stat.st_size)
+
+        if response is None:
+            # 전체 파일은 FileResponse 로 보내서 서버가 wsgi.file_wrapper(sendfile)를 쓸 수 있게 한다.
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+            response['Content-Length'] = str(stat.st_size)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    full_path, stat = stat_file(settings.MEDIA_ROOT, path)
+    content_type, encoding = mimetypes.guess_type(full_path)
+    response = serve_file(
+        request, full_path, stat, get_cache_control(path), content_type or 'application/octet-stream', accel_path=path
+    )
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+@require_safe
+def serve_static(request, path):
+    """
+    collectstatic 으로 STATIC_ROOT 에 모인 파일을 내려준다.
+    Accept-Encoding 에 따라 미리 압축해 둔 .br / .gz 를 고른다. (basecamp.storage 참고)
+    """
+    full_path, stat = stat_file(settings.STATIC_ROOT, path)
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    content_encoding = None
+    if encoding is None:
+        for name, ext in PRECOMPRESSED_VARIANTS:
+            if re.search(r'\b{}\b'.format(name), accept_encoding) and os.path.isfile(full_path + ext):
+                full_path, stat = stat_file(settings.STATIC_ROOT, path + ext)
+                content_encoding = name
+                break
+
+    # 내용 해시가 붙은 파일명은 내용이 바뀌면 이름도 바뀐다.
+    cache_control = IMMUTABLE_CACHE_CONTROL if HASHED_NAME_RE.search(path) else DEFAULT_CACHE_CONTROL
+    response = serve_file(request, full_path, stat, cache_control, content_type)
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
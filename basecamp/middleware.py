@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+from django.conf import settings
+
+from .instrumentation import RequestTimings, current_timings, log_timings
+from .routers import RoutingState, routing_state, is_replica_view, choose_replica, get_primary_pin_seconds, PRIMARY_PIN_COOKIE
+
+
+class ReplicaRoutingMiddleware:
+    """
+    basecamp.routers.PrimaryReplicaRouter 가 볼 요청별 상태를 만든다.
+    쓰기가 있었던 요청이면 DATABASE_PRIMARY_PIN_SECONDS 동안 default 에서 읽도록 쿠키를 붙인다.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        state = RoutingState()
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        return self.pin_primary(state, response)
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        return self.pin_primary(state, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = routing_state.get()
+        if state is not None and not state.wrote and is_replica_view(view_func):
+            state.replica = choose_replica(request)
+
+    def pin_primary(self, state, response):
+        if state.wrote and get_primary_pin_seconds() > 0:
+            response.set_cookie(PRIMARY_PIN_COOKIE, '1', max_age=get_primary_pin_seconds(), httponly=True, samesite='Lax')
+        return response
+
+
+class RequestTimingMiddleware:
+    """
+    요청마다 쿼리 수, DB 시간, 중복 쿼리, Markdown / 템플릿 렌더링 시간을 재서
+    Server-Timing 헤더(REQUEST_TIMING_HEADER)와 'basecamp.timing' 로그로 남긴다.
+    MIDDLEWARE 의 맨 앞에 두어야 page cache 적중까지 포함한 전체 시간을 잰다.
+    템플릿 시간은 TemplateResponse(class view)만 따로 재고, render() 를 부르는 함수 view 는 전체 시간에 포함된다.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    def process_template_response(self, request, response):
+        # 가장 바깥 middleware 이므로 이 다음이 바로 response.render() 다.
+        timings = current_timings.get()
+        if timings is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(lambda response: timings.add('template', time.perf_counter() - start))
+        return response
+
+    def finish(self, request, response, timings, total):
+        if getattr(settings, 'REQUEST_TIMING_HEADER', True):
+            response['Server-Timing'] = timings.get_server_timing(total)
+        log_timings(request, response, timings, total)
+        return response
@@ -0,0 +1,80 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# 목록/상세처럼 읽기만 하는 view 의 blog 쿼리를 읽기 전용 복제본(DATABASE_REPLICAS)으로 보낸다.
+# 요청마다 ReplicaRoutingMiddleware 가 RoutingState 를 만들고, view 가 use_replica 로 표시되어 있을 때만 복제본을 쓴다.
+# 쓰기가 있었던 요청의 응답에는 PRIMARY_PIN_COOKIE 를 붙여서 잠시 동안 그 브라우저의 읽기를 default 로 고정한다.
+
+PRIMARY_PIN_COOKIE = 'primary_pin'
+
+# 복제본에서 읽을 app. 세션/사용자 같은 인증 정보는 복제 지연에 민감하므로 항상 default 에서 읽는다.
+REPLICA_APP_LABELS = ('blog',)
+
+
+class RoutingState:
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+routing_state = ContextVar('routing_state', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def get_primary_pin_seconds():
+    return getattr(settings, 'DATABASE_PRIMARY_PIN_SECONDS', 10)
+
+
+def use_replica(view):
+    """함수 view 를 복제본에서 읽도록 표시한다. (class view 는 use_replica = True 속성을 둔다)"""
+    view.use_replica = True
+    return view
+
+
+def pin_database(queryset):
+    """지금 고른 DB 를 queryset 에 고정한다. (StreamingHttpResponse 처럼 view 가 끝난 뒤에 읽히는 queryset 용)"""
+    return queryset.using(queryset.db)
+
+
+def is_replica_view(view_func):
+    return getattr(getattr(view_func, 'view_class', view_func), 'use_replica', False)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = routing_state.get()
+        if state is None or state.replica is None or model._meta.app_label not in REPLICA_APP_LABELS:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            # 같은 요청 안에서 방금 쓴 내용을 다시 읽을 수 있도록 이후 읽기도 default 에서 한다.
+            state.wrote = True
+            state.replica = None
+        # None 이면 Django 가 default (또는 hints 의 instance 가 있던 DB) 를 쓴다.
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 복제본은 default 와 같은 내용이므로 서로 다른 alias 에서 읽은 객체도 연결할 수 있다.
+        databases = {'default'} | set(get_replicas())
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+def choose_replica(request):
+    replicas = get_replicas()
+    if not replicas or request.method not in ('GET', 'HEAD') or PRIMARY_PIN_COOKIE in request.COOKIES:
+        return None
+    # 요청 하나는 같은 복제본에서 읽는다. (복제본마다 지연이 달라 페이지 안의 내용이 어긋나지 않도록)
+    return random.choice(replicas)
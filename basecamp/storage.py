@@ -0,0 +1,52 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # brotli 가 없으면 .gz 만 만든다.
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml')
+MIN_COMPRESS_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    collectstatic 때 내용 해시가 붙은 파일명(ex: bootstrap.3f2a1b9c0d4e.css)을 만들고,
+    압축할 만한 파일은 .gz / .br 을 미리 만들어 둔다. (요청마다 압축하지 않도록)
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super(CompressedManifestStaticFilesStorage, self).post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        for hashed_name in set(self.hashed_files.values()):
+            compressed = self.compress(hashed_name)
+            if compressed:
+                yield hashed_name, ', '.join(compressed), True
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return []
+
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            content = f.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return []
+
+        # 압축 결과가 원본보다 크면 쓰지 않는다.
+        variants = [(path + '.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((path + '.br', brotli.compress(content, quality=11)))
+
+        written = []
+        for compressed_path, compressed in variants:
+            if len(compressed) < len(content):
+                with open(compressed_path, 'wb') as f:
+                    f.write(compressed)
+                written.append(os.path.basename(compressed_path))
+        return written
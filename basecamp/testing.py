@@ -0,0 +1,27 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# python manage.py test 용 test runner. (settings.TEST_RUNNER)
+# 테스트는 cache.clear() 로 캐시를 비우고 테스트 DB 로 만든 페이지를 캐시에 넣으므로,
+# 작업 디렉터리의 캐시(BASE_DIR/cache) 대신 테스트마다 새로 만든 임시 디렉터리를 쓴다.
+# page cache 는 공유 캐시에서만 켜지므로 LocMemCache 가 아니라 같은 backend 를 그대로 쓴다.
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super(TestRunner, self).setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp(prefix='blog-test-cache-')
+        self.cache_settings = override_settings(CACHES={
+            alias: dict(config, LOCATION=os.path.join(self.cache_dir, alias)) for alias, config in settings.CACHES.items()
+        })
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super(TestRunner, self).teardown_test_environment(**kwargs)
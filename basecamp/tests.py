@@ -1,3 +1,233 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import re
+import tempfile
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, Client, RequestFactory, override_settings
+
+from django.http import HttpResponse
+
+from blog.models import Post, Category
+from blog.rendering import render_markdown
+from blog.search import search_post_ids
+from .middleware import RequestTimingMiddleware
+from .media import serve_static
+from .routers import PRIMARY_PIN_COOKIE
+
+
+class TestMedia(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+
+        os.makedirs(os.path.join(self.media_root.name, 'blog/2021/01-20'))
+        with open(os.path.join(self.media_root.name, 'blog/2021/01-20/photo.jpg'), 'wb') as f:
+            f.write(bytes(range(256)) * 4)
+        with open(os.path.join(self.media_root.name, 'notes.txt'), 'wb') as f:
+            f.write(b'hello world')
+        with open(os.path.join(self.media_root.name, 'blog/2021/01-20/사진 1.jpg'), 'wb') as f:
+            f.write(b'photo')
+
+        settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_full_file(self):
+        response = self.client.get('/media/blog/2021/01-20/photo.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(256)) * 4)
+        self.assertEqual(response['Content-Length'], '1024')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        # 날짜별 업로드 경로는 바뀌지 않으므로 오래 캐시한다.
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get('/media/notes.txt')
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_range(self):
+        response = self.client.get('/media/blog/2021/01-20/photo.jpg', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+
+        response = self.client.get('/media/notes.txt', HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), b'world')
+
+        response = self.client.get('/media/notes.txt', HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_conditional(self):
+        response = self.client.get('/media/notes.txt')
+        response = self.client.get('/media/notes.txt', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_found(self):
+        self.assertEqual(self.client.get('/media/missing.jpg').status_code, 404)
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='x-accel-redirect')
+    def test_accel_redirect(self):
+        response = self.client.get('/media/notes.txt')
+        self.assertEqual(response['X-Accel-Redirect'], '/_media/notes.txt')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='x-accel-redirect')
+    def test_accel_redirect_non_ascii(self):
+        # 헤더가 MIME 인코딩되지 않도록 퍼센트 인코딩해서 넘긴다.
+        response = self.client.get('/media/blog/2021/01-20/사진 1.jpg')
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/_media/blog/2021/01-20/%EC%82%AC%EC%A7%84%201.jpg'
+        )
+
+        with override_settings(MEDIA_SENDFILE_BACKEND='x-sendfile'):
+            response = self.client.get('/media/blog/2021/01-20/사진 1.jpg')
+        self.assertTrue(response['X-Sendfile'].endswith('/blog/2021/01-20/%EC%82%AC%EC%A7%84%201.jpg'))
+        self.assertNotIn('=?utf-8?', response['X-Sendfile'])
+
+
+class TestStaticFiles(TestCase):
+    def setUp(self):
+        self.static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.static_root.cleanup)
+
+        settings_override = override_settings(
+            STATIC_ROOT=self.static_root.name,
+            STATICFILES_STORAGE='basecamp.storage.CompressedManifestStaticFilesStorage',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+        with open(os.path.join(self.static_root.name, 'staticfiles.json')) as f:
+            self.manifest = json.load(f)['paths']
+
+    def test_template_references_in_manifest(self):
+        referenced = set()
+        for app in ('blog', 'basecamp'):
+            template_dir = os.path.join(settings.BASE_DIR, app, 'templates')
+            for dirpath, dirnames, filenames in os.walk(template_dir):
+                for filename in filenames:
+                    with open(os.path.join(dirpath, filename), encoding='utf-8') as f:
+                        referenced.update(re.findall(r"""{%\s*static\s+['"]([^'"]+)['"]\s*%}""", f.read()))
+
+        self.assertTrue(referenced)
+        for name in referenced:
+            self.assertIn(name, self.manifest)
+            self.assertTrue(os.path.exists(os.path.join(self.static_root.name, self.manifest[name])))
+
+    def test_precompressed(self):
+        hashed_name = self.manifest['blog/bootstrap/bootstrap.css']
+        path = os.path.join(self.static_root.name, hashed_name)
+        self.assertTrue(os.path.exists(path + '.gz'))
+        with open(path, 'rb') as f:
+            original = f.read()
+
+        request = RequestFactory().get('/static/' + hashed_name, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        response = serve_static(request, hashed_name)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), original)
+
+        request = RequestFactory().get('/static/' + hashed_name)
+        response = serve_static(request, hashed_name)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), original)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], BLOG_PAGE_CACHE_TIMEOUT=0)
+class TestReplicaRouting(TestCase):
+    # 복제본은 별도 SQLite 파일이다. 두 DB 에 다른 글을 넣어 어느 쪽에서 읽었는지 확인한다.
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.author = User.objects.create_user(username='smith', password='nopassword')
+        self.primary_post = Post.objects.create(title='Primary post', content='primary', author=self.author)
+
+        replica_author = User.objects.db_manager('replica').create_user(username='smith', password='nopassword')
+        self.replica_post = Post.objects.db_manager('replica').create(
+            title='Replica post', content='replica', author=replica_author
+        )
+
+    def test_listing_reads_from_replica(self):
+        response = self.client.get('/blog/')
+        self.assertIn('Replica post', response.content.decode())
+        self.assertNotIn('Primary post', response.content.decode())
+
+        response = self.client.get('/blog/{}/'.format(self.replica_post.pk))
+        self.assertIn('Replica post', response.content.decode())
+        self.assertFalse(response.cookies.get(PRIMARY_PIN_COOKIE))
+
+        # 검색 색인은 글과 같은 DB 에 있다. (복제본에 쓴 글이 default 의 색인을 덮어쓰지 않는다)
+        response = self.client.get('/blog/search/replica/')
+        self.assertIn('Replica post', response.content.decode())
+        self.assertEqual(search_post_ids('primary'), [self.primary_post.pk])
+
+    def test_pin_primary_after_write(self):
+        self.client.login(username='smith', password='nopassword')
+        response = self.client.post(
+            '/blog/{}/new_comment/'.format(self.primary_post.pk), {'text': 'A comment'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.cookies[PRIMARY_PIN_COOKIE]['max-age'], settings.DATABASE_PRIMARY_PIN_SECONDS)
+
+        # 방금 쓴 사용자는 복제본이 따라오기 전까지 default 에서 읽는다.
+        response = self.client.get('/blog/')
+        self.assertIn('Primary post', response.content.decode())
+        self.assertNotIn('Replica post', response.content.decode())
+
+        response = self.client.get(self.primary_post.get_absolute_url())
+        self.assertIn('A comment', response.content.decode())
+
+        self.client.cookies.pop(PRIMARY_PIN_COOKIE)
+        response = self.client.get('/blog/')
+        self.assertIn('Replica post', response.content.decode())
+
+
+@override_settings(BLOG_PAGE_CACHE_TIMEOUT=0)
+class TestRequestTiming(TestCase):
+    def test_server_timing_header(self):
+        author = User.objects.create_user(username='smith', password='nopassword')
+        Post.objects.create(title='First post', content='Hello', author=author)
+
+        response = Client().get('/blog/')
+        self.assertEqual(response.status_code, 200)
+        server_timing = response['Server-Timing']
+        self.assertRegex(server_timing, r'db;dur=[\d.]+;desc="\d+ queries, 0 duplicate"')
+        self.assertIn('template;dur=', server_timing)
+        self.assertIn('total;dur=', server_timing)
+
+    def test_duplicate_queries(self):
+        def view(request):
+            # 같은 쿼리를 두 번 보내고 Markdown 도 렌더링하는 view
+            list(Category.objects.filter(slug='life'))
+            list(Category.objects.filter(slug='life'))
+            render_markdown('# Hello')
+            return HttpResponse('ok')
+
+        middleware = RequestTimingMiddleware(view)
+        with self.assertLogs('basecamp.timing', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/some/page/'))
+
+        self.assertIn('desc="2 queries, 1 duplicate"', response['Server-Timing'])
+        self.assertIn('markdown;dur=', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['event'], 'duplicate_queries')
+        self.assertEqual(record['queries'][0]['count'], 2)
+        self.assertIn('blog_category', record['queries'][0]['sql'])
+
+
+class TestRunnerSettings(TestCase):
+    def test_cache_in_temp_dir(self):
+        # 테스트가 작업 디렉터리의 캐시를 비우거나 테스트 DB 로 만든 페이지를 넣지 않는다.
+        location = settings.CACHES['default']['LOCATION']
+        self.assertTrue(location.startswith(tempfile.gettempdir()))
+        self.assertNotEqual(cache._dir, str(settings.BASE_DIR / 'cache'))
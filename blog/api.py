@@ -0,0 +1,309 @@
+import base64
+import binascii
+from datetime import datetime
+from functools import wraps
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime, parse_date
+from django.utils.http import urlencode
+from django.utils import timezone
+from django.views.decorators.http import require_safe
+
+from basecamp.routers import use_replica, pin_database
+
+from .models import Post, Comment, Tag, Category, DeletedObject
+
+# 다른 서비스(검색 색인, 통계)가 HTML 대신 읽는 읽기 전용 JSON API. (/api/v1/)
+#
+#   GET /api/v1/posts/?fields=id,title,tags&limit=100&updated_since=2021-01-01T00:00:00Z
+#   GET /api/v1/posts/<id>/
+#   GET /api/v1/comments/?post=<id>
+#   GET /api/v1/tags/, /api/v1/categories/
+#   GET /api/v1/deleted/?resource=posts&updated_since=...  (지워진 글 / 댓글의 id)
+#   GET /api/v1/export/posts.ndjson, /api/v1/export/comments.ndjson  (한 줄에 객체 하나, 전체를 흘려보낸다)
+#
+# 목록은 pk 순 cursor pagination 이다. 응답의 next 를 따라가면 되고, updated_since 로 그 뒤에 바뀐 것만 받을 수 있다.
+# (동기화를 시작한 시각을 기록해 두었다가 다음 동기화의 updated_since 로 쓴다)
+# 지워진 것은 updated_since 로 알 수 없으므로 deleted 를 같은 updated_since 로 읽어서 지운다.
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+EXPORT_CHUNK_SIZE = 2000
+
+
+class ApiError(Exception):
+    """잘못된 요청 파라미터 (400 으로 응답한다)"""
+
+
+class Resource:
+    """
+    fields: {API 필드 이름: ORM lookup} - lookup 이 None 이면 get_extra_fields() 가 채운다.
+    updated_field: updated_since 로 거를 필드 (없으면 updated_since 를 받지 않는다)
+    """
+    model = None
+    fields = {}
+    default_fields = None
+    updated_field = None
+
+    def get_queryset(self, request):
+        return self.model.objects.all()
+
+    def get_extra_fields(self, rows, fields):
+        pass
+
+    def get_fields(self, request):
+        value = request.GET.get('fields')
+        if not value:
+            return list(self.default_fields or self.fields)
+        fields = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in fields if name not in self.fields]
+        if unknown:
+            raise ApiError('없는 필드입니다: {} (가능한 필드: {})'.format(', '.join(unknown), ', '.join(self.fields)))
+        # 다음 cursor 를 만들려면 id 가 필요하다.
+        return fields if 'id' in fields else ['id'] + fields
+
+    def filter(self, request, queryset):
+        updated_since = request.GET.get('updated_since')
+        if updated_since:
+            if self.updated_field is None:
+                raise ApiError('updated_since 를 쓸 수 없는 목록입니다.')
+            queryset = queryset.filter(**{self.updated_field + '__gte': parse_since(updated_since)})
+        return queryset
+
+    def get_rows(self, queryset, fields, chunk_size=None):
+        lookups = {name: self.fields[name] for name in fields if self.fields[name] is not None}
+        lookups['id'] = 'pk'
+        values = queryset.values(*lookups.values())
+        if chunk_size:
+            values = values.iterator(chunk_size=chunk_size)
+        for row in values:
+            yield {name: row[lookup] for name, lookup in lookups.items()}
+
+    def serialize(self, queryset, fields, chunk_size=None):
+        """
+        queryset 을 필드 dict 로 바꾼다. (get_extra_fields 는 EXPORT_CHUNK_SIZE 개 묶음마다 한 번씩 부른다)
+        chunk_size 를 주면 queryset 을 iterator(chunk_size) 로 읽는다.
+        """
+        rows = self.get_rows(queryset, fields, chunk_size)
+        while True:
+            chunk = list(islice(rows, EXPORT_CHUNK_SIZE))
+            if not chunk:
+                return
+            self.get_extra_fields(chunk, fields)
+            for row in chunk:
+                yield {name: row[name] for name in fields}
+
+
+class PostResource(Resource):
+    model = Post
+    fields = {
+        'id': 'pk',
+        'url': None,
+        'title': 'title',
+        'excerpt': 'excerpt',
+        'content': 'content',
+        'content_html': 'content_html',
+        'author': 'author__username',
+        'category': 'category__slug',
+        'tags': None,
+        'created': 'created',
+        'updated_at': 'updated_at',
+    }
+    # 본문은 크므로 ?fields= 로 요청할 때만 보낸다.
+    default_fields = ['id', 'url', 'title', 'excerpt', 'author', 'category', 'tags', 'created', 'updated_at']
+    updated_field = 'updated_at'
+
+    def get_extra_fields(self, rows, fields):
+        if 'url' in fields:
+            for row in rows:
+                row['url'] = Post(pk=row['id']).get_absolute_url()
+        if 'tags' in fields:
+            # 글마다 따로 묻지 않고 한 번에 가져온다.
+            tags = {row['id']: [] for row in rows}
+            through = Post.tags.through.objects.filter(post_id__in=tags).order_by('tag__slug')
+            for post_id, slug in through.values_list('post_id', 'tag__slug'):
+                tags[post_id].append(slug)
+            for row in rows:
+                row['tags'] = tags[row['id']]
+
+
+class CommentResource(Resource):
+    model = Comment
+    fields = {
+        'id': 'pk',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'text_html': 'text_html',
+        'created_at': 'created_at',
+        'modified_at': 'modified_at',
+    }
+    updated_field = 'modified_at'
+
+    def filter(self, request, queryset):
+        queryset = super(CommentResource, self).filter(request, queryset)
+        post = request.GET.get('post')
+        if post:
+            queryset = queryset.filter(post_id=parse_int('post', post))
+        return queryset
+
+
+class TaxonomyResource(Resource):
+    def get_extra_fields(self, rows, fields):
+        if 'url' in fields:
+            for row in rows:
+                row['url'] = self.model(slug=row['slug']).get_absolute_url()
+
+    def get_rows(self, queryset, fields, chunk_size=None):
+        # url 을 만들려면 slug 가 필요하다.
+        return super(TaxonomyResource, self).get_rows(queryset, fields + ['slug'], chunk_size)
+
+
+class TagResource(TaxonomyResource):
+    model = Tag
+    fields = {
+        'id': 'pk',
+        'url': None,
+        'name': 'name',
+        'slug': 'slug',
+    }
+
+
+class CategoryResource(TaxonomyResource):
+    model = Category
+    fields = {
+        'id': 'pk',
+        'url': None,
+        'name': 'name',
+        'slug': 'slug',
+        'description': 'description',
+    }
+
+
+class DeletedResource(Resource):
+    model = DeletedObject
+    fields = {
+        'id': 'pk',
+        'resource': 'resource',
+        'object_id': 'object_id',
+        'deleted_at': 'deleted_at',
+    }
+    updated_field = 'deleted_at'
+
+    def filter(self, request, queryset):
+        queryset = super(DeletedResource, self).filter(request, queryset)
+        resource = request.GET.get('resource')
+        if resource:
+            queryset = queryset.filter(resource=resource)
+        return queryset
+
+
+RESOURCES = {
+    'posts': PostResource(),
+    'comments': CommentResource(),
+    'tags': TagResource(),
+    'categories': CategoryResource(),
+    'deleted': DeletedResource(),
+}
+
+
+def parse_int(name, value):
+    try:
+        return int(value)
+    except ValueError:
+        raise ApiError('{} 는 정수여야 합니다.'.format(name))
+
+
+def parse_since(value):
+    since = parse_datetime(value)
+    if since is None:
+        date = parse_date(value)
+        if date is None:
+            raise ApiError('updated_since 는 ISO 8601 날짜/시각이어야 합니다.')
+        since = datetime(date.year, date.month, date.day)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, timezone.utc)
+    return since
+
+
+def encode_cursor(pk):
+    return base64.urlsafe_b64encode(str(pk).encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii'))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ApiError('잘못된 cursor 입니다.')
+
+
+def api_view(view):
+    """ApiError 를 400 JSON 응답으로 바꾸고, GET/HEAD 만 받으며 복제본에서 읽는다."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+    return use_replica(require_safe(wrapper))
+
+
+@api_view
+def list_objects(request, resource_name):
+    resource = RESOURCES[resource_name]
+    fields = resource.get_fields(request)
+    limit = parse_int('limit', request.GET.get('limit', DEFAULT_LIMIT))
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ApiError('limit 는 1~{} 이어야 합니다.'.format(MAX_LIMIT))
+
+    # pk 순 keyset pagination: cursor 는 앞 페이지 마지막 객체의 pk 이다.
+    queryset = resource.filter(request, resource.get_queryset(request)).order_by('pk')
+    cursor = request.GET.get('cursor')
+    if cursor:
+        queryset = queryset.filter(pk__gt=decode_cursor(cursor))
+
+    results = list(resource.serialize(queryset[:limit + 1], fields))
+    next_url = None
+    if len(results) > limit:
+        results = results[:limit]
+        query = request.GET.copy()
+        query['cursor'] = encode_cursor(results[-1]['id'])
+        next_url = request.build_absolute_uri('{}?{}'.format(request.path, urlencode(sorted(query.items()))))
+
+    return JsonResponse({'results': results, 'next': next_url}, json_dumps_params={'ensure_ascii': False})
+
+
+@api_view
+def post_detail(request, pk):
+    resource = RESOURCES['posts']
+    results = list(resource.serialize(Post.objects.filter(pk=pk), resource.get_fields(request)))
+    if not results:
+        return JsonResponse({'error': '글이 없습니다.'}, status=404)
+    return JsonResponse(results[0], json_dumps_params={'ensure_ascii': False})
+
+
+@api_view
+def export_objects(request, resource_name):
+    """
+    전체를 NDJSON 으로 흘려보낸다. (iterator(chunk_size) 로 읽으므로 메모리 사용량이 일정하다)
+    write_lines() 는 본문을 읽을 때 쿼리를 실행하므로 ASGI 에서는 BlogASGIHandler 가 sync thread 에서 읽는다.
+    """
+    resource = RESOURCES[resource_name]
+    fields = resource.get_fields(request)
+    queryset = pin_database(resource.filter(request, resource.get_queryset(request)).order_by('pk'))
+
+    def write_lines():
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        rows = resource.serialize(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE)
+        while True:
+            chunk = list(islice(rows, EXPORT_CHUNK_SIZE))
+            if not chunk:
+                return
+            yield ''.join(encoder.encode(row) + '\n' for row in chunk)
+
+    response = StreamingHttpResponse(write_lines(), content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="{}.ndjson"'.format(resource_name)
+    return response
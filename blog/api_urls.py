@@ -0,0 +1,14 @@
+from django.urls import path
+from blog import api
+
+# 읽기 전용 JSON API (blog/api.py). 응답 형식을 바꿀 때는 v2 를 새로 만든다.
+urlpatterns = [
+    path('posts/', api.list_objects, {'resource_name': 'posts'}),
+    path('posts/<int:pk>/', api.post_detail),
+    path('comments/', api.list_objects, {'resource_name': 'comments'}),
+    path('tags/', api.list_objects, {'resource_name': 'tags'}),
+    path('categories/', api.list_objects, {'resource_name': 'categories'}),
+    path('deleted/', api.list_objects, {'resource_name': 'deleted'}),
+    path('export/posts.ndjson', api.export_objects, {'resource_name': 'posts'}),
+    path('export/comments.ndjson', api.export_objects, {'resource_name': 'comments'}),
+]
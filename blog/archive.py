@@ -0,0 +1,109 @@
+from collections import Counter
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncMonth
+from django.http import Http404
+from django.utils import timezone
+
+from .models import Post, MonthlyPostCount, CategoryMonthlyPostCount
+
+# 날짜별 보관함(archive)의 월별 글 수.
+# 사이드바에서 매번 전체 글을 GROUP BY 하지 않도록 MonthlyPostCount / CategoryMonthlyPostCount 에 세어 두고
+# Post 저장/삭제 signal 에서 +1 / -1 한다. (월은 TIME_ZONE 기준)
+# signal 을 거치지 않고 바뀐 경우(bulk_create, queryset.update 등)에는 rebuild_archive 로 다시 센다.
+
+
+def get_month(created):
+    local = timezone.localtime(created)
+    return local.year, local.month
+
+
+def get_month_range(year, month):
+    """그 달의 [시작, 다음 달 시작) - created 인덱스로 범위 검색한다."""
+    if not 1 <= month <= 12 or not 1 <= year <= 9998:
+        raise Http404('잘못된 날짜입니다.')
+    start = timezone.make_aware(datetime(year, month, 1))
+    if month == 12:
+        end = timezone.make_aware(datetime(year + 1, 1, 1))
+    else:
+        end = timezone.make_aware(datetime(year, month + 1, 1))
+    return start, end
+
+
+def add(model, delta, **key):
+    if not model.objects.filter(**key).update(count=F('count') + delta):
+        # 처음 세는 달이면 행을 만든다. (동시에 만들어도 하나만 남는다)
+        model.objects.bulk_create([model(count=0, **key)], ignore_conflicts=True)
+        model.objects.filter(**key).update(count=F('count') + delta)
+    if delta < 0:
+        model.objects.filter(count__lte=0, **key).delete()
+
+
+def change_counts(counts):
+    """counts: {(created 의 (year, month), category_id): 늘어난 글 수}"""
+    with transaction.atomic():
+        for ((year, month), category_id), delta in counts.items():
+            if not delta:
+                continue
+            add(MonthlyPostCount, delta, year=year, month=month)
+            if category_id is not None:
+                add(CategoryMonthlyPostCount, delta, category_id=category_id, year=year, month=month)
+
+
+def post_added(created, category_id):
+    change_counts({(get_month(created), category_id): 1})
+
+
+def post_removed(created, category_id):
+    change_counts({(get_month(created), category_id): -1})
+
+
+def post_moved(old, new):
+    """old, new: (created, category_id)"""
+    counts = Counter()
+    counts[get_month(old[0]), old[1]] -= 1
+    counts[get_month(new[0]), new[1]] += 1
+    change_counts(counts)
+
+
+def posts_added(posts):
+    """bulk_create 로 넣은 글을 한 번에 센다."""
+    change_counts(Counter((get_month(post.created), post.category_id) for post in posts))
+
+
+def rebuild():
+    """글 전체를 다시 세서 두 테이블을 바꾼다. 월 수를 돌려준다."""
+    rows = Post.objects.order_by().annotate(
+        month_start=TruncMonth('created', tzinfo=timezone.get_current_timezone())
+    ).values('month_start', 'category_id').annotate(count=Count('pk'))
+
+    months = Counter()
+    category_months = []
+    for row in rows:
+        key = (row['month_start'].year, row['month_start'].month)
+        months[key] += row['count']
+        if row['category_id'] is not None:
+            category_months.append(CategoryMonthlyPostCount(
+                category_id=row['category_id'], year=key[0], month=key[1], count=row['count'],
+            ))
+
+    with transaction.atomic():
+        MonthlyPostCount.objects.all().delete()
+        CategoryMonthlyPostCount.objects.all().delete()
+        MonthlyPostCount.objects.bulk_create([
+            MonthlyPostCount(year=year, month=month, count=count) for (year, month), count in months.items()
+        ])
+        CategoryMonthlyPostCount.objects.bulk_create(category_months)
+    return len(months)
+
+
+def get_archive_list():
+    return list(MonthlyPostCount.objects.filter(count__gt=0))
+
+
+def get_category_archive_list(category_slug):
+    return list(
+        CategoryMonthlyPostCount.objects.filter(category__slug=category_slug, count__gt=0).select_related('category')
+    )
@@ -0,0 +1,12 @@
+from django.urls import path
+from blog import async_views
+
+# ASGI 로 서비스할 때 blog/urls.py 보다 먼저 찾는 async view. (my_proj/asgi_urls.py)
+# 여기 없는 주소(글 작성, 댓글 등)는 blog/urls.py 의 sync view 가 처리한다.
+urlpatterns = [
+    path('search/<str:q>/', async_views.post_search),
+    path('category/<str:slug>/', async_views.post_list_by_category),
+    path('tag/<str:slug>/', async_views.post_list_by_tag),
+    path('<int:pk>/', async_views.post_detail),
+    path('', async_views.post_list),
+]
@@ -0,0 +1,188 @@
+import asyncio
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+
+from basecamp.routers import use_replica
+
+from .archive import get_category_archive_list
+from .conditional import (
+    get_etag, set_validator_headers, get_list_validator, get_post_versions, get_versions_of, make_post_validator,
+)
+from .context_processors import get_sidebar
+from .forms import CommentForm
+from .objectcache import get_object, get_by_slug
+from .models import Post, Category, Tag
+from .pagecache import category_list_tag, tag_list_tag, get_card_tags
+from .pagination import CursorPaginationMixin
+from .related import get_related_posts
+from .search import search_posts
+from .views import get_comment_context
+from .viewcount import count_view
+
+# views.py 의 목록/상세 view 를 ASGI 에서 쓰는 async 버전. (my_proj/asgi.py -> my_proj/asgi_urls.py)
+# Django 3.1 에는 async ORM 이 없으므로 쿼리는 sync_to_async(thread_sensitive=False) 로 각자 다른 thread 에서 실행하고
+# 서로 의존하지 않는 쿼리(글 목록, 사이드바, 카테고리 ...)는 asyncio.gather 로 동시에 보낸다.
+
+PAGE_SIZE = 5
+
+
+def run_query(func, *args, **kwargs):
+    def call():
+        # 요청 처리 thread 가 아니므로 request_started / request_finished 가 이 thread 의 연결을 정리해 주지 않는다.
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(call, thread_sensitive=False)()
+
+
+class ListPaginator(CursorPaginationMixin):
+    page_kwarg = 'page'
+
+    def __init__(self, request, cursor_pagination=True):
+        self.request = request
+        self.cursor_pagination = cursor_pagination
+
+    def paginate(self, queryset):
+        paginator, page_obj, object_list, is_paginated = self.paginate_queryset(queryset, PAGE_SIZE)
+        return {
+            'paginator': paginator,
+            'page_obj': page_obj,
+            'object_list': object_list,
+            'post_list': object_list,
+            'is_paginated': is_paginated,
+        }
+
+
+async def check_not_modified(request, get_validator, *args):
+    """(304 응답 또는 None, (ETag, timestamp) 또는 None) 을 돌려준다."""
+    validator = await run_query(get_validator, *args)
+    if validator is None:
+        return None, None
+
+    # request.user 는 세션/DB 를 읽을 수 있으므로 sync 쪽에서 만든다.
+    etag, timestamp = await sync_to_async(get_etag)(request, validator)
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validator_headers(response, etag, timestamp)
+    return response, (etag, timestamp)
+
+
+async def render_page(request, template_name, context, page_cache_tags, validator=None):
+    # 템플릿의 user, csrf_token 등도 sync 코드이므로 렌더링은 thread 에서 한다.
+    response = await sync_to_async(render)(request, template_name, context)
+    request.page_cache_tags = page_cache_tags
+    if validator is not None:
+        set_validator_headers(response, *validator)
+    return response
+
+
+async def render_list(request, queryset, get_page_cache_tags, context=None, queries=None,
+                      cursor_pagination=True, conditional_get=True):
+    """
+    queries: {context 이름: 함수} - 글 목록, 사이드바와 함께 동시에 실행할 쿼리
+    get_page_cache_tags(context): 목록 종류별 page cache 태그 (사이드바, 카드 태그는 여기서 더한다)
+    """
+    validator = None
+    if conditional_get:
+        response, validator = await check_not_modified(request, get_list_validator, queryset)
+        if response is not None:
+            return response
+
+    queries = queries or {}
+    page, sidebar, *values = await asyncio.gather(
+        run_query(ListPaginator(request, cursor_pagination).paginate, queryset),
+        run_query(get_sidebar),
+        *[run_query(func) for func in queries.values()]
+    )
+
+    context = dict(context or {}, **page)
+    context.update(sidebar)
+    context.update(zip(queries.keys(), values))
+    page_cache_tags = get_page_cache_tags(context) + ['sidebar'] + get_card_tags(context['object_list'])
+    return await render_page(request, 'blog/post_list.html', context, page_cache_tags, validator)
+
+
+@use_replica
+async def post_list(request):
+    return await render_list(request, Post.objects.for_list(), lambda context: ['list'])
+
+
+@use_replica
+async def post_search(request, q):
+    # search_posts 는 FTS 검색을 바로 실행하므로 이것도 thread 에서 부른다.
+    queryset = await run_query(search_posts, Post.objects.for_list(), q)
+    # 검색 결과는 created 순이 아니라 검색 순위 순이므로 ?page=N 으로 넘긴다.
+    return await render_list(
+        request, queryset, lambda context: ['list'],
+        context={'search_info': 'Search: "{}"'.format(q)},
+        queries={'search_count': queryset.count},
+        cursor_pagination=False,
+        conditional_get=False,
+    )
+
+
+@use_replica
+async def post_list_by_category(request, slug):
+    if slug == '_none':
+        return await render_list(
+            request, Post.objects.for_list().filter(category=None),
+            lambda context: [category_list_tag(None)],
+            context={'category': '미분류'},
+        )
+
+    # 카테고리를 먼저 가져오지 않고 slug 로 바로 걸러서 글 목록과 카테고리를 동시에 읽는다.
+    # 없는 slug 면 get_by_slug 가 Http404 를 낸다.
+    return await render_list(
+        request, Post.objects.for_list().filter(category__slug=slug),
+        lambda context: [category_list_tag(context['category'].pk)],
+        queries={
+            'category': partial(get_by_slug, Category, slug),
+            'archive_list': partial(get_category_archive_list, slug),
+        },
+    )
+
+
+@use_replica
+async def post_list_by_tag(request, slug):
+    return await render_list(
+        request, Post.objects.for_list().filter(tags__slug=slug),
+        lambda context: [tag_list_tag(context['tag'].pk)],
+        queries={'tag': partial(get_by_slug, Tag, slug)},
+    )
+
+
+@use_replica
+async def post_detail(request, pk):
+    versions = await run_query(get_post_versions, pk)
+    response, validator = await check_not_modified(request, make_post_validator, pk, versions)
+    if response is not None:
+        return count_view(response, pk)
+
+    post, comment_context, related_posts, sidebar = await asyncio.gather(
+        # 캐시의 글이 ETag 를 만든 글과 다르면 다시 읽는다. (views.PostDetail.get_object)
+        run_query(get_object, Post, pk, is_current=lambda post: get_versions_of(post) == versions),
+        run_query(get_comment_context, pk),
+        run_query(get_related_posts, pk),
+        run_query(get_sidebar),
+    )
+
+    context = {
+        'object': post,
+        'post': post,
+        'comment_form': CommentForm(),
+        'related_posts': related_posts,
+    }
+    context.update(comment_context)
+    context.update(sidebar)
+
+    page_cache_tags = ['post:{}'.format(pk), 'comments:{}'.format(pk), 'sidebar']
+    page_cache_tags += ['tag:{}'.format(tag.pk) for tag in post.tags.all()]
+    response = await render_page(request, 'blog/post_detail.html', context, page_cache_tags, validator)
+    return count_view(response, pk)
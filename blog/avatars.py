@@ -0,0 +1,36 @@
+from allauth.socialaccount.models import SocialAccount
+from django.core.cache import cache
+
+# 댓글 작성자의 소셜 계정 아바타 URL 을 사용자별로 캐시한다.
+# 소셜 계정이 없는 사용자는 '' 로 저장해서 매번 다시 조회하지 않도록 한다.
+AVATAR_CACHE_KEY = 'blog:avatar:{}'
+AVATAR_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_avatar_urls(user_ids):
+    keys = {AVATAR_CACHE_KEY.format(user_id): user_id for user_id in set(user_ids)}
+    if not keys:
+        return {}
+
+    avatar_urls = {keys[key]: url for key, url in cache.get_many(keys).items()}
+    missing = [user_id for user_id in keys.values() if user_id not in avatar_urls]
+    if missing:
+        resolved = dict.fromkeys(missing, '')
+        # 템플릿에서 socialaccount_set.all.0 을 쓰던 것과 같이 사용자별 첫 번째 계정을 쓴다.
+        for account in SocialAccount.objects.filter(user_id__in=missing).order_by('-pk'):
+            resolved[account.user_id] = account.get_avatar_url() or ''
+
+        cache.set_many({AVATAR_CACHE_KEY.format(user_id): url for user_id, url in resolved.items()}, AVATAR_CACHE_TIMEOUT)
+        avatar_urls.update(resolved)
+    return avatar_urls
+
+
+def attach_avatar_urls(comments):
+    avatar_urls = get_avatar_urls(comment.author_id for comment in comments)
+    for comment in comments:
+        comment.avatar_url = avatar_urls.get(comment.author_id, '')
+    return comments
+
+
+def invalidate_avatar_url(user_id):
+    cache.delete(AVATAR_CACHE_KEY.format(user_id))
@@ -0,0 +1,37 @@
+from contextlib import contextmanager
+
+from django.db import connections, router
+from django.db.models import Max
+
+# save() 를 거치지 않고 bulk_create 로 글/댓글을 넣는 명령(generate_dataset, import_posts)에서 같이 쓴다.
+
+
+@contextmanager
+def keep_timestamps(*fields):
+    # bulk_create 가 auto_now / auto_now_add 로 작성 시각을 모두 지금으로 덮어쓰지 않도록 잠시 끈다.
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def next_pk(model):
+    """
+    SQLite 의 bulk_create(Django 3.1)는 만든 행의 pk 를 돌려주지 않으므로 pk 를 직접 정해서 넣는다.
+    max(pk) + 1 은 맨 뒤에서 지워진 글의 pk 를 다시 쓰게 되므로 (JSON API 의 deleted 에 남아 있다)
+    AUTOINCREMENT 가 지금까지 준 가장 큰 pk(sqlite_sequence) 다음부터 쓴다.
+    """
+    using = router.db_for_write(model)
+    max_pk = model.objects.using(using).aggregate(max_pk=Max('pk'))['max_pk'] or 0
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [model._meta.db_table])
+            row = cursor.fetchone()
+        if row is not None:
+            max_pk = max(max_pk, row[0])
+    return max_pk + 1
@@ -0,0 +1,101 @@
+import hashlib
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .models import Post
+
+# 사이드바(카테고리별 개수)나 태그 이름처럼 여러 페이지에 함께 보이는 정보가 마지막으로 바뀐 시각.
+# 캐시에서 사라졌다면 지금 바뀐 것으로 보고 다시 기록한다. (304 를 덜 줄 뿐 잘못된 304 는 주지 않는다)
+SHARED_CHANGED_KEY = 'blog:shared_changed_at'
+
+
+def mark_shared_changed():
+    cache.set(SHARED_CHANGED_KEY, timezone.now(), None)
+
+
+def get_shared_changed_at():
+    changed_at = cache.get(SHARED_CHANGED_KEY)
+    if changed_at is None:
+        changed_at = timezone.now()
+        cache.add(SHARED_CHANGED_KEY, changed_at, None)
+    return changed_at
+
+
+def get_etag(request, validator, per_user=True):
+    """get_validator() 결과로 (ETag, Last-Modified timestamp) 를 만든다."""
+    last_modified, extra = validator
+    last_modified = max(last_modified, get_shared_changed_at())
+    # 로그인 사용자마다 보이는 버튼이 다르므로 사용자도 ETag 에 넣는다. (feed, sitemap 처럼 모두에게 같은 내용이면 빼도 된다)
+    raw = '{}|{}|{}'.format(last_modified.isoformat(), extra, request.user.pk or 0 if per_user else '')
+    etag = quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+    return etag, int(last_modified.timestamp())
+
+
+def set_validator_headers(response, etag, timestamp):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(timestamp)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    get_validator() 가 돌려준 (마지막 수정 시각, 추가 정보) 로 ETag / Last-Modified 를 만들고
+    클라이언트가 가진 것과 같으면 템플릿을 렌더링하지 않고 304 를 돌려준다.
+    """
+    conditional_get = True
+
+    def get_validator(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        if not self.conditional_get:
+            return super(ConditionalGetMixin, self).get(request, *args, **kwargs)
+
+        validator = self.get_validator()
+        if validator is None:
+            return super(ConditionalGetMixin, self).get(request, *args, **kwargs)
+
+        etag, timestamp = get_etag(request, validator)
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super(ConditionalGetMixin, self).get(request, *args, **kwargs)
+        return set_validator_headers(response, etag, timestamp)
+
+
+# 상세 페이지의 ETag 를 만드는 글의 필드
+POST_VERSION_FIELDS = ('updated_at', 'comment_activity_at', 'related_updated_at')
+
+
+def get_post_versions(pk):
+    """DB 에 있는 글의 POST_VERSION_FIELDS 값, 글이 없으면 None"""
+    return Post.objects.filter(pk=pk).values_list(*POST_VERSION_FIELDS).first()
+
+
+def get_versions_of(post):
+    """읽어 둔 글(blog.objectcache)의 POST_VERSION_FIELDS 값 - get_post_versions() 와 비교한다."""
+    if post is None:
+        return None
+    return tuple(getattr(post, name) for name in POST_VERSION_FIELDS)
+
+
+def make_post_validator(pk, versions):
+    if versions is None:
+        return None
+    updated_at, comment_activity_at, related_updated_at = versions
+    return max(updated_at, comment_activity_at or updated_at, related_updated_at or updated_at), pk
+
+
+def get_post_validator(pk):
+    return make_post_validator(pk, get_post_versions(pk))
+
+
+def get_list_validator(queryset):
+    # 전체를 집계(Max, Count)하지 않고 updated_at 인덱스로 가장 최근에 바뀐 글 하나만 읽는다.
+    # 글이 지워지거나 bulk_create 로 들어온 것은 mark_shared_changed() 의 시각으로 알 수 있다. (get_etag 가 같이 본다)
+    last_modified = queryset.prefetch_related(None).order_by('-updated_at').values_list('updated_at', flat=True).first()
+    # 글이 하나도 없으면 공통 정보가 바뀐 시각만으로 판단한다.
+    return last_modified or get_shared_changed_at(), ''
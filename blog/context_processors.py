@@ -0,0 +1,58 @@
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.expressions import RawSQL
+from django.utils.functional import SimpleLazyObject
+
+from .archive import get_archive_list
+from .models import Post, Category
+from .viewcount import get_popular_posts
+
+SIDEBAR_CACHE_KEY = 'blog:sidebar'
+SIDEBAR_CACHE_TIMEOUT = 60 * 60
+
+
+def get_sidebar():
+    sidebar = cache.get(SIDEBAR_CACHE_KEY)
+    if sidebar is None:
+        sidebar = build_sidebar()
+        cache.set(SIDEBAR_CACHE_KEY, sidebar, SIDEBAR_CACHE_TIMEOUT)
+    return sidebar
+
+
+def build_sidebar():
+    # 카테고리별 개수와 미분류 개수를 한 번의 쿼리로 가져온다.
+    without_category_sql = 'SELECT COUNT(*) FROM {} WHERE category_id IS NULL'.format(Post._meta.db_table)
+    category_list = list(
+        Category.objects.annotate(
+            post_count=Count('post'),
+            posts_without_category=RawSQL(without_category_sql, ()),
+        )
+    )
+
+    if category_list:
+        posts_without_category = category_list[0].posts_without_category
+    else:
+        posts_without_category = Post.objects.filter(category=None).count()
+
+    return {
+        'category_list': category_list,
+        'posts_without_category': posts_without_category,
+        # 월별 글 수는 미리 세어 둔 표에서 읽는다. (blog.archive)
+        'archive_list': get_archive_list(),
+    }
+
+
+def invalidate_sidebar():
+    cache.delete(SIDEBAR_CACHE_KEY)
+
+
+def sidebar(request):
+    # 사이드바를 쓰지 않는 페이지에서는 캐시도 조회하지 않도록 지연 평가한다.
+    lazy_sidebar = SimpleLazyObject(get_sidebar)
+    return {
+        'category_list': SimpleLazyObject(lambda: lazy_sidebar['category_list']),
+        'posts_without_category': SimpleLazyObject(lambda: lazy_sidebar['posts_without_category']),
+        'archive_list': SimpleLazyObject(lambda: lazy_sidebar['archive_list']),
+        # 인기 글은 조회가 쌓이면서 계속 바뀌므로 사이드바 캐시와 따로, 더 짧게 캐시한다.
+        'popular_posts': SimpleLazyObject(get_popular_posts),
+    }
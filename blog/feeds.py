@@ -0,0 +1,235 @@
+from xml.sax.saxutils import escape, quoteattr
+
+from django.db.models import ExpressionWrapper, F, IntegerField, Max
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import iri_to_uri
+from django.utils.feedgenerator import rfc2822_date, rfc3339_date
+from django.utils.http import http_date
+
+from basecamp.routers import use_replica, pin_database
+
+from .conditional import get_etag, get_list_validator, get_shared_changed_at
+from .models import Post, Category, Tag
+from .objectcache import get_by_slug
+
+# RSS / Atom feed 와 sitemap.
+# 글이 10만 개여도 메모리에 한꺼번에 올리지 않도록 필요한 컬럼만 .iterator() 로 읽으면서 XML 을 조금씩 내보낸다.
+# (django.contrib.syndication / sitemaps 는 문서 전체를 만든 뒤에 응답한다)
+# 응답 본문은 view 가 끝난 뒤(복제본 선택이 풀린 뒤)에 읽히므로 queryset 은 pin_database() 로 DB 를 고정해 둔다.
+# ASGI 에서는 BlogASGIHandler 가 본문을 sync thread 에서 읽는다. (my_proj/asgi.py)
+
+FEED_ITEMS = 20
+SITEMAP_PAGE_SIZE = 50000  # sitemap 파일 하나에 넣을 수 있는 최대 URL 수
+CHUNK_SIZE = 2000  # DB 에서 한 번에 가져올 행 수
+FLUSH_LINES = 200  # 이만큼 모아서 한 번에 내보낸다.
+
+FEED_CONTENT_TYPES = {
+    'rss': 'application/rss+xml; charset=utf-8',
+    'atom': 'application/atom+xml; charset=utf-8',
+}
+SITEMAP_CONTENT_TYPE = 'application/xml; charset=utf-8'
+
+
+def buffered(lines):
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= FLUSH_LINES:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def absolute_url(base_url, path):
+    # 한글 slug 는 퍼센트 인코딩해서 넣는다.
+    return base_url + iri_to_uri(path)
+
+
+def stream_xml(request, validator, key, content_type, write, *args):
+    """조건부 요청이면 304, 아니면 write(*args) 가 만드는 XML 을 흘려보내는 응답"""
+    last_modified, extra = validator
+    etag, timestamp = get_etag(request, (last_modified, '{}|{}'.format(extra, key)), per_user=False)
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = StreamingHttpResponse(buffered(write(*args)), content_type=content_type)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+# Feed
+
+def get_feed_rows(queryset):
+    return pin_database(queryset).order_by('-created', '-pk').values_list(
+        'pk', 'title', 'excerpt', 'created', 'updated_at', 'author__username', 'category__name',
+    )[:FEED_ITEMS].iterator(chunk_size=CHUNK_SIZE)
+
+
+def write_rss(base_url, title, link, feed_url, updated, rows):
+    yield '<?xml version="1.0" encoding="utf-8"?>\n'
+    yield '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>'
+    yield '<title>{}</title><link>{}</link><description>{}</description>'.format(
+        escape(title), escape(absolute_url(base_url, link)), escape(title)
+    )
+    yield '<atom:link href={} rel="self"/><lastBuildDate>{}</lastBuildDate>'.format(
+        quoteattr(absolute_url(base_url, feed_url)), rfc2822_date(updated)
+    )
+    for pk, post_title, excerpt, created, updated_at, username, category_name in rows:
+        url = escape(absolute_url(base_url, Post(pk=pk).get_absolute_url()))
+        yield '<item><title>{}</title><link>{}</link><guid>{}</guid>'.format(escape(post_title), url, url)
+        yield '<description>{}</description><pubDate>{}</pubDate><dc:creator>{}</dc:creator>'.format(
+            escape(excerpt), rfc2822_date(created), escape(username)
+        )
+        if category_name:
+            yield '<category>{}</category>'.format(escape(category_name))
+        yield '</item>\n'
+    yield '</channel></rss>\n'
+
+
+def write_atom(base_url, title, link, feed_url, updated, rows):
+    yield '<?xml version="1.0" encoding="utf-8"?>\n'
+    yield '<feed xmlns="http://www.w3.org/2005/Atom" xml:lang="ko">'
+    yield '<title>{}</title><link href={} rel="alternate"/><link href={} rel="self"/>'.format(
+        escape(title), quoteattr(absolute_url(base_url, link)), quoteattr(absolute_url(base_url, feed_url))
+    )
+    yield '<id>{}</id><updated>{}</updated>'.format(escape(absolute_url(base_url, link)), rfc3339_date(updated))
+    for pk, post_title, excerpt, created, updated_at, username, category_name in rows:
+        url = absolute_url(base_url, Post(pk=pk).get_absolute_url())
+        yield '<entry><title>{}</title><link href={} rel="alternate"/><id>{}</id>'.format(
+            escape(post_title), quoteattr(url), escape(url)
+        )
+        yield '<published>{}</published><updated>{}</updated><author><name>{}</name></author>'.format(
+            rfc3339_date(created), rfc3339_date(updated_at), escape(username)
+        )
+        if category_name:
+            yield '<category term={}/>'.format(quoteattr(category_name))
+        yield '<summary>{}</summary></entry>\n'.format(escape(excerpt))
+    yield '</feed>\n'
+
+
+FEED_WRITERS = {
+    'rss': write_rss,
+    'atom': write_atom,
+}
+
+
+def feed_response(request, kind, title, link, queryset):
+    validator = get_list_validator(queryset)
+    base_url = request.build_absolute_uri('/')[:-1]
+    return stream_xml(
+        request, validator, 'feed:{}:{}'.format(kind, title), FEED_CONTENT_TYPES[kind],
+        FEED_WRITERS[kind], base_url, title, link, request.path, validator[0], get_feed_rows(queryset),
+    )
+
+
+@use_replica
+def post_feed(request, kind):
+    return feed_response(request, kind, 'Blog', '/blog/', Post.objects.all())
+
+
+@use_replica
+def category_feed(request, slug, kind):
+    if slug == '_none':
+        return feed_response(request, kind, 'Blog - 미분류', '/blog/category/_none/', Post.objects.filter(category=None))
+
+    category = get_by_slug(Category, slug)
+    return feed_response(
+        request, kind, 'Blog - {}'.format(category.name), category.get_absolute_url(),
+        Post.objects.filter(category=category),
+    )
+
+
+@use_replica
+def tag_feed(request, slug, kind):
+    tag = get_by_slug(Tag, slug)
+    return feed_response(
+        request, kind, 'Blog - #{}'.format(tag.name), tag.get_absolute_url(), Post.objects.filter(tags=tag),
+    )
+
+
+# Sitemap
+# sitemap.xml 은 목록(index)이고, 글은 pk 구간별로 sitemap-posts-<n>.xml 에 SITEMAP_PAGE_SIZE 개씩 나눈다.
+# pk 구간으로 나누므로 OFFSET 없이 pk 인덱스만으로 한 파일의 글을 읽는다.
+
+def get_sitemap_page_range(page):
+    return (page - 1) * SITEMAP_PAGE_SIZE + 1, page * SITEMAP_PAGE_SIZE
+
+
+def get_sitemap_pages():
+    """[(page, 마지막 수정 시각)] - 글이 있는 구간만 한 번의 GROUP BY 로 구한다."""
+    page = ExpressionWrapper((F('pk') - 1) / SITEMAP_PAGE_SIZE + 1, output_field=IntegerField())
+    return pin_database(Post.objects.order_by()).annotate(page=page).values('page').annotate(
+        last_modified=Max('updated_at')
+    ).order_by('page').values_list('page', 'last_modified').iterator(chunk_size=CHUNK_SIZE)
+
+
+def write_sitemap_index(base_url, taxonomy_modified, pages):
+    yield '<?xml version="1.0" encoding="utf-8"?>\n'
+    yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    yield '<sitemap><loc>{}/sitemap-taxonomy.xml</loc><lastmod>{}</lastmod></sitemap>\n'.format(
+        escape(base_url), rfc3339_date(taxonomy_modified)
+    )
+    for page, last_modified in pages:
+        yield '<sitemap><loc>{}/sitemap-posts-{}.xml</loc><lastmod>{}</lastmod></sitemap>\n'.format(
+            escape(base_url), page, rfc3339_date(last_modified)
+        )
+    yield '</sitemapindex>\n'
+
+
+def write_urlset(base_url, urls):
+    yield '<?xml version="1.0" encoding="utf-8"?>\n'
+    yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for url, last_modified in urls:
+        if last_modified is None:
+            yield '<url><loc>{}</loc></url>\n'.format(escape(absolute_url(base_url, url)))
+        else:
+            yield '<url><loc>{}</loc><lastmod>{}</lastmod></url>\n'.format(
+                escape(absolute_url(base_url, url)), rfc3339_date(last_modified)
+            )
+    yield '</urlset>\n'
+
+
+def iter_post_urls(queryset):
+    for pk, updated_at in queryset.values_list('pk', 'updated_at').iterator(chunk_size=CHUNK_SIZE):
+        yield Post(pk=pk).get_absolute_url(), updated_at
+
+
+def iter_taxonomy_urls(categories, tags):
+    yield '/blog/', None
+    for model, queryset in ((Category, categories), (Tag, tags)):
+        for slug in queryset.values_list('slug', flat=True).iterator(chunk_size=CHUNK_SIZE):
+            yield model(slug=slug).get_absolute_url(), None
+
+
+@use_replica
+def sitemap_index(request):
+    validator = get_list_validator(Post.objects.all())
+    return stream_xml(
+        request, validator, 'sitemap:{}'.format(SITEMAP_PAGE_SIZE), SITEMAP_CONTENT_TYPE,
+        write_sitemap_index, request.build_absolute_uri('/')[:-1], get_shared_changed_at(), get_sitemap_pages(),
+    )
+
+
+@use_replica
+def sitemap_posts(request, page):
+    queryset = Post.objects.filter(pk__range=get_sitemap_page_range(page)).order_by('pk')
+    if page < 1 or not queryset.exists():
+        raise Http404('sitemap page {}'.format(page))
+
+    return stream_xml(
+        request, get_list_validator(queryset), 'sitemap-posts:{}:{}'.format(SITEMAP_PAGE_SIZE, page), SITEMAP_CONTENT_TYPE,
+        write_urlset, request.build_absolute_uri('/')[:-1], iter_post_urls(pin_database(queryset)),
+    )
+
+
+@use_replica
+def sitemap_taxonomy(request):
+    # 카테고리 / 태그가 바뀌면 mark_shared_changed() 가 불린다. (blog/signals.py)
+    categories = pin_database(Category.objects.order_by('pk'))
+    tags = pin_database(Tag.objects.order_by('pk'))
+    return stream_xml(
+        request, (get_shared_changed_at(), 'taxonomy'), 'sitemap-taxonomy', SITEMAP_CONTENT_TYPE,
+        write_urlset, request.build_absolute_uri('/')[:-1], iter_taxonomy_urls(categories, tags),
+    )
@@ -0,0 +1,144 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from blog.models import Post, Category, Tag
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Command(BaseCommand):
+    help = '같은 주소를 WSGI(sync view, thread) 와 ASGI(async view, event loop) 로 동시에 요청해 처리량과 p99 를 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='기본값: 목록, 첫 글 상세, 카테고리, 태그 페이지')
+        parser.add_argument('--requests', type=int, default=500, help='주소마다 보낼 요청 수')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--page-cache', action='store_true', help='익명 사용자 page cache 를 켠 채로 잰다.')
+
+    def handle(self, *args, **options):
+        from my_proj.asgi import application as asgi_application
+        from my_proj.wsgi import application as wsgi_application
+
+        paths = options['paths'] or self.get_default_paths()
+        settings_override = {'ALLOWED_HOSTS': ['localhost']}
+        if not options['page_cache']:
+            settings_override['BLOG_PAGE_CACHE_TIMEOUT'] = 0
+
+        self.stdout.write('requests: {}, concurrency: {}'.format(options['requests'], options['concurrency']))
+        self.stdout.write('{:<28} {:<5} {:>10} {:>10} {:>10} {:>8}'.format('path', 'mode', 'req/s', 'p50 (ms)', 'p99 (ms)', 'errors'))
+
+        with override_settings(**settings_override):
+            for path in paths:
+                for mode, run in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+                    app = wsgi_application if mode == 'wsgi' else asgi_application
+                    run(app, path, options['concurrency'], min(options['requests'], 10))  # warm up
+                    elapsed, latencies, errors = run(app, path, options['concurrency'], options['requests'])
+                    self.stdout.write('{:<28} {:<5} {:>10.1f} {:>10.2f} {:>10.2f} {:>8}'.format(
+                        path, mode, len(latencies) / elapsed,
+                        percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000, errors,
+                    ))
+
+    def get_default_paths(self):
+        paths = ['/blog/']
+        post = Post.objects.order_by('-pk').first()
+        if post:
+            paths.append(post.get_absolute_url())
+        category = Category.objects.first()
+        if category:
+            paths.append(category.get_absolute_url())
+        tag = Tag.objects.first()
+        if tag:
+            paths.append(tag.get_absolute_url())
+        return paths
+
+    def run_wsgi(self, app, path, concurrency, count):
+        def request():
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': '',
+                'SCRIPT_NAME': '',
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': 'localhost',
+                'wsgi.version': (1, 0),
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': BytesIO(),
+                'wsgi.multithread': True,
+                'wsgi.multiprocess': False,
+                'wsgi.run_once': False,
+            }
+            status = []
+            start = time.perf_counter()
+            result = app(environ, lambda s, headers, exc_info=None: status.append(s))
+            try:
+                for _ in result:
+                    pass
+            finally:
+                result.close()
+            return time.perf_counter() - start, not status[0].startswith('200')
+
+        # thread 를 쓰는 WSGI 서버(gunicorn --threads, mod_wsgi)처럼 요청마다 worker thread 하나를 쓴다.
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda i: request(), range(count)))
+        return self.summarize(start, results)
+
+    def run_asgi(self, app, path, concurrency, count):
+        async def request(semaphore):
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode('utf-8'),
+                'query_string': b'',
+                'root_path': '',
+                'headers': [(b'host', b'localhost')],
+                'client': ('127.0.0.1', 0),
+                'server': ('localhost', 80),
+            }
+            body = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            disconnected = asyncio.Event()
+            status = []
+
+            async def receive():
+                if body:
+                    return body.pop()
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            async with semaphore:
+                start = time.perf_counter()
+                await app(scope, receive, send)
+                return time.perf_counter() - start, status[0] != 200
+
+        async def run_all():
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*[request(semaphore) for _ in range(count)])
+
+        start = time.perf_counter()
+        results = asyncio.run(run_all())
+        return self.summarize(start, results)
+
+    def summarize(self, start, results):
+        elapsed = time.perf_counter() - start
+        latencies = [latency for latency, error in results]
+        errors = sum(1 for latency, error in results if error)
+        return elapsed, latencies, errors
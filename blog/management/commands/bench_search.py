@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import search
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = '기존 LIKE 검색과 FTS5 검색의 응답 시간을 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='+')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        self.stdout.write('posts: {}'.format(Post.objects.count()))
+        self.stdout.write('{:<20} {:>12} {:>12} {:>8} {:>8}'.format('query', 'like (ms)', 'fts (ms)', 'like #', 'fts #'))
+
+        for q in options['queries']:
+            like_ms, like_count = self.measure(lambda: list(search.like_search(Post.objects.all(), q).values_list('pk', flat=True)), repeat)
+            fts_ms, fts_count = self.measure(lambda: search.search_post_ids(q) or [], repeat)
+            self.stdout.write('{:<20} {:>12.2f} {:>12.2f} {:>8} {:>8}'.format(q, like_ms, fts_ms, like_count, fts_count))
+
+    def measure(self, func, repeat):
+        result = func()  # warm up
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        return elapsed, len(result)
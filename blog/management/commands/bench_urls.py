@@ -0,0 +1,163 @@
+import json
+import logging
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import get_resolver, URLPattern
+from django.utils import timezone
+
+from blog.models import Post, Comment, Tag, Category
+
+# blog/urls.py, basecamp/urls.py 의 모든 주소를 test client 로 요청해서
+# 주소마다 처리량, p50/p95/p99 응답 시간, SQL 쿼리 수를 잰다. (결과는 --output 의 JSON 으로 남겨 비교한다)
+
+URLCONFS = (
+    ('/blog/', 'blog.urls'),
+    ('/', 'basecamp.urls'),
+)
+
+# 요청하면 데이터가 바뀌는 주소는 재지 않는다.
+WRITE_ROUTES = (
+    '/blog/<int:pk>/new_comment/',
+    '/blog/delete_comment/<int:pk>/',
+)
+
+CONVERTER_RE = re.compile(r'<(?:\w+:)?(\w+)>')
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Command(BaseCommand):
+    help = 'blog / basecamp 의 모든 URL 에 대해 처리량, 응답 시간 분포, 쿼리 수를 재고 JSON 으로 저장합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='주소마다 보낼 요청 수')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--search', default='서울', help='search/<q>/ 에 넣을 검색어')
+        parser.add_argument('--user', help='이 사용자로 로그인해서 잰다. (기본: 로그인하지 않음)')
+        parser.add_argument('--page-cache', action='store_true', help='익명 사용자 page cache 를 켠 채로 잰다.')
+        parser.add_argument('--output', help='결과를 저장할 JSON 파일')
+
+    def handle(self, *args, **options):
+        post = Post.objects.order_by('-pk').first()
+        if post is None:
+            raise CommandError('글이 없습니다. 먼저 python manage.py generate_dataset 을 실행하세요.')
+
+        # view 에서 난 예외도 500 으로 기록하고 계속 잰다.
+        client = Client(raise_request_exception=False)
+        if options['user']:
+            from django.contrib.auth.models import User
+            client.force_login(User.objects.get(username=options['user']))
+
+        settings_override = {'ALLOWED_HOSTS': ['testserver']}
+        if not options['page_cache']:
+            settings_override['BLOG_PAGE_CACHE_TIMEOUT'] = 0
+
+        aliases = ['default'] + list(getattr(settings, 'DATABASE_REPLICAS', []))
+        results = []
+        # 로그인이 필요한 주소의 500 등은 status 로 보여주므로 요청마다 traceback 을 찍지 않는다.
+        request_logger = logging.getLogger('django.request')
+        request_logger.disabled = True
+        with override_settings(**settings_override):
+            for route, path in self.get_paths(post, options['search']):
+                if route in WRITE_ROUTES:
+                    results.append({'route': route, 'path': path, 'skipped': 'write'})
+                    continue
+                results.append(self.measure(client, route, path, aliases, options['requests'], options['warmup']))
+        request_logger.disabled = False
+
+        self.print_results(results)
+        if options['output']:
+            report = {
+                'created': timezone.now().isoformat(),
+                'options': {key: options[key] for key in ('requests', 'warmup', 'search', 'user', 'page_cache')},
+                'dataset': {
+                    'posts': Post.objects.count(),
+                    'comments': Comment.objects.count(),
+                    'tags': Tag.objects.count(),
+                    'categories': Category.objects.count(),
+                },
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write('saved: {}'.format(options['output']))
+
+    def get_paths(self, post, q):
+        comment = Comment.objects.filter(post=post).first() or Comment.objects.order_by('-pk').first()
+        category = Category.objects.order_by('pk').first()
+        tag = Tag.objects.order_by('pk').first()
+
+        for prefix, urlconf in URLCONFS:
+            for pattern in get_resolver(urlconf).url_patterns:
+                if not isinstance(pattern, URLPattern):
+                    continue
+                route = prefix + str(pattern.pattern)
+
+                def fill(match):
+                    name = match.group(1)
+                    if name == 'q':
+                        return q
+                    if name in ('year', 'month'):
+                        return str(getattr(timezone.localtime(post.created), name))
+                    if name == 'slug':
+                        if route.startswith('/blog/category/'):
+                            return category.slug if category else '_none'
+                        return tag.slug if tag else ''
+                    if 'comment' in route:
+                        return str(comment.pk) if comment else '0'
+                    return str(post.pk)
+
+                yield route, CONVERTER_RE.sub(fill, route)
+
+    def measure(self, client, route, path, aliases, count, warmup):
+        for _ in range(warmup):
+            client.get(path)
+
+        latencies = []
+        queries = []
+        status_codes = set()
+        started = time.perf_counter()
+        for _ in range(count):
+            with ExitStack() as stack:
+                captures = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in aliases]
+                start = time.perf_counter()
+                response = client.get(path)
+                latencies.append(time.perf_counter() - start)
+            queries.append(sum(len(capture) for capture in captures))
+            status_codes.add(response.status_code)
+        elapsed = time.perf_counter() - started
+
+        return {
+            'route': route,
+            'path': path,
+            'status': sorted(status_codes),
+            'requests': count,
+            'throughput': count / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'queries': max(queries),
+        }
+
+    def print_results(self, results):
+        self.stdout.write('{:<36} {:>8} {:>10} {:>9} {:>9} {:>9} {:>8}'.format(
+            'route', 'status', 'req/s', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'queries'
+        ))
+        for result in results:
+            if 'skipped' in result:
+                self.stdout.write('{:<36} skipped ({})'.format(result['route'], result['skipped']))
+                continue
+            self.stdout.write('{:<36} {:>8} {:>10.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>8}'.format(
+                result['route'], ','.join(str(code) for code in result['status']), result['throughput'],
+                result['p50_ms'], result['p95_ms'], result['p99_ms'], result['queries'],
+            ))
@@ -0,0 +1,200 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from blog import archive, search
+from blog.bulk import keep_timestamps, next_pk
+from blog.conditional import mark_shared_changed
+from blog.context_processors import invalidate_sidebar
+from blog.models import Post, Comment, Tag, Category
+from blog.rendering import get_content_hash, get_renderer_version, render_markdown, make_excerpt
+
+# 성능 측정용 데이터. 같은 --seed 면 같은 내용이 만들어진다.
+# save() / signal 을 거치지 않고 bulk_create 하므로 렌더링된 HTML, 검색 인덱스, 캐시는 여기서 직접 채운다.
+
+KOREAN_WORDS = (
+    '서울 부산 개발 블로그 장고 파이썬 데이터베이스 검색 캐시 성능 서버 요청 응답 사용자 댓글 카테고리 태그 '
+    '오늘 어제 프로젝트 배포 테스트 코드 리뷰 설계 구조 모델 템플릿 쿼리 인덱스 페이지 목록 상세 이미지 '
+    '여행 음식 음악 영화 독서 운동 일상 생각 정리 기록 공부 회사 학교 친구 가족 주말 계획 경험'
+).split()
+ENGLISH_WORDS = (
+    'django python database search cache performance server request response user comment category tag '
+    'today yesterday project deploy test code review design model template query index page list detail image '
+    'travel food music movie reading workout daily note study work school friend family weekend plan'
+).split()
+
+LANGUAGES = (KOREAN_WORDS, ENGLISH_WORDS)
+DAYS = 365 * 5
+COMMENT_POOL_SIZE = 5000
+
+
+def make_sentence(rng, words, length):
+    sentence = ' '.join(rng.choice(words) for _ in range(length))
+    return sentence[0].upper() + sentence[1:] + '.'
+
+
+def make_paragraph(rng, words):
+    return ' '.join(make_sentence(rng, words, rng.randint(5, 14)) for _ in range(rng.randint(2, 6)))
+
+
+def make_markdown(rng):
+    words = rng.choice(LANGUAGES)
+    blocks = []
+    for _ in range(rng.randint(3, 8)):
+        kind = rng.random()
+        if kind < 0.15:
+            blocks.append('## ' + make_sentence(rng, words, 3)[:-1])
+        elif kind < 0.3:
+            blocks.append('\n'.join('- ' + make_sentence(rng, words, rng.randint(2, 6)) for _ in range(rng.randint(2, 5))))
+        elif kind < 0.4:
+            blocks.append('```python\ndef {}():\n    return {}\n```'.format(rng.choice(ENGLISH_WORDS), rng.randint(0, 999)))
+        else:
+            paragraph = make_paragraph(rng, words)
+            if rng.random() < 0.3:
+                paragraph = paragraph.replace(' ', ' **', 1).replace('.', '**.', 1)
+            blocks.append(paragraph)
+    return '\n\n'.join(blocks)
+
+
+class Command(BaseCommand):
+    help = '성능 측정용 글/댓글/태그/카테고리를 한꺼번에 만듭니다. (한국어, 영어 Markdown)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=1000000)
+        parser.add_argument('--tags', type=int, default=300)
+        parser.add_argument('--categories', type=int, default=30)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.renderer_version = get_renderer_version()
+        self.now = timezone.now()
+
+        user_ids = self.create_users(rng, options['users'])
+        category_ids = self.create_categories(rng, options['categories'])
+        tag_ids = self.create_tags(rng, options['tags'])
+        post_ids = self.create_posts(rng, options['posts'], user_ids, category_ids, tag_ids)
+        self.create_comments(rng, options['comments'], user_ids, post_ids)
+
+        if search.is_supported():
+            search.rebuild_index(Post.objects.all())
+        archive.rebuild()
+        invalidate_sidebar()
+        mark_shared_changed()
+
+    def bulk_create(self, model, objects):
+        with transaction.atomic():
+            model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def random_time(self, rng):
+        return self.now - timedelta(seconds=rng.randint(0, DAYS * 24 * 60 * 60))
+
+    def create_users(self, rng, count):
+        start = next_pk(User)
+        password = make_password(None)  # 로그인할 수 없는 비밀번호 (해시는 한 번만 계산한다)
+        self.bulk_create(User, [
+            User(pk=pk, username='bench{}'.format(pk), password=password, date_joined=self.now)
+            for pk in range(start, start + count)
+        ])
+        self.stdout.write('users: {}'.format(count))
+        return list(range(start, start + count))
+
+    def create_categories(self, rng, count):
+        start = next_pk(Category)
+        categories = []
+        for pk in range(start, start + count):
+            word = rng.choice(rng.choice(LANGUAGES))
+            name = '{}-{}'.format(word, pk)[:25]
+            categories.append(Category(pk=pk, name=name, slug=name))
+        self.bulk_create(Category, categories)
+        self.stdout.write('categories: {}'.format(count))
+        return list(range(start, start + count))
+
+    def create_tags(self, rng, count):
+        start = next_pk(Tag)
+        tags = []
+        for pk in range(start, start + count):
+            word = rng.choice(rng.choice(LANGUAGES))
+            name = '{}{}'.format(word, pk)[:40]
+            tags.append(Tag(pk=pk, name=name, slug=name))
+        self.bulk_create(Tag, tags)
+        self.stdout.write('tags: {}'.format(count))
+        return list(range(start, start + count))
+
+    def create_posts(self, rng, count, user_ids, category_ids, tag_ids):
+        start = next_pk(Post)
+        created_field = Post._meta.get_field('created')
+        updated_field = Post._meta.get_field('updated_at')
+        Through = Post.tags.through
+
+        with keep_timestamps(created_field, updated_field):
+            for batch_start in range(start, start + count, self.batch_size):
+                posts = []
+                post_tags = []
+                for pk in range(batch_start, min(batch_start + self.batch_size, start + count)):
+                    content = make_markdown(rng)
+                    content_html = render_markdown(content)
+                    created = self.random_time(rng)
+                    posts.append(Post(
+                        pk=pk,
+                        title=make_sentence(rng, rng.choice(LANGUAGES), 3)[:30],
+                        content=content,
+                        content_html=content_html,
+                        content_hash=get_content_hash(content),
+                        render_version=self.renderer_version,
+                        excerpt=make_excerpt(content_html),
+                        created=created,
+                        updated_at=created,
+                        author_id=rng.choice(user_ids),
+                        # 약 10% 는 미분류
+                        category_id=rng.choice(category_ids) if category_ids and rng.random() > 0.1 else None,
+                    ))
+                    for tag_id in rng.sample(tag_ids, min(len(tag_ids), rng.randint(0, 4))):
+                        post_tags.append(Through(post_id=pk, tag_id=tag_id))
+
+                with transaction.atomic():
+                    Post.objects.bulk_create(posts)
+                    Through.objects.bulk_create(post_tags)
+                self.stdout.write('posts: {}/{}'.format(batch_start - start + len(posts), count))
+
+        return list(range(start, start + count))
+
+    def create_comments(self, rng, count, user_ids, post_ids):
+        if not post_ids:
+            return
+
+        created_field = Comment._meta.get_field('created_at')
+        modified_field = Comment._meta.get_field('modified_at')
+        # 댓글은 짧은 문장 묶음에서 골라 쓰고, 렌더링도 묶음에 대해 한 번만 한다.
+        pool = []
+        for _ in range(COMMENT_POOL_SIZE):
+            text = make_sentence(rng, rng.choice(LANGUAGES), rng.randint(2, 12))
+            pool.append((text, render_markdown(text), get_content_hash(text)))
+
+        with keep_timestamps(created_field, modified_field):
+            for batch_start in range(0, count, self.batch_size):
+                comments = []
+                for _ in range(min(self.batch_size, count - batch_start)):
+                    text, text_html, text_hash = rng.choice(pool)
+                    created_at = self.random_time(rng)
+                    comments.append(Comment(
+                        post_id=rng.choice(post_ids),
+                        text=text,
+                        text_html=text_html,
+                        text_hash=text_hash,
+                        render_version=self.renderer_version,
+                        author_id=rng.choice(user_ids),
+                        created_at=created_at,
+                        modified_at=created_at,
+                    ))
+                self.bulk_create(Comment, comments)
+                self.stdout.write('comments: {}/{}'.format(batch_start + len(comments), count))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from blog import thumbnails
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = '기존 Post.head_image 의 축소본(card, detail / JPEG, WebP)을 만듭니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='이미 축소본이 있는 글도 다시 확인합니다.')
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.exclude(head_image='').only('pk', 'head_image', 'head_image_hash').order_by('pk')
+        if not options['force']:
+            queryset = queryset.filter(head_image_hash='')
+
+        count = failed = 0
+        for post in queryset.iterator():
+            try:
+                # 같은 원본은 해시로 경로가 정해지므로 이미 있는 축소본은 다시 만들지 않는다.
+                thumbnails.generate_for_post(post)
+                count += 1
+            except (OSError, ValueError) as e:
+                failed += 1
+                self.stderr.write('Post {}: {}'.format(post.pk, e))
+
+        self.stdout.write('{} posts processed, {} failed'.format(count, failed))
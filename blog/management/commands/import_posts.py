@@ -0,0 +1,237 @@
+import json
+import os
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+from django.utils.text import slugify
+
+from blog import archive, pagecache, search
+from blog.bulk import keep_timestamps, next_pk
+from blog.conditional import mark_shared_changed
+from blog.context_processors import invalidate_sidebar
+from blog.models import Post, Tag, Category
+
+# 예전 글을 한꺼번에 옮긴다.
+#
+#   python manage.py import_posts posts/            # front matter 가 있는 .md 파일이 든 폴더
+#   python manage.py import_posts posts.jsonl       # 한 줄에 글 하나씩 JSON
+#
+# front matter (--- 로 감싼 key: value) 와 JSON 에서 읽는 항목:
+#   title, content(JSONL), author(username), category(이름), tags(쉼표로 구분 또는 [a, b] / JSON 배열), created
+#
+# --batch-size 개씩 한 transaction 으로 넣고, 끝난 위치를 checkpoint 파일에 적어 두었다가 다시 실행하면 이어서 넣는다.
+
+TITLE_MAX_LENGTH = Post._meta.get_field('title').max_length
+
+
+def parse_front_matter(text):
+    if not text.startswith('---'):
+        return {}, text
+
+    end = text.find('\n---', 3)
+    if end == -1:
+        return {}, text
+
+    meta = {}
+    for line in text[3:end].splitlines():
+        if ':' not in line:
+            continue
+        key, value = line.split(':', 1)
+        meta[key.strip()] = value.strip().strip('"\'')
+
+    body = text[end + 4:]
+    return meta, body[body.find('\n') + 1:] if '\n' in body else ''
+
+
+def parse_tags(value):
+    if isinstance(value, (list, tuple)):
+        names = value
+    else:
+        names = (value or '').strip('[]').split(',')
+    return [name.strip().strip('"\'') for name in names if name.strip().strip('"\'')]
+
+
+def parse_created(value):
+    if not value:
+        return None
+    created = parse_datetime(value)
+    if created is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError('created: {}'.format(value))
+        created = datetime(date.year, date.month, date.day)
+    if timezone.is_naive(created):
+        created = timezone.make_aware(created)
+    return created
+
+
+def read_markdown_dir(path):
+    for name in sorted(os.listdir(path)):
+        if not name.endswith('.md'):
+            continue
+        with open(os.path.join(path, name), encoding='utf-8') as f:
+            meta, body = parse_front_matter(f.read())
+        meta['content'] = body
+        meta.setdefault('title', os.path.splitext(name)[0])
+        yield name, meta
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                yield 'line {}'.format(number), json.loads(line)
+
+
+class Command(BaseCommand):
+    help = 'front matter Markdown 폴더 또는 JSONL 파일에서 글을 한꺼번에 가져옵니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='.md 파일이 든 폴더 또는 .jsonl 파일')
+        parser.add_argument('--author', help='author 가 없는 글의 작성자 (username)')
+        parser.add_argument('--batch-size', type=int, default=500, help='한 transaction 에 넣을 글 수')
+        parser.add_argument('--checkpoint', help='진행 위치를 적을 파일 (기본: <source>.checkpoint)')
+        parser.add_argument('--restart', action='store_true', help='checkpoint 를 무시하고 처음부터 넣는다.')
+
+    def handle(self, *args, **options):
+        source = options['source']
+        if os.path.isdir(source):
+            records = read_markdown_dir(source)
+        elif os.path.isfile(source):
+            records = read_jsonl(source)
+        else:
+            raise CommandError('{} 가 없습니다.'.format(source))
+
+        self.checkpoint = options['checkpoint'] or source.rstrip('/\\') + '.checkpoint'
+        done = 0 if options['restart'] else self.read_checkpoint()
+        self.default_author = options['author']
+        self.touched_tags = set()
+
+        imported = 0
+        batch = []
+        for position, (location, record) in enumerate(records):
+            if position < done:
+                continue
+            batch.append((location, record))
+            if len(batch) >= options['batch_size']:
+                imported += self.import_batch(batch)
+                done = position + 1
+                self.write_checkpoint(done)
+                batch = []
+        if batch:
+            imported += self.import_batch(batch)
+            self.write_checkpoint(done + len(batch))
+
+        if imported:
+            # bulk_create 는 signal 을 보내지 않으므로 목록 / 사이드바 캐시를 직접 무효화한다.
+            invalidate_sidebar()
+            mark_shared_changed()
+            pagecache.invalidate('list', 'sidebar', *self.touched_tags)
+        self.stdout.write('{} posts imported (checkpoint: {})'.format(imported, self.checkpoint))
+
+    def read_checkpoint(self):
+        try:
+            with open(self.checkpoint) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, done):
+        # 쓰다가 멈춰도 checkpoint 가 깨지지 않도록 임시 파일에 쓰고 바꾼다.
+        tmp_path = self.checkpoint + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(done))
+        os.replace(tmp_path, self.checkpoint)
+
+    def import_batch(self, batch):
+        try:
+            with transaction.atomic():
+                return self.create_posts(batch)
+        except ValueError as e:
+            raise CommandError(str(e))
+        except IntegrityError as e:
+            # next_pk() 로 정한 pk 를 그 사이에 다른 곳에서 썼다. 이 묶음은 넣지 않았으므로 다시 실행하면 이어서 넣는다.
+            raise CommandError('글을 넣는 중에 다른 곳에서 글이 추가되었습니다. 다시 실행하세요. ({})'.format(e))
+
+    def create_posts(self, batch):
+        authors = self.resolve_authors(batch)
+        categories = self.resolve(
+            Category, {record['category'] for location, record in batch if record.get('category')}
+        )
+        tags = self.resolve(
+            Tag, {name for location, record in batch for name in parse_tags(record.get('tags'))}
+        )
+
+        now = timezone.now()
+        pk = next_pk(Post)
+        posts = []
+        post_tags = []
+        Through = Post.tags.through
+        for location, record in batch:
+            title = (record.get('title') or '').strip()
+            if not title or len(title) > TITLE_MAX_LENGTH:
+                raise ValueError('{}: 제목은 1~{}자여야 합니다. ({!r})'.format(location, TITLE_MAX_LENGTH, title))
+            try:
+                created = parse_created(record.get('created')) or now
+            except ValueError as e:
+                raise ValueError('{}: {}'.format(location, e))
+
+            post = Post(
+                pk=pk,
+                title=title,
+                content=record.get('content') or '',
+                author=authors[record.get('author') or self.default_author],
+                category=categories.get(record.get('category')),
+                created=created,
+                # 작성 시각은 예전 그대로 두고, updated_since 로 동기화하는 쪽(JSON API)이 새 글로 받아 가도록 지금으로 한다.
+                updated_at=now,
+            )
+            post.render_markdown()
+            posts.append(post)
+            for name in parse_tags(record.get('tags')):
+                post_tags.append(Through(post_id=pk, tag_id=tags[name].pk))
+            pk += 1
+
+        with keep_timestamps(Post._meta.get_field('created'), Post._meta.get_field('updated_at')):
+            Post.objects.bulk_create(posts)
+        Through.objects.bulk_create(post_tags)
+        search.index_posts(posts)
+        archive.posts_added(posts)
+
+        self.touched_tags.update(pagecache.category_list_tag(post.category_id) for post in posts)
+        self.touched_tags.update(pagecache.tag_list_tag(row.tag_id) for row in post_tags)
+        self.stdout.write('{} posts'.format(len(posts)))
+        return len(posts)
+
+    def resolve_authors(self, batch):
+        usernames = {record.get('author') or self.default_author for location, record in batch}
+        if None in usernames:
+            raise ValueError('author 가 없는 글이 있습니다. --author 를 지정하세요.')
+        authors = {user.username: user for user in User.objects.filter(username__in=usernames)}
+        missing = usernames - set(authors)
+        if missing:
+            raise ValueError('없는 사용자입니다: {}'.format(', '.join(sorted(missing))))
+        return authors
+
+    def resolve(self, model, names):
+        """이름으로 Category / Tag 를 찾고 없는 것은 만든다. {이름: 객체}"""
+        if not names:
+            return {}
+        found = {obj.name: obj for obj in model.objects.filter(name__in=names)}
+        missing = names - set(found)
+        if missing:
+            model.objects.bulk_create(
+                [model(name=name, slug=slugify(name, allow_unicode=True)) for name in missing],
+                ignore_conflicts=True,
+            )
+            found.update((obj.name, obj) for obj in model.objects.filter(name__in=missing))
+            if set(found) != names:
+                # slug 가 이미 다른 이름에 쓰이고 있으면 만들지 못한다.
+                raise ValueError('{} 를 만들 수 없습니다: {}'.format(
+                    model._meta.verbose_name, ', '.join(sorted(names - set(found)))
+                ))
+        return found
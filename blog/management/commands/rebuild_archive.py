@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog import archive, pagecache
+from blog.context_processors import invalidate_sidebar
+
+
+class Command(BaseCommand):
+    help = '월별 / 카테고리별 월별 글 수(MonthlyPostCount, CategoryMonthlyPostCount)를 글 전체로 다시 셉니다.'
+
+    def handle(self, *args, **options):
+        count = archive.rebuild()
+        invalidate_sidebar()
+        pagecache.invalidate('sidebar')
+        self.stdout.write('{} months counted'.format(count))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from blog import related
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = '모든 글의 관련 글(RelatedPost)을 태그 / 카테고리로 다시 계산합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = related.rebuild(Post.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write('{} posts rebuilt'.format(count))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import search
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Post 전체로 FTS5 검색 인덱스(blog_post_fts)를 다시 만듭니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError('FTS5 검색 인덱스는 SQLite 에서만 사용할 수 있습니다.')
+
+        count = search.rebuild_index(Post.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write('{} posts indexed'.format(count))
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blog import objectcache, pagecache
+from blog.models import Post, Comment
+from blog.rendering import get_renderer_version
+
+
+class Command(BaseCommand):
+    help = 'Markdown 확장/렌더러가 바뀌었을 때 Post, Comment 의 저장된 HTML 을 일괄로 다시 렌더링합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='버전과 상관없이 모든 행을 다시 렌더링합니다.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        targets = (
+            (Post, 'content', ['content_html', 'content_hash', 'render_version', 'excerpt', 'updated_at'],
+             self.posts_rendered),
+            (Comment, 'text', ['text_html', 'text_hash', 'render_version', 'post'], self.comments_rendered),
+        )
+        for model, source_field, fields, rendered in targets:
+            count = self.rerender(model, source_field, fields, rendered, options['all'], options['batch_size'])
+            self.stdout.write('{}: {} rendered'.format(model.__name__, count))
+        # 목록 카드의 excerpt 도 바뀌었을 수 있다.
+        pagecache.invalidate('list')
+
+    def rerender(self, model, source_field, fields, rendered, force, batch_size):
+        queryset = model.objects.only('pk', source_field, *fields).order_by('pk')
+        if not force:
+            queryset = queryset.exclude(render_version=get_renderer_version())
+
+        count = 0
+        last_pk = 0
+        while True:
+            # 갱신 중인 테이블을 iterator 로 읽지 않도록 pk 기준으로 끊어서 가져온다.
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+
+            now = timezone.now()
+            for instance in batch:
+                instance.render_markdown(force=True)
+                if 'updated_at' in fields:
+                    # 상세 / 목록 페이지의 ETag 가 바뀌도록 같이 저장한다.
+                    instance.updated_at = now
+            model.objects.bulk_update(batch, [name for name in fields if name != 'post'])
+            # bulk_update 는 save() / signal 을 거치지 않으므로 캐시는 직접 무효화한다.
+            rendered(batch)
+
+            count += len(batch)
+            last_pk = batch[-1].pk
+        return count
+
+    def posts_rendered(self, posts):
+        pks = [post.pk for post in posts]
+        objectcache.invalidate(Post, *pks)
+        pagecache.invalidate(*['post:{}'.format(pk) for pk in pks])
+
+    def comments_rendered(self, comments):
+        # 상세 페이지의 ETag 는 댓글이 바뀐 시각(comment_activity_at)도 본다.
+        post_ids = {comment.post_id for comment in comments}
+        Post.objects.filter(pk__in=post_ids).update(comment_activity_at=timezone.now())
+        objectcache.invalidate(Comment, *[comment.pk for comment in comments])
+        objectcache.invalidate(Post, *post_ids)
+        pagecache.invalidate(*['comments:{}'.format(pk) for pk in post_ids])
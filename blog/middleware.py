@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+
+from . import objectcache, pagecache, viewcount
+
+
+class PageCacheMiddleware:
+    """
+    로그인하지 않은 사용자에게 캐시된 페이지를 그대로 돌려준다.
+    MIDDLEWARE 의 맨 앞에 두어야 캐시 적중 시 세션/DB 를 전혀 거치지 않는다.
+    ASGI 에서는 async 로 동작해서 async view 까지 thread 를 거치지 않는다. (캐시를 읽고 쓸 때만 거친다)
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # django.utils.deprecation.MiddlewareMixin 과 같은 방법으로 async middleware 임을 알린다.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        if not pagecache.is_cacheable_request(request):
+            return self.get_response(request)
+
+        response = pagecache.get_cached_response(request)
+        if response is not None:
+            return response
+
+        started_at = time.time()
+        response = self.get_response(request)
+        self.store_response(request, response, started_at)
+        return response
+
+    async def __acall__(self, request):
+        # 캐시 backend(파일 / memcached)는 blocking I/O 이므로 event loop 밖에서 읽고 쓴다.
+        if not pagecache.is_cacheable_request(request):
+            return await self.get_response(request)
+
+        response = await sync_to_async(pagecache.get_cached_response, thread_sensitive=True)(request)
+        if response is not None:
+            return response
+
+        started_at = time.time()
+        response = await self.get_response(request)
+        await sync_to_async(self.store_response, thread_sensitive=True)(request, response, started_at)
+        return response
+
+    def store_response(self, request, response, started_at):
+        tags = getattr(request, 'page_cache_tags', None)
+        if tags is not None:
+            pagecache.store_response(request, response, tags, started_at)
+
+
+class ViewCountMiddleware:
+    """
+    view 가 viewcount.count_view() 로 표시한 응답(상세 페이지)을 조회로 센다.
+    page cache 에서 바로 나간 응답도 세도록 PageCacheMiddleware 보다 앞에 둔다.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        response = self.get_response(request)
+        if self.count(request, response):
+            viewcount.counter.flush()
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.count(request, response):
+            # 요청을 처리하는 sync thread 에서 기록한다. (그 thread 의 연결은 request_started / finished 가 정리한다)
+            # thread_sensitive=False 로 다른 thread 에서 쓰면 그 thread 의 연결이 닫히지 않고 남는다.
+            await sync_to_async(viewcount.counter.flush, thread_sensitive=True)()
+        return response
+
+    def count(self, request, response):
+        """조회를 세고, 모아 둔 조회를 기록할 때가 되었으면 True"""
+        post_id = getattr(response, viewcount.VIEW_ATTR, None)
+        if post_id is None or response.status_code not in (200, 304) or not viewcount.is_countable(request):
+            return False
+        return viewcount.counter.add(post_id)
+
+
+class ObjectCacheMiddleware:
+    """요청마다 blog.objectcache 의 memo 를 새로 만든다. (같은 요청 안에서 같은 객체를 다시 읽지 않도록)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        token = objectcache.request_memo.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            objectcache.request_memo.reset(token)
+
+    async def __acall__(self, request):
+        # sync_to_async 로 다른 thread 에서 실행하는 쿼리도 context 를 복사해 가므로 같은 memo 를 본다.
+        token = objectcache.request_memo.set({})
+        try:
+            return await self.get_response(request)
+        finally:
+            objectcache.request_memo.reset(token)
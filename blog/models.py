@@ -5,7 +5,8 @@
 from django.db import models
 from django.contrib.auth.models import User
 from markdownx.models import MarkdownxField
-from markdownx.utils import markdown
+from . import thumbnails
+from .rendering import refresh_rendered, make_excerpt
 
 
 class Tag(models.Model):
@@ -37,20 +38,55 @@ class Category(models.Model):
         verbose_name_plural = "Categories"
 
 
+class PostQuerySet(models.QuerySet):
+    def for_list(self):
+        # 목록 카드에서 쓰는 필드만 가져온다. (본문 대신 저장해 둔 excerpt 를 쓴다)
+        return self.select_related('author', 'category').prefetch_related(
+            models.Prefetch('tags', queryset=Tag.objects.only('name', 'slug'))
+        ).only(
+            'title', 'excerpt', 'head_image', 'head_image_hash', 'created',
+            'author', 'author__username',
+            'category', 'category__name', 'category__slug',
+        )
+
+
 class Post(models.Model):
     title = models.CharField(max_length=30)
     content = MarkdownxField()
 
     head_image = models.ImageField(upload_to='blog/%Y/%m-%d/', blank=True)
+    # 축소본(blog.thumbnails)이 만들어진 원본의 해시. 비어 있으면 원본을 그대로 보여준다.
+    head_image_hash = models.CharField(max_length=40, blank=True, editable=False)
 
     created = models.DateTimeField(auto_now_add=True)  # Post가 생성이 될 때 자동으로 담아준다.
+    updated_at = models.DateTimeField(auto_now=True)
+    # 마지막으로 댓글이 작성/수정/삭제된 시각 (상세 페이지의 Last-Modified 계산용)
+    comment_activity_at = models.DateTimeField(blank=True, null=True, editable=False)
+    # 마지막으로 관련 글 목록(RelatedPost)이 바뀐 시각 (상세 페이지의 Last-Modified 계산용)
+    related_updated_at = models.DateTimeField(blank=True, null=True, editable=False)
     # on_delete => User가 탈퇴를 할 경우 다 삭제를 한다.
     author = models.ForeignKey(User, on_delete=models.CASCADE)  # django 3.0 ~
     category = models.ForeignKey(Category, blank=True, null=True, on_delete=models.SET_NULL)
     tags = models.ManyToManyField(Tag, blank=True)
 
+    objects = PostQuerySet.as_manager()
+
+    # 저장할 때 미리 렌더링한 HTML (content 의 해시와 렌더러 버전으로 갱신 여부를 판단)
+    content_html = models.TextField(blank=True, editable=False)
+    content_hash = models.CharField(max_length=40, blank=True, editable=False)
+    render_version = models.CharField(max_length=20, blank=True, editable=False)
+    # 목록 카드용: Markdown 을 걷어낸 평문 요약
+    excerpt = models.TextField(blank=True, editable=False)
+
     class Meta:
-        ordering = ['-created', ]
+        # pk 까지 포함해야 같은 시각에 작성된 글 사이에서도 cursor pagination 순서가 고정된다.
+        ordering = ['-created', '-pk']
+        indexes = [
+            # 목록의 (created, pk) 순서와 날짜별 보관함(archive)의 created 범위 검색에 쓴다.
+            models.Index(fields=['created', 'id'], name='blog_post_created'),
+            # 목록 / feed 의 ETag (blog.conditional.get_list_validator) 는 가장 최근에 바뀐 글 하나만 읽는다.
+            models.Index(fields=['updated_at'], name='blog_post_updated_at'),
+        ]
 
     def __str__(self):
         return '{} :: {}'.format(self.title, self.author)
@@ -61,8 +97,114 @@ class Post(models.Model):
     def get_update_url(self):
         return self.get_absolute_url() + 'update/'
 
+    def get_head_image_srcset(self, kind, ext='jpg'):
+        if not self.head_image_hash:
+            return ''
+        return thumbnails.get_srcset(self.head_image_hash, kind, ext)
+
+    def get_head_image_url(self, kind):
+        if not self.head_image_hash:
+            return self.head_image.url
+        return thumbnails.get_url(self.head_image_hash, kind)
+
+    @property
+    def card_image_url(self):
+        return self.get_head_image_url('card')
+
+    @property
+    def card_srcset(self):
+        return self.get_head_image_srcset('card')
+
+    @property
+    def card_webp_srcset(self):
+        return self.get_head_image_srcset('card', 'webp')
+
+    @property
+    def detail_image_url(self):
+        return self.get_head_image_url('detail')
+
+    @property
+    def detail_srcset(self):
+        return self.get_head_image_srcset('detail')
+
+    @property
+    def detail_webp_srcset(self):
+        return self.get_head_image_srcset('detail', 'webp')
+
+    def render_markdown(self, force=False):
+        rendered = refresh_rendered(self, 'content', 'content_html', 'content_hash', force=force)
+        if rendered:
+            self.excerpt = make_excerpt(self.content_html)
+        return rendered
+
     def get_markdown_content(self):
-        return markdown(self.content)
+        self.render_markdown()
+        return self.content_html
+
+    def save(self, *args, **kwargs):
+        rendered = self.render_markdown()
+        update_fields = kwargs.get('update_fields')
+        if rendered and update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'content_html', 'content_hash', 'render_version', 'excerpt'}
+        super(Post, self).save(*args, **kwargs)
+
+
+class RelatedPost(models.Model):
+    """글마다 미리 계산해 둔 관련 글 상위 몇 개 (blog.related)"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_posts')
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'related'], name='blog_relatedpost_unique'),
+        ]
+        # 상세 페이지는 post 로 걸러서 score 순으로 읽는다.
+        indexes = [
+            models.Index(fields=['post', '-score'], name='blog_relatedpost_score'),
+        ]
+
+
+class PostStats(models.Model):
+    """조회수와 인기 점수 (blog.viewcount 가 모아 두었다가 한꺼번에 기록한다)"""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    view_count = models.PositiveIntegerField(default=0)
+    # log(Σ exp(조회 시각 / tau)) - 최근에 많이 본 글일수록 크다.
+    # 시간이 지나도 모든 글이 같은 비율로 줄어들 뿐이므로 다시 계산하지 않아도 이 값의 순서가 인기 순서이다.
+    popularity = models.FloatField(default=0, db_index=True)
+
+
+class MonthlyPostCount(models.Model):
+    """월별 글 수 (blog.archive 가 Post 저장/삭제 때 고친다)"""
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-year', '-month']
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'month'], name='blog_monthlypostcount_unique'),
+        ]
+
+    def get_absolute_url(self):
+        return '/blog/archive/{}/{}/'.format(self.year, self.month)
+
+
+class CategoryMonthlyPostCount(models.Model):
+    """카테고리별 월별 글 수 (미분류 글은 MonthlyPostCount 에서 뺀 나머지)"""
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-year', '-month']
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'year', 'month'], name='blog_categorymonthlypostcount_unique'),
+        ]
+
+    def get_absolute_url(self):
+        return '{}archive/{}/{}/'.format(self.category.get_absolute_url(), self.year, self.month)
 
 
 class Comment(models.Model):
@@ -73,8 +215,30 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
 
+    text_html = models.TextField(blank=True, editable=False)
+    text_hash = models.CharField(max_length=40, blank=True, editable=False)
+    render_version = models.CharField(max_length=20, blank=True, editable=False)
+
+    def render_markdown(self, force=False):
+        return refresh_rendered(self, 'text', 'text_html', 'text_hash', force=force)
+
     def get_markdown_content(self):
-        return markdown(self.text)
+        self.render_markdown()
+        return self.text_html
+
+    def save(self, *args, **kwargs):
+        rendered = self.render_markdown()
+        update_fields = kwargs.get('update_fields')
+        if rendered and update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'text_html', 'text_hash', 'render_version'}
+        super(Comment, self).save(*args, **kwargs)
 
     def get_absolute_url(self):
         return self.post.get_absolute_url() + '#comment-id-{}'.format(self.pk)
+
+
+class DeletedObject(models.Model):
+    """지워진 글 / 댓글 (blog.api 의 /api/v1/deleted/ 로 동기화하는 쪽에 알려준다)"""
+    resource = models.CharField(max_length=20)  # blog.api.RESOURCES 의 이름 (posts, comments)
+    object_id = models.PositiveIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
@@ -0,0 +1,199 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import Http404
+
+from .models import Post
+
+# pk / slug 로 Post, Category, Tag, Comment 를 찾는 read-through 캐시.
+# 한 요청 안에서 같은 카테고리/태그/글을 여러 번 읽지 않고, 자주 보는 글은 요청마다 다시 읽지 않도록
+#   1. 요청마다 ObjectCacheMiddleware 가 새로 만드는 memo (같은 요청에서는 같은 객체를 돌려준다)
+#   2. 프로세스 안의 LRU (BLOG_OBJECT_CACHE_SIZE 개, BLOG_OBJECT_CACHE_TIMEOUT 초)
+# 순서로 찾고 없으면 DB 에서 읽어 채운다. 없는 pk / slug 도 None 으로 기억해 두고 바로 Http404 를 낸다.
+#
+# 저장/삭제 signal 에서 그 객체의 항목만 지운다. (blog/signals.py)
+# 다른 프로세스에서 바뀐 것은 지울 수 없으므로 TIMEOUT 이 지나야 보인다.
+# (상세 페이지는 ETag 를 만들 때 DB 에서 읽은 값과 비교해서(is_current) 다르면 다시 읽는다)
+# LRU 에는 pickle 한 것을 넣어 두고 꺼낼 때마다 새 객체를 만든다. (요청끼리 같은 객체를 고치지 않도록)
+
+MISSING = object()
+
+request_memo = ContextVar('object_memo', default=None)
+
+
+def get_max_size():
+    return getattr(settings, 'BLOG_OBJECT_CACHE_SIZE', 1000)
+
+
+def get_timeout():
+    return getattr(settings, 'BLOG_OBJECT_CACHE_TIMEOUT', 60)
+
+
+def get_queryset(model):
+    if model is Post:
+        # 상세 페이지에서 쓰는 관계까지 같이 넣어 둔다.
+        return Post.objects.select_related('author', 'category', 'stats').prefetch_related('tags')
+    return model._default_manager.all()
+
+
+class LRUCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key: (만료 시각, 값)
+        # 항목을 지울 때마다 늘린다. DB 에서 읽는 사이에 지워진 항목은 읽은 값으로 다시 채우지 않는다.
+        self.generation = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, generation):
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = (time.monotonic() + get_timeout(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > get_max_size():
+                self.entries.popitem(last=False)
+
+    def delete_matching(self, match):
+        with self.lock:
+            self.generation += 1
+            for key in [key for key, (expires, value) in self.entries.items() if match(key, value)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+
+objects = LRUCache()
+
+
+def not_found(model):
+    return Http404('{} 이(가) 없습니다.'.format(model._meta.verbose_name))
+
+
+def store(model, obj, generation, db, slug=None):
+    """DB 에서 읽은 obj (없으면 None) 를 LRU 와 memo 에 넣는다."""
+    memo = request_memo.get()
+    label = model._meta.label
+    if slug is not None:
+        key = (label, db, 'slug', slug)
+        objects.set(key, None if obj is None else obj.pk, generation)
+        if memo is not None:
+            memo[key] = None if obj is None else obj.pk
+    if obj is not None:
+        key = (label, db, 'pk', obj.pk)
+        objects.set(key, pickle.dumps(obj, pickle.HIGHEST_PROTOCOL), generation)
+        if memo is not None:
+            memo[key] = obj
+
+
+def get_object(model, pk, is_current=None):
+    """
+    pk 의 객체, 없으면 Http404
+    is_current(캐시에 있던 객체 또는 None) 가 False 이면 (다른 프로세스에서 바뀐 것) 버리고 DB 에서 다시 읽는다.
+    """
+    pk = model._meta.pk.to_python(pk)
+    queryset = get_queryset(model)
+    key = (model._meta.label, queryset.db, 'pk', pk)
+
+    memo = request_memo.get()
+    if memo is not None and key in memo:
+        obj = memo[key]
+    else:
+        data = objects.get(key)
+        obj = data if data is MISSING or data is None else pickle.loads(data)
+    if obj is not MISSING and is_current is not None and not is_current(obj):
+        invalidate(model, pk)
+        obj = MISSING
+
+    if obj is MISSING:
+        generation = objects.generation
+        obj = queryset.filter(pk=pk).first()
+        if obj is None:
+            objects.set(key, None, generation)
+        else:
+            store(model, obj, generation, queryset.db)
+    if memo is not None:
+        memo[key] = obj
+
+    if obj is None:
+        raise not_found(model)
+    return obj
+
+
+def get_by_slug(model, slug):
+    """slug 의 객체, 없으면 Http404 (slug -> pk 를 기억해 두고 pk 로 찾는다)"""
+    queryset = get_queryset(model)
+    key = (model._meta.label, queryset.db, 'slug', slug)
+
+    memo = request_memo.get()
+    pk = memo.get(key, MISSING) if memo is not None else MISSING
+    if pk is MISSING:
+        pk = objects.get(key)
+    if pk is MISSING:
+        # 처음 보는 slug 는 객체까지 한 번에 읽어서 둘 다 채운다.
+        generation = objects.generation
+        obj = queryset.filter(slug=slug).first()
+        store(model, obj, generation, queryset.db, slug=slug)
+        if obj is None:
+            raise not_found(model)
+        return obj
+
+    if memo is not None:
+        memo[key] = pk
+    if pk is None:
+        raise not_found(model)
+    return get_object(model, pk)
+
+
+def delete_matching(match):
+    objects.delete_matching(match)
+    memo = request_memo.get()
+    if memo is not None:
+        for key in [key for key, value in memo.items() if match(key, value)]:
+            del memo[key]
+
+
+def invalidate(model, *pks, slugs=()):
+    """pks 의 객체와 그 객체를 가리키는 slug, 그리고 slugs (없는 slug 로 기억해 둔 것일 수 있다) 를 지운다."""
+    label = model._meta.label
+    pks = {model._meta.pk.to_python(pk) for pk in pks}
+    slugs = set(slugs)
+
+    def match(key, value):
+        if key[0] != label:
+            return False
+        if key[2] == 'pk':
+            return key[3] in pks
+        return key[3] in slugs or value in pks
+
+    delete_matching(match)
+
+
+def invalidate_model(model):
+    """model 의 항목을 모두 지운다. (캐시한 객체에 같이 넣어 둔 관계가 바뀌었을 때)"""
+    label = model._meta.label
+    delete_matching(lambda key, value: key[0] == label)
+
+
+def clear():
+    objects.clear()
+    memo = request_memo.get()
+    if memo is not None:
+        memo.clear()
@@ -0,0 +1,153 @@
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches, DEFAULT_CACHE_ALIAS
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+# 로그인하지 않은 사용자용 전체 페이지 캐시.
+# 페이지마다 의존하는 태그(post:<pk>, list, sidebar ...)의 버전을 함께 저장해 두고,
+# 꺼낼 때 태그 버전이 하나라도 바뀌었으면 버린다. 무효화는 태그 버전을 새 값으로 바꾸기만 하면 된다.
+#
+# 태그 버전은 (바꾼 시각, 임의 문자열) 이다. cache.incr 는 backend 에 따라(FileBasedCache) get 후 set 이라
+# 두 프로세스가 같이 올리면 하나가 사라지지만, 매번 겹치지 않는 값을 set 하면 어느 쪽이 남아도 바뀐 것은 보인다.
+# view 가 DB 를 읽은 뒤 저장하기 전에 태그가 바뀌면 옛 HTML 이 새 버전으로 저장되므로,
+# 요청을 받은 시각(view 실행 전) 뒤에 바뀐 태그가 있으면 저장하지 않는다. (서버가 여러 대이면 시계가 맞아 있어야 한다)
+
+PAGE_KEY = 'blog:pagecache:page:{}'
+TAG_KEY = 'blog:pagecache:tag-version:{}'
+
+# 캐시에서 꺼낸 응답에도 다시 붙여 줄 응답 속성 (blog.viewcount.VIEW_ATTR: 캐시에서 나간 상세 페이지도 조회로 센다)
+KEPT_ATTRIBUTES = ('counted_post_id',)
+
+
+def is_shared_cache():
+    # LocMemCache 는 프로세스마다 따로이므로 다른 worker / 관리 명령이 올린 태그 버전을 보지 못한다.
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def get_timeout():
+    if not is_shared_cache():
+        return 0
+    return getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', 60 * 10)
+
+
+def is_cacheable_request(request):
+    # 세션 쿠키가 없으면 익명 사용자이므로 세션/사용자 조회 없이 판단할 수 있다.
+    return (
+        get_timeout() > 0
+        and request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    )
+
+
+def get_page_key(request):
+    return PAGE_KEY.format(hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest())
+
+
+def new_version(changed_at):
+    return changed_at, uuid.uuid4().hex
+
+
+def get_tag_versions(tags, create=False):
+    keys = {TAG_KEY.format(tag): tag for tag in tags}
+    versions = {keys[key]: version for key, version in cache.get_many(keys).items()}
+    if create:
+        for key, tag in keys.items():
+            if tag not in versions:
+                # 한 번도 바뀌지 않았거나 캐시에서 밀려난 태그. 바뀐 것은 아니므로 시각은 0 으로 둔다.
+                # (임의 문자열이 있으므로 밀려나기 전의 버전과 겹치지 않는다)
+                cache.add(key, new_version(0), None)
+                versions[tag] = cache.get(key)
+    return versions
+
+
+def get_cached_response(request):
+    entry = cache.get(get_page_key(request))
+    if entry is None:
+        return None
+
+    if get_tag_versions(entry['tags']) != entry['tags']:
+        return None
+
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    response['X-Page-Cache'] = 'hit'
+
+    last_modified = response.get('Last-Modified')
+    response = get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=last_modified and parse_http_date_safe(last_modified),
+        response=response,
+    )
+    for name, value in entry.get('attributes', {}).items():
+        setattr(response, name, value)
+    return response
+
+
+def store_response(request, response, tags, started_at):
+    """started_at: view 를 실행하기 전의 time.time()"""
+    if (
+        response.status_code != 200
+        or response.streaming
+        or response.cookies
+        or 'private' in response.get('Cache-Control', '')
+        or request.META.get('CSRF_COOKIE_USED')
+    ):
+        return
+
+    versions = get_tag_versions(set(tags), create=True)
+    if any(version is None or version[0] >= started_at for version in versions.values()):
+        # view 가 실행되는 동안 바뀌었다. (읽은 내용이 새 버전보다 오래되었을 수 있다)
+        return
+
+    entry = {
+        'tags': versions,
+        'content': response.content,
+        'status': response.status_code,
+        'headers': list(response.items()),
+        'attributes': {name: getattr(response, name) for name in KEPT_ATTRIBUTES if hasattr(response, name)},
+    }
+    cache.set(get_page_key(request), entry, get_timeout())
+
+
+def invalidate(*tags):
+    changed_at = time.time()
+    cache.set_many({TAG_KEY.format(tag): new_version(changed_at) for tag in tags}, None)
+
+
+def category_list_tag(category_id):
+    return 'list:category:{}'.format(category_id or 'none')
+
+
+def tag_list_tag(tag_id):
+    return 'list:tag:{}'.format(tag_id)
+
+
+def get_card_tags(posts):
+    # 목록 페이지는 카드에 보이는 글과 태그 이름이 바뀔 때도 무효화되어야 한다.
+    tags = []
+    for post in posts:
+        tags.append('post:{}'.format(post.pk))
+        tags.extend('tag:{}'.format(tag.pk) for tag in post.tags.all())
+    return tags
+
+
+class PageCacheMixin:
+    """
+    View 에서 get_page_cache_tags() 로 이 페이지가 의존하는 태그를 알려주면
+    PageCacheMiddleware 가 익명 사용자 응답을 캐시에 저장한다.
+    """
+
+    def get_page_cache_tags(self, context):
+        return ['sidebar']
+
+    def render_to_response(self, context, **response_kwargs):
+        self.request.page_cache_tags = self.get_page_cache_tags(context)
+        return super(PageCacheMixin, self).render_to_response(context, **response_kwargs)
@@ -0,0 +1,161 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlencode
+
+# (created, pk) 기준 keyset(cursor) pagination.
+# OFFSET 을 쓰지 않으므로 몇 번째 페이지든 인덱스를 타고 page_size + 1 개만 읽는다.
+# 이전 링크 호환을 위해 ?page=N 도 그대로 받는다.
+
+NEXT = 'n'  # 더 오래된 글 (Older)
+PREVIOUS = 'p'  # 더 최근 글 (Newer)
+
+
+def encode_cursor(direction, created, pk):
+    raw = '{}|{}|{}'.format(direction, created.isoformat(), pk)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        direction, created, pk = raw.split('|')
+        created = parse_datetime(created)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise Http404('잘못된 페이지 cursor 입니다.')
+
+    if direction not in (NEXT, PREVIOUS) or created is None:
+        raise Http404('잘못된 페이지 cursor 입니다.')
+    return direction, created, pk
+
+
+class CursorPage:
+    def __init__(self, object_list, has_next, has_previous, next_query='', previous_query=''):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_query = next_query
+        self.previous_query = previous_query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class CursorPaginationMixin:
+    """
+    ListView 의 paginate_queryset 을 keyset 방식으로 바꾼다.
+    cursor_pagination = False 이면 (ex: 검색 결과처럼 created 순이 아닌 경우) COUNT 없는 offset 방식으로 동작한다.
+    """
+    paginate_by = 5
+    cursor_pagination = True
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        page = self.request.GET.get(self.page_kwarg)
+
+        if self.cursor_pagination and cursor:
+            page_obj = self.paginate_by_cursor(queryset, page_size, cursor)
+        elif self.cursor_pagination and not page:
+            page_obj = self.paginate_by_cursor(queryset, page_size, None)
+        else:
+            page_obj = self.paginate_by_offset(queryset, page_size, page)
+
+        return None, page_obj, page_obj.object_list, page_obj.has_other_pages()
+
+    def paginate_by_cursor(self, queryset, page_size, cursor):
+        queryset = queryset.order_by('-created', '-pk')
+        has_next = has_previous = False
+
+        if cursor is None:
+            object_list = list(queryset[:page_size + 1])
+            has_next = len(object_list) > page_size
+            object_list = object_list[:page_size]
+        else:
+            direction, created, pk = decode_cursor(cursor)
+            if direction == NEXT:
+                queryset = queryset.filter(Q(created__lt=created) | Q(created=created, pk__lt=pk))
+                object_list = list(queryset[:page_size + 1])
+                has_next = len(object_list) > page_size
+                has_previous = True
+                object_list = object_list[:page_size]
+            else:
+                queryset = queryset.filter(Q(created__gt=created) | Q(created=created, pk__gt=pk))
+                object_list = list(queryset.reverse()[:page_size + 1])
+                has_previous = len(object_list) > page_size
+                has_next = True
+                object_list = object_list[:page_size][::-1]
+
+        return self.make_page(object_list, has_next, has_previous)
+
+    def paginate_by_offset(self, queryset, page_size, page):
+        try:
+            number = int(page or 1)
+        except ValueError:
+            raise Http404('잘못된 페이지 번호입니다.')
+        if number < 1:
+            raise Http404('잘못된 페이지 번호입니다.')
+
+        if self.cursor_pagination:
+            queryset = queryset.order_by('-created', '-pk')
+
+        offset = (number - 1) * page_size
+        object_list = list(queryset[offset:offset + page_size + 1])
+        if not object_list and number > 1:
+            raise Http404('존재하지 않는 페이지입니다.')
+
+        has_next = len(object_list) > page_size
+        object_list = object_list[:page_size]
+
+        if self.cursor_pagination:
+            # 예전 ?page=N 링크로 들어와도 다음부터는 cursor 링크를 따라가도록 한다.
+            return self.make_page(object_list, has_next, number > 1)
+
+        return CursorPage(
+            object_list, has_next, number > 1,
+            next_query=urlencode({self.page_kwarg: number + 1}),
+            previous_query=urlencode({self.page_kwarg: number - 1}),
+        )
+
+    def make_page(self, object_list, has_next, has_previous):
+        next_query = previous_query = ''
+        if object_list:
+            next_query = urlencode({self.cursor_kwarg: encode_cursor(NEXT, object_list[-1].created, object_list[-1].pk)})
+            previous_query = urlencode({self.cursor_kwarg: encode_cursor(PREVIOUS, object_list[0].created, object_list[0].pk)})
+        return CursorPage(object_list, has_next, has_previous, next_query, previous_query)
+
+
+def paginate_comments(queryset, cursor, page_size):
+    """
+    댓글은 오래된 순으로 보여주고 '더 보기' 로 다음 페이지만 이어 붙인다.
+    (댓글 목록, 다음 페이지 cursor 또는 None) 을 돌려준다.
+    """
+    queryset = queryset.order_by('created_at', 'pk')
+    if cursor:
+        direction, created_at, pk = decode_cursor(cursor)
+        if direction != NEXT:
+            raise Http404('잘못된 페이지 cursor 입니다.')
+        queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+
+    comments = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(comments) > page_size:
+        comments = comments[:page_size]
+        next_cursor = encode_cursor(NEXT, comments[-1].created_at, comments[-1].pk)
+    return comments, next_cursor
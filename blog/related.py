@@ -0,0 +1,194 @@
+import math
+
+from django.db import transaction
+from django.db.models import Case, Count, FloatField, Max, Min, Sum, Value, When
+from django.utils import timezone
+
+from . import objectcache, pagecache
+from .models import Post, RelatedPost
+
+# 관련 글: 글마다 점수가 높은 RELATED_POSTS_COUNT 개를 RelatedPost 에 저장해 두고 상세 페이지는 그것만 읽는다.
+#
+#   점수 = 겹치는 태그마다 1 / log(1 + 그 태그가 붙은 글 수)  (흔한 태그일수록 덜 친다)
+#        + 같은 카테고리면 CATEGORY_WEIGHT
+#
+# 태그(m2m_changed)나 카테고리가 바뀌면 그 글의 목록과, 그 글이 들어 있거나 새로 들어갈 만한 글의 목록만 고친다.
+# 태그의 글 수가 바뀌어서 생기는 다른 글들의 점수 변화까지는 따라가지 않으므로 가끔 rebuild_related_posts 로 다시 만든다.
+# (bulk_create 로 글을 넣은 뒤에도 마찬가지)
+
+RELATED_POSTS_COUNT = 5
+CATEGORY_WEIGHT = 0.5
+# 글 하나가 바뀌었을 때 그 글을 관련 글로 넣어 볼 다른 글의 수
+CANDIDATE_LIMIT = 50
+
+Through = Post.tags.through
+
+
+def get_tag_weights(post_id):
+    """{태그 pk: 가중치} - post 에 붙은 태그만"""
+    counts = Through.objects.filter(
+        tag_id__in=Through.objects.filter(post_id=post_id).values('tag_id')
+    ).values('tag_id').annotate(count=Count('pk')).order_by()
+    return {row['tag_id']: 1 / math.log(1 + row['count']) for row in counts}
+
+
+def score_candidates(post_id, category_id, limit):
+    """[(글 pk, 점수)] 점수가 높은 순으로 limit 개"""
+    weights = get_tag_weights(post_id)
+    scores = {}
+    if weights:
+        tag_score = Sum(Case(
+            *[When(tag_id=tag_id, then=Value(weight)) for tag_id, weight in weights.items()],
+            default=Value(0.0), output_field=FloatField(),
+        ))
+        # post 마다 한 번만 더해지도록 Max 로 묶는다.
+        category_score = Max(Case(
+            When(post__category_id=category_id, then=Value(CATEGORY_WEIGHT)),
+            default=Value(0.0), output_field=FloatField(),
+        ))
+        rows = Through.objects.filter(tag_id__in=weights).exclude(post_id=post_id).values('post_id').annotate(
+            score=tag_score + category_score if category_id is not None else tag_score
+        ).order_by('-score', '-post_id')[:limit]
+        scores = {row['post_id']: row['score'] for row in rows}
+
+    if category_id is not None:
+        # 태그가 겹치지 않는 같은 카테고리 글은 최근 글부터
+        same_category = Post.objects.filter(category_id=category_id).exclude(pk=post_id)
+        if weights:
+            same_category = same_category.exclude(pk__in=Through.objects.filter(tag_id__in=weights).values('post_id'))
+        for pk in same_category.order_by('-created', '-pk').values_list('pk', flat=True)[:limit]:
+            scores.setdefault(pk, CATEGORY_WEIGHT)
+
+    return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))[:limit]
+
+
+def save_related(post_id, scores):
+    """post 의 관련 글을 scores 로 바꾼다. 바뀐 것이 있으면 True"""
+    current = set(RelatedPost.objects.filter(post_id=post_id).values_list('related_id', 'score'))
+    if current == set(scores):
+        return False
+    RelatedPost.objects.filter(post_id=post_id).delete()
+    RelatedPost.objects.bulk_create([
+        RelatedPost(post_id=post_id, related_id=related_id, score=score) for related_id, score in scores
+    ])
+    return True
+
+
+def offer(post_id, candidates):
+    """점수는 대칭이므로 후보 글들의 목록에 post 를 넣는다. (목록이 차 있으면 가장 낮은 점수보다 높을 때만)"""
+    stats = {
+        row['post_id']: (row['count'], row['lowest'])
+        for row in RelatedPost.objects.filter(post_id__in=[pk for pk, score in candidates]).values('post_id').annotate(
+            count=Count('pk'), lowest=Min('score'),
+        ).order_by()
+    }
+    added = []
+    for pk, score in candidates:
+        count, lowest = stats.get(pk, (0, None))
+        if count < RELATED_POSTS_COUNT or score > lowest:
+            added.append(RelatedPost(post_id=pk, related_id=post_id, score=score))
+    RelatedPost.objects.bulk_create(added)
+
+    # 넘친 글은 점수가 가장 낮은 것을 뺀다.
+    full = [row.post_id for row in added if stats.get(row.post_id, (0, None))[0] >= RELATED_POSTS_COUNT]
+    if full:
+        kept = {}
+        overflow = []
+        rows = RelatedPost.objects.filter(post_id__in=full).order_by('post_id', '-score', '-related_id')
+        for pk, owner_id in rows.values_list('pk', 'post_id'):
+            kept[owner_id] = kept.get(owner_id, 0) + 1
+            if kept[owner_id] > RELATED_POSTS_COUNT:
+                overflow.append(pk)
+        RelatedPost.objects.filter(pk__in=overflow).delete()
+    return {row.post_id for row in added}
+
+
+def refill(post_ids):
+    """관련 글이 모자라게 된 글은 새로 계산한다."""
+    if not post_ids:
+        return set()
+    counts = dict(
+        RelatedPost.objects.filter(post_id__in=post_ids).values('post_id').annotate(count=Count('pk'))
+        .order_by().values_list('post_id', 'count')
+    )
+    changed = set()
+    need = [pk for pk in post_ids if counts.get(pk, 0) < RELATED_POSTS_COUNT]
+    for pk, category_id in Post.objects.filter(pk__in=need).values_list('pk', 'category_id'):
+        if save_related(pk, score_candidates(pk, category_id, RELATED_POSTS_COUNT)):
+            changed.add(pk)
+    return changed
+
+
+def touch(post_ids):
+    """관련 글 목록이 바뀐 글의 상세 페이지 ETag / page cache 를 무효화한다."""
+    if not post_ids:
+        return
+    Post.objects.filter(pk__in=post_ids).update(related_updated_at=timezone.now())
+    objectcache.invalidate(Post, *post_ids)
+    pagecache.invalidate(*['post:{}'.format(pk) for pk in post_ids])
+
+
+def update_related_posts(post_id, category_id):
+    with transaction.atomic():
+        # post 가 들어 있던 목록에서는 일단 빼고 (점수가 바뀌었을 수 있다) 아래에서 다시 넣거나 채운다.
+        stale = set(RelatedPost.objects.filter(related_id=post_id).values_list('post_id', flat=True))
+        RelatedPost.objects.filter(related_id=post_id).delete()
+
+        candidates = score_candidates(post_id, category_id, CANDIDATE_LIMIT)
+        changed = set(stale)
+        if save_related(post_id, candidates[:RELATED_POSTS_COUNT]):
+            changed.add(post_id)
+        changed |= offer(post_id, candidates)
+        refill(stale)
+    touch(changed)
+
+
+def update_related_posts_for(post_ids):
+    for pk, category_id in Post.objects.filter(pk__in=post_ids).values_list('pk', 'category_id'):
+        update_related_posts(pk, category_id)
+
+
+def get_referrers(post_id):
+    """post 를 관련 글로 보여주는 글"""
+    return set(RelatedPost.objects.filter(related_id=post_id).values_list('post_id', flat=True))
+
+
+def remove_post(referrers):
+    """글이 지워진 뒤(CASCADE 로 RelatedPost 도 지워진 뒤) 그 글을 보여주던 글들의 목록을 채운다."""
+    refill(referrers)
+    touch(referrers)
+
+
+def rebuild(queryset, batch_size=500):
+    """queryset 의 글 전체의 관련 글을 다시 계산한다. 처리한 글 수를 돌려준다."""
+    count = 0
+    last_pk = 0
+    queryset = queryset.order_by('pk')
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk).values_list('pk', 'category_id')[:batch_size])
+        if not batch:
+            break
+
+        rows = []
+        for pk, category_id in batch:
+            rows += [
+                RelatedPost(post_id=pk, related_id=related_id, score=score)
+                for related_id, score in score_candidates(pk, category_id, RELATED_POSTS_COUNT)
+            ]
+        post_ids = [pk for pk, category_id in batch]
+        with transaction.atomic():
+            RelatedPost.objects.filter(post_id__in=post_ids).delete()
+            RelatedPost.objects.bulk_create(rows)
+        touch(post_ids)
+
+        count += len(batch)
+        last_pk = batch[-1][0]
+    return count
+
+
+def get_related_posts(post_id):
+    # (post, -score) 인덱스로 쿼리 하나에 읽는다.
+    rows = RelatedPost.objects.filter(post_id=post_id).select_related('related').only(
+        'related', 'related__title', 'related__created',
+    ).order_by('-score')
+    return [row.related for row in rows]
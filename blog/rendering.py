@@ -0,0 +1,53 @@
+import hashlib
+import html
+
+import markdown as markdown_lib
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+from markdownx.utils import markdown
+
+from basecamp.instrumentation import timer
+
+# Markdown 렌더링 방식(확장, 옵션 등)이 바뀌면 이 값을 올린 뒤
+# python manage.py rerender_markdown 으로 저장된 HTML 을 다시 만든다.
+RENDERER_VERSION = 2
+
+EXCERPT_WORDS = 50
+
+
+def get_renderer_version():
+    return '{}-{}'.format(RENDERER_VERSION, markdown_lib.__version__)[:20]
+
+
+def get_content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def render_markdown(text):
+    # 요청 중에 렌더링했다면 Server-Timing 의 markdown 항목으로 보인다. (basecamp/instrumentation.py)
+    with timer('markdown'):
+        return markdown(text)
+
+
+def make_excerpt(rendered_html):
+    # 렌더링된 HTML 에서 태그를 걷어낸 평문을 목록 카드용 길이로 자른다.
+    text = ' '.join(html.unescape(strip_tags(rendered_html)).split())
+    return Truncator(text).words(EXCERPT_WORDS)
+
+
+def refresh_rendered(instance, source_field, html_field, hash_field, force=False):
+    """
+    source_field 의 Markdown 이 바뀌었거나 렌더러 버전이 다르면 html_field 를 다시 채운다.
+    다시 렌더링했다면 True 를 돌려준다.
+    """
+    source = getattr(instance, source_field) or ''
+    content_hash = get_content_hash(source)
+    version = get_renderer_version()
+
+    if not force and getattr(instance, hash_field) == content_hash and instance.render_version == version:
+        return False
+
+    setattr(instance, html_field, render_markdown(source))
+    setattr(instance, hash_field, content_hash)
+    instance.render_version = version
+    return True
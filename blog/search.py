@@ -0,0 +1,224 @@
+import re
+
+from django.db import connections, router, OperationalError
+from django.db.models import Q, Case, When, IntegerField
+
+from .models import Post
+
+# SQLite FTS5 기반 검색.
+# FTS5 의 기본 tokenizer 는 한글을 띄어쓰기 단위로만 자르기 때문에 '파이썬을' 로 저장된 글을 '파이썬' 으로 찾을 수 없다.
+# 그래서 저장/검색 전에 한중일 문자열은 2글자씩(bigram) 잘라서 넣고, 나머지는 단어 단위로 넣는다.
+# 색인 테이블은 blog_post 와 같은 DB 에 있으므로 DB 는 Post 와 같이 router 로 고른다. (검색은 복제본, 색인은 default)
+
+FTS_TABLE = 'blog_post_fts'
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+
+WORD_RE = re.compile(r'\w+')
+CJK_RE = re.compile(r'[\u1100-\u11ff\u3040-\u30ff\u3130-\u318f\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+')
+
+
+def tokenize(text):
+    tokens = []
+    for word in WORD_RE.findall(text.lower()):
+        pos = 0
+        for match in CJK_RE.finditer(word):
+            if match.start() > pos:
+                tokens.append(word[pos:match.start()])
+            run = match.group()
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            pos = match.end()
+        if pos < len(word):
+            tokens.append(word[pos:])
+    return tokens
+
+
+def to_index_text(text):
+    return ' '.join(tokenize(text or ''))
+
+
+def build_match_query(q):
+    # 검색어의 각 단어를 하나의 prefix phrase 로 만들고 AND 로 묶는다.
+    # ex) '파이썬 django' => "파이 이썬"* AND "django"*
+    phrases = []
+    for word in q.split():
+        tokens = tokenize(word)
+        if tokens:
+            phrases.append('"{}"*'.format(' '.join(tokens).replace('"', '""')))
+    return ' AND '.join(phrases)
+
+
+def is_supported(using=None):
+    return connections[using or router.db_for_read(Post)].vendor == 'sqlite'
+
+
+def create_index(using='default'):
+    if connections[using].vendor != 'sqlite':
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5(title, content, tokenize='unicode61')".format(FTS_TABLE)
+        )
+
+
+def index_post(post, using=None):
+    using = using or router.db_for_write(Post, instance=post)
+    if not is_supported(using):
+        return
+    try:
+        with connections[using].cursor() as cursor:
+            cursor.execute('DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE), [post.pk])
+            cursor.execute(
+                'INSERT INTO {} (rowid, title, content) VALUES (%s, %s, %s)'.format(FTS_TABLE),
+                [post.pk, to_index_text(post.title), to_index_text(post.content)]
+            )
+    except OperationalError:
+        # 인덱스 테이블이 없으면 검색은 LIKE 로 동작하므로 저장은 막지 않는다.
+        pass
+
+
+def index_posts(posts):
+    """bulk_create 처럼 signal 없이 저장한 글을 한 번에 색인한다."""
+    using = router.db_for_write(Post)
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany('DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE), [[post.pk] for post in posts])
+        cursor.executemany(
+            'INSERT INTO {} (rowid, title, content) VALUES (%s, %s, %s)'.format(FTS_TABLE),
+            [[post.pk, to_index_text(post.title), to_index_text(post.content)] for post in posts]
+        )
+
+
+def unindex_post(post_id, using=None):
+    using = using or router.db_for_write(Post)
+    if not is_supported(using):
+        return
+    try:
+        with connections[using].cursor() as cursor:
+            cursor.execute('DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE), [post_id])
+    except OperationalError:
+        pass
+
+
+def rebuild_index(queryset, batch_size=500):
+    using = router.db_for_write(Post)
+    create_index(using)
+    count = 0
+    last_pk = 0
+    with connections[using].cursor() as cursor:
+        cursor.execute('DELETE FROM {}'.format(FTS_TABLE))
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'title', 'content')[:batch_size])
+            if not batch:
+                break
+            cursor.executemany(
+                'INSERT INTO {} (rowid, title, content) VALUES (%s, %s, %s)'.format(FTS_TABLE),
+                [(pk, to_index_text(title), to_index_text(content)) for pk, title, content in batch]
+            )
+            count += len(batch)
+            last_pk = batch[-1][0]
+    return count
+
+
+def query_post_ids(match, using, limit=None, offset=0):
+    """MATCH 결과의 Post pk 를 bm25 순(제목 가중치 TITLE_WEIGHT)으로 [offset:offset + limit] 만큼 돌려준다."""
+    sql = (
+        'SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY bm25({table}, {title}, {content}) '
+        'LIMIT %s OFFSET %s'
+    ).format(table=FTS_TABLE, title=TITLE_WEIGHT, content=CONTENT_WEIGHT)
+    with connections[using].cursor() as cursor:
+        # LIMIT -1 은 끝까지
+        cursor.execute(sql, [match, -1 if limit is None else limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def count_matches(match, using):
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT count(*) FROM {table} WHERE {table} MATCH %s'.format(table=FTS_TABLE), [match])
+        return cursor.fetchone()[0]
+
+
+def search_post_ids(q, limit=None):
+    """
+    bm25 순(제목 가중치 TITLE_WEIGHT)으로 정렬된 Post pk 목록을 돌려준다.
+    FTS5 를 쓸 수 없으면 None 을 돌려준다.
+    """
+    using = router.db_for_read(Post)
+    if not is_supported(using):
+        return None
+
+    match = build_match_query(q)
+    if not match:
+        return []
+
+    try:
+        return query_post_ids(match, using, limit)
+    except OperationalError:
+        # FTS5 가 없는 SQLite 이거나 인덱스가 아직 만들어지지 않은 경우
+        return None
+
+
+def like_search(queryset, q):
+    return queryset.filter(Q(title__contains=q) | Q(content__contains=q))
+
+
+def order_by_rank(queryset, post_ids):
+    ranking = Case(
+        *[When(pk=pk, then=position) for position, pk in enumerate(post_ids)],
+        output_field=IntegerField()
+    )
+    return queryset.filter(pk__in=post_ids).order_by(ranking)
+
+
+class SearchResults:
+    """
+    FTS 검색 결과. 페이지를 자를 때(slice) 그 페이지의 pk 만 bm25 순으로 LIMIT / OFFSET 해서 가져오고
+    전체 개수는 FTS 에서 센다. (QuerySet 대신 ListView 의 pagination 에 넘긴다)
+    """
+    def __init__(self, queryset, match, count):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.match = match
+        self._count = count
+        self.using = queryset.db
+
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice):
+            return self[k:k + 1][0]
+        start = k.start or 0
+        limit = None if k.stop is None else max(k.stop - start, 0)
+        if limit == 0:
+            return []
+        return list(order_by_rank(self.queryset, query_post_ids(self.match, self.using, limit, start)))
+
+
+def search_posts(queryset, q):
+    # 글을 읽을 DB 와 같은 DB 의 색인에서 찾는다.
+    using = queryset.db
+    if not is_supported(using):
+        return like_search(queryset, q)
+
+    match = build_match_query(q)
+    if not match:
+        return queryset.none()
+    try:
+        count = count_matches(match, using)
+    except OperationalError:
+        # FTS5 가 없는 SQLite 이거나 인덱스가 아직 만들어지지 않은 경우
+        return like_search(queryset, q)
+    if not count:
+        return queryset.none()
+    return SearchResults(queryset, match, count)
@@ -0,0 +1,352 @@
+from allauth.socialaccount.models import SocialAccount
+from allauth.socialaccount.signals import social_account_added, social_account_updated, social_account_removed
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, post_migrate, post_init, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import archive, objectcache, pagecache, related, search, thumbnails
+from .avatars import invalidate_avatar_url
+from .conditional import mark_shared_changed
+from .context_processors import invalidate_sidebar
+from .viewcount import invalidate_popular_posts
+from .models import Post, Category, Tag, Comment, DeletedObject
+
+
+# 월별 글 수 (blog.archive)
+# 사이드바 캐시를 지우기 전에 세어 두도록 update_sidebar 보다 먼저 연결한다.
+
+@receiver(pre_save, sender=Post)
+def remember_archive_key(sender, instance, **kwargs):
+    # post_save 에서는 _original_category_id 가 이미 새 값으로 바뀌어 있을 수 있다.
+    instance._archive_original = (instance._original_created, instance._original_category_id)
+
+
+@receiver(post_save, sender=Post)
+def update_archive(sender, instance, created, **kwargs):
+    if created:
+        archive.post_added(instance.created, instance.category_id)
+    else:
+        original = instance._archive_original
+        # 지연 로딩(defer)된 필드는 바뀌지 않았다.
+        current = (
+            instance.__dict__.get('created', original[0]),
+            instance.__dict__.get('category_id', original[1]),
+        )
+        if current != original and original[0] is not None:
+            archive.post_moved(original, current)
+    if 'created' in instance.__dict__:
+        instance._original_created = instance.created
+
+
+@receiver(post_delete, sender=Post)
+def update_archive_on_delete(sender, instance, **kwargs):
+    archive.post_removed(instance.created, instance.category_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def update_sidebar(sender, **kwargs):
+    invalidate_sidebar()
+    mark_shared_changed()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def update_popular_posts(sender, **kwargs):
+    # 인기 글 목록에 있던 글의 제목이 바뀌거나 글이 지워졌을 수 있다.
+    invalidate_popular_posts()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def update_tag(sender, **kwargs):
+    mark_shared_changed()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def update_comment_activity(sender, instance, **kwargs):
+    # save() 를 거치지 않으므로 Post.updated_at 이나 다른 signal 에 영향을 주지 않는다.
+    Post.objects.filter(pk=instance.post_id).update(comment_activity_at=timezone.now())
+    objectcache.invalidate(Post, instance.post_id)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, using, **kwargs):
+    search.index_post(instance, using=using)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, using, **kwargs):
+    search.unindex_post(instance.pk, using=using)
+
+
+@receiver(post_migrate)
+def create_search_index(sender, app_config, using, **kwargs):
+    if app_config.label == 'blog':
+        search.create_index(using=using)
+
+
+@receiver(social_account_added)
+@receiver(social_account_updated)
+def refresh_avatar_on_social_login(sender, request, sociallogin, **kwargs):
+    invalidate_avatar_url(sociallogin.user.pk)
+
+
+@receiver(social_account_removed)
+def refresh_avatar_on_social_removed(sender, request, socialaccount, **kwargs):
+    invalidate_avatar_url(socialaccount.user_id)
+
+
+@receiver(post_save, sender=SocialAccount)
+@receiver(post_delete, sender=SocialAccount)
+def refresh_avatar(sender, instance, **kwargs):
+    # 소셜 로그인 때마다 extra_data(아바타 포함)가 갱신되어 저장된다.
+    invalidate_avatar_url(instance.user_id)
+
+
+# 페이지 캐시 무효화
+# 사이드바의 카테고리별 개수는 모든 블로그 페이지에 있으므로, 개수가 바뀌면 'sidebar' 로 전체가 무효화된다.
+
+@receiver(post_init, sender=Post)
+def remember_post_category(sender, instance, **kwargs):
+    # category 가 지연 로딩(defer)된 경우에도 추가 쿼리가 나가지 않도록 __dict__ 에서 읽는다.
+    instance._original_category_id = instance.__dict__.get('category_id')
+    instance._original_created = instance.__dict__.get('created')
+    head_image = instance.__dict__.get('head_image')
+    instance._original_head_image = getattr(head_image, 'name', head_image)
+
+
+@receiver(post_save, sender=Post)
+def purge_post_pages(sender, instance, created, **kwargs):
+    tags = ['post:{}'.format(instance.pk)]
+    category_id = instance.__dict__.get('category_id', instance._original_category_id)
+
+    if created:
+        tags += ['list', 'sidebar', pagecache.category_list_tag(category_id)]
+    elif category_id != instance._original_category_id:
+        tags += [
+            'sidebar',
+            pagecache.category_list_tag(instance._original_category_id),
+            pagecache.category_list_tag(category_id),
+        ]
+    pagecache.invalidate(*tags)
+    instance._original_category_id = category_id
+
+
+@receiver(post_delete, sender=Post)
+def purge_deleted_post_pages(sender, instance, **kwargs):
+    pagecache.invalidate('post:{}'.format(instance.pk), 'list', 'sidebar')
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def purge_post_tag_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # clear 후에는 어떤 태그가 빠졌는지 알 수 없으므로 미리 기억해 둔다.
+        if reverse:
+            instance._cleared_pks = list(instance.post_set.values_list('pk', flat=True))
+        else:
+            instance._cleared_pks = list(instance.tags.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_pks', [])
+
+    if reverse:
+        tags = [pagecache.tag_list_tag(instance.pk)] + ['post:{}'.format(pk) for pk in pk_set]
+    else:
+        tags = ['post:{}'.format(instance.pk)] + [pagecache.tag_list_tag(pk) for pk in pk_set]
+    pagecache.invalidate(*tags)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_comment_pages(sender, instance, **kwargs):
+    pagecache.invalidate('comments:{}'.format(instance.post_id))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def purge_tag_pages(sender, instance, **kwargs):
+    pagecache.invalidate('tag:{}'.format(instance.pk), pagecache.tag_list_tag(instance.pk))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def purge_category_pages(sender, instance, **kwargs):
+    pagecache.invalidate('sidebar')
+
+
+# 관련 글 (blog.related)
+
+@receiver(pre_save, sender=Post)
+def remember_related_category(sender, instance, **kwargs):
+    # purge_post_pages 가 post_save 에서 _original_category_id 를 새 값으로 바꾸므로 미리 비교해 둔다.
+    category_id = instance.__dict__.get('category_id', instance._original_category_id)
+    instance._related_category_changed = category_id != instance._original_category_id
+
+
+@receiver(post_save, sender=Post)
+def update_related_on_save(sender, instance, created, update_fields, **kwargs):
+    if created or instance._related_category_changed:
+        related.update_related_posts(instance.pk, instance.category_id)
+    elif update_fields is None or 'title' in update_fields:
+        # 이 글을 관련 글로 보여주는 페이지의 제목도 바뀌어야 한다.
+        related.touch(related.get_referrers(instance.pk))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_related_on_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        related.update_related_posts(instance.pk, instance.category_id)
+    elif action == 'post_clear':
+        # purge_post_tag_pages 가 pre_clear 에서 기억해 둔 글들
+        related.update_related_posts_for(getattr(instance, '_cleared_pks', []))
+    else:
+        related.update_related_posts_for(pk_set)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_related_referrers(sender, instance, **kwargs):
+    instance._related_referrers = related.get_referrers(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def update_related_on_delete(sender, instance, **kwargs):
+    related.remove_post(getattr(instance, '_related_referrers', set()))
+
+
+# 객체 캐시 (blog.objectcache)
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_cached_object(sender, instance, **kwargs):
+    objectcache.invalidate(sender, instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_cached_taxonomy(sender, instance, **kwargs):
+    # 새 slug 는 없는 slug 로 기억해 두었을 수 있다.
+    objectcache.invalidate(sender, instance.pk, slugs=[instance.slug])
+    # 캐시한 글에 같이 넣어 둔 카테고리/태그도 바뀐다.
+    objectcache.invalidate_model(Post)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_author(sender, instance, update_fields=None, **kwargs):
+    # 로그인할 때마다 last_login 만 저장하는 것은 글에 보이지 않는다.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    objectcache.invalidate_model(Post)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_cached_post_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        objectcache.invalidate(Post, instance.pk)
+    elif action == 'post_clear':
+        # purge_post_tag_pages 가 pre_clear 에서 기억해 둔 글들
+        objectcache.invalidate(Post, *getattr(instance, '_cleared_pks', []))
+    else:
+        objectcache.invalidate(Post, *pk_set)
+
+
+# JSON API 동기화 (blog.api)
+# updated_since 로 읽는 쪽이 놓치지 않도록 save() 없이 바뀐 글(태그, 카테고리)의 updated_at 을 올리고
+# 지워진 글 / 댓글은 DeletedObject 로 남긴다.
+
+def touch_posts(post_ids):
+    post_ids = list(post_ids)
+    if post_ids:
+        Post.objects.filter(pk__in=post_ids).update(updated_at=timezone.now())
+        objectcache.invalidate(Post, *post_ids)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def touch_posts_on_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        touch_posts([instance.pk])
+    elif action == 'post_clear':
+        # purge_post_tag_pages 가 pre_clear 에서 기억해 둔 글들
+        touch_posts(getattr(instance, '_cleared_pks', []))
+    else:
+        touch_posts(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+def touch_posts_on_tag_change(sender, instance, created, **kwargs):
+    # API 의 tags 는 slug 이다.
+    if not created:
+        touch_posts(instance.post_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Category)
+def touch_posts_on_category_change(sender, instance, created, **kwargs):
+    if not created:
+        touch_posts(instance.post_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Category)
+def remember_posts_before_delete(sender, instance, **kwargs):
+    # 태그 연결은 m2m_changed 없이 지워지고, 카테고리는 signal 없이 update 로 NULL 이 된다.
+    instance._touched_post_ids = list(instance.post_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Category)
+def touch_posts_on_delete(sender, instance, **kwargs):
+    touch_posts(getattr(instance, '_touched_post_ids', []))
+
+
+DELETED_RESOURCES = {
+    Post: 'posts',
+    Comment: 'comments',
+}
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def record_deleted(sender, instance, **kwargs):
+    DeletedObject.objects.create(resource=DELETED_RESOURCES[sender], object_id=instance.pk)
+
+
+# head_image 축소본
+
+def head_image_changed(instance):
+    if 'head_image' not in instance.__dict__:
+        return False
+    return (instance.head_image.name or '') != (instance._original_head_image or '')
+
+
+@receiver(pre_save, sender=Post)
+def reset_head_image_hash(sender, instance, **kwargs):
+    if head_image_changed(instance):
+        instance.head_image_hash = ''
+
+
+@receiver(post_save, sender=Post)
+def generate_head_image_renditions(sender, instance, **kwargs):
+    if head_image_changed(instance):
+        instance._original_head_image = instance.head_image.name
+        thumbnails.enqueue_for_post(instance)
@@ -1,8 +1,33 @@
-from django.test import TestCase, Client
+import json
+import os
+import tempfile
+import threading
+import time
+from xml.etree import ElementTree
+from io import StringIO, BytesIO
+from unittest.mock import patch
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from PIL import Image
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, Client, AsyncClient, override_settings
 from bs4 import BeautifulSoup
-from .models import Post, Category, Tag, Comment
+from .models import Post, Category, Tag, Comment, RelatedPost, MonthlyPostCount, CategoryMonthlyPostCount, PostStats
 from django.utils import timezone
 from django.contrib.auth.models import User
+from django.core.management import call_command, CommandError
+from django.core.cache import cache
+from django.conf import settings
+from django.db import connection, connections, OperationalError
+from django.http import Http404
+from .context_processors import get_sidebar
+from .related import get_related_posts
+from .search import search_post_ids
+from .views import COMMENTS_PER_PAGE
+from .avatars import get_avatar_urls
+from . import objectcache, pagecache, thumbnails, viewcount
+from django.core.files.uploadedfile import SimpleUploadedFile
+from allauth.socialaccount.models import SocialAccount
 
 
 def create_category(name='life', description=''):
@@ -116,12 +141,43 @@ class TestModel(TestCase):
         self.assertEqual(tag_001.post_set.first(), post_001)
         self.assertEqual(tag_001.post_set.last(), post_000)
 
+    def test_rendered_markdown(self):
+        post_000 = create_post(
+            title='The First Post',
+            content='Hello **World**',
+            author=self.author_000,
+        )
+        self.assertIn('<strong>World</strong>', post_000.content_html)
+        self.assertNotEqual(post_000.content_hash, '')
+        # 목록 카드용 excerpt 에는 Markdown 문법이 남지 않는다.
+        self.assertEqual(post_000.excerpt, 'Hello World')
+
+        comment_000 = create_comment(post_000, text='a *test* comment', author=self.author_000)
+        self.assertIn('<em>test</em>', comment_000.text_html)
+
+        # content 가 바뀌면 저장할 때 다시 렌더링된다.
+        post_000.content = 'Hello _again_'
+        post_000.save()
+        self.assertIn('<em>again</em>', Post.objects.get(pk=post_000.pk).content_html)
+
+        # 렌더러 버전이 다른 행은 rerender_markdown 으로 일괄 갱신된다.
+        Post.objects.update(content_html='', excerpt='', render_version='old')
+        updated_at = Post.objects.get(pk=post_000.pk).updated_at
+        call_command('rerender_markdown', stdout=StringIO())
+        post_000 = Post.objects.get(pk=post_000.pk)
+        self.assertIn('<em>again</em>', post_000.content_html)
+        self.assertEqual(post_000.excerpt, 'Hello again')
+        # 다시 렌더링한 글은 ETag 가 바뀌도록 updated_at 도 바뀐다.
+        self.assertGreater(post_000.updated_at, updated_at)
+
 
 # Create your tests here.
 class TestView(TestCase):
     def setUp(self):
         # 직접 브라우저를 열지 않고 Client를 사용 (브라우저 역할)
         self.client = Client()
+        cache.clear()
+        objectcache.clear()
         self.author_000 = User.objects.create_user(username='smith', password='nopassword')
         self.user_benny = User.objects.create_user(username='benny', password='nopassword')
 
@@ -203,6 +259,29 @@ class TestView(TestCase):
         # Tag가 해당 post의 card 마다 있다.
         self.assertIn('#america', post_card_000.text)
 
+    def test_sidebar_cache(self):
+        for i in range(5):
+            create_post(
+                title='The Post No. {}'.format(i),
+                content='Content {}'.format(i),
+                author=self.author_000,
+                category=create_category(name='category {}'.format(i)),
+            )
+        create_post(title='No category', content='Content', author=self.author_000)
+
+        # 카테고리 개수와 상관없이 카테고리 쿼리 하나와 월별 글 수(archive) 쿼리 하나로 가져오고, 이후에는 캐시를 쓴다.
+        with self.assertNumQueries(2):
+            sidebar = get_sidebar()
+        with self.assertNumQueries(0):
+            get_sidebar()
+
+        self.assertEqual(sidebar['posts_without_category'], 1)
+        self.assertEqual([c.post_count for c in sidebar['category_list']], [1] * 5)
+
+        # Post 가 저장되면 캐시가 무효화된다.
+        create_post(title='No category 2', content='Content', author=self.author_000)
+        self.assertEqual(get_sidebar()['posts_without_category'], 2)
+
     def test_post_detail(self):
         category_politics = create_category(name='정치/사회')
 
@@ -300,6 +379,534 @@ class TestView(TestCase):
         self.assertNotIn('edit', comment_001_div.text)
         self.assertNotIn('delete', comment_001_div.text)
 
+    def test_comment_pagination(self):
+        post_000 = create_post(
+            title='The First Post',
+            content='Hello World, We are the world',
+            author=self.author_000,
+        )
+        comments = [
+            create_comment(post_000, text='comment no. {}'.format(i), author=self.user_benny)
+            for i in range(COMMENTS_PER_PAGE + 5)
+        ]
+
+        # 상세 페이지에는 처음 COMMENTS_PER_PAGE 개만 들어간다.
+        response = self.client.get(post_000.get_absolute_url())
+        soup = BeautifulSoup(response.content, 'html.parser')
+        comments_div = soup.find('div', id='comment-list')
+        self.assertIsNotNone(comments_div.find('div', id='comment-id-{}'.format(comments[0].pk)))
+        self.assertIsNone(comments_div.find('div', id='comment-id-{}'.format(comments[-1].pk)))
+
+        # 나머지는 '더 보기' 조각으로 가져온다.
+        more_btn = comments_div.find('button', class_='load-more-comments')
+        response = self.client.get(more_btn['data-url'])
+        self.assertEqual(response.status_code, 200)
+        soup = BeautifulSoup(response.content, 'html.parser')
+        self.assertEqual(len(soup.find_all('div', class_='media')), 5)
+        self.assertIsNotNone(soup.find('div', id='comment-id-{}'.format(comments[-1].pk)))
+        self.assertIsNone(soup.find('button', class_='load-more-comments'))
+
+        response = self.client.get('/blog/{}/comments/'.format(post_000.pk + 100))
+        self.assertEqual(response.status_code, 404)
+
+    def test_avatar_url_cache(self):
+        account = SocialAccount.objects.create(
+            user=self.user_benny, provider='google', uid='benny', extra_data={'picture': 'https://example.com/benny.png'}
+        )
+        user_ids = [self.user_benny.pk, self.author_000.pk]
+
+        # 작성자 수와 상관없이 한 번에 조회하고, 이후에는 캐시를 쓴다.
+        with self.assertNumQueries(1):
+            avatar_urls = get_avatar_urls(user_ids)
+        with self.assertNumQueries(0):
+            get_avatar_urls(user_ids)
+        self.assertEqual(avatar_urls, {self.user_benny.pk: 'https://example.com/benny.png', self.author_000.pk: ''})
+
+        # 소셜 로그인으로 계정 정보가 갱신되면 다시 조회한다.
+        account.extra_data = {'picture': 'https://example.com/new.png'}
+        account.save()
+        self.assertEqual(get_avatar_urls([self.user_benny.pk])[self.user_benny.pk], 'https://example.com/new.png')
+
+    def test_page_cache(self):
+        tag_america = create_tag(name='america')
+        post_000 = create_post(
+            title='The First Post',
+            content='Hello World, We are the world',
+            author=self.author_000,
+        )
+        post_000.tags.add(tag_america)
+
+        response = self.client.get(post_000.get_absolute_url())
+        self.assertNotIn('X-Page-Cache', response)
+
+        # 로그인하지 않은 사용자는 DB 를 거치지 않고 캐시된 페이지를 받는다.
+        with self.assertNumQueries(0):
+            response = self.client.get(post_000.get_absolute_url())
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+
+        # 댓글이 달리면 해당 글 페이지만 무효화된다.
+        self.client.get('/blog/')
+        create_comment(post_000, text='a fresh comment', author=self.user_benny)
+        response = self.client.get(post_000.get_absolute_url())
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertIn('a fresh comment', response.content.decode())
+        self.assertEqual(self.client.get('/blog/')['X-Page-Cache'], 'hit')
+
+        # 태그 이름이 바뀌면 그 태그를 보여주는 목록 페이지도 무효화된다.
+        tag_america.name = 'usa'
+        tag_america.save()
+        response = self.client.get('/blog/')
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertIn('#usa', response.content.decode())
+
+        # 로그인한 사용자에게는 캐시를 쓰지 않는다.
+        self.client.login(username='smith', password='nopassword')
+        response = self.client.get(post_000.get_absolute_url())
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertIn('EDIT', response.content.decode())
+        self.client.logout()
+
+        # 프로세스마다 따로인 LocMemCache 이면 다른 worker 의 무효화를 볼 수 없으므로 page cache 를 쓰지 않는다.
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            for _ in range(2):
+                response = self.client.get(post_000.get_absolute_url())
+                self.assertNotIn('X-Page-Cache', response)
+
+    def test_page_cache_changed_while_rendering(self):
+        create_post(title='The First Post', content='Hello World', author=self.author_000)
+        get_card_tags = pagecache.get_card_tags
+
+        def save_during_render(posts):
+            # view 가 글 목록을 읽은 뒤, 응답을 저장하기 전에 다른 요청이 글을 저장했다.
+            pagecache.invalidate('list')
+            return get_card_tags(posts)
+
+        with patch('blog.views.get_card_tags', save_during_render):
+            self.client.get('/blog/')
+        # 옛 내용을 새 버전으로 저장하지 않는다.
+        self.assertNotIn('X-Page-Cache', self.client.get('/blog/'))
+        self.assertEqual(self.client.get('/blog/')['X-Page-Cache'], 'hit')
+
+        # 태그 버전은 올리는 대신 겹치지 않는 새 값으로 바꾼다. (다른 프로세스와 같이 바꿔도 사라지지 않는다)
+        versions = pagecache.get_tag_versions(['list'])
+        pagecache.invalidate('list')
+        self.assertNotEqual(pagecache.get_tag_versions(['list']), versions)
+        self.assertNotIn('X-Page-Cache', self.client.get('/blog/'))
+
+    @override_settings(BLOG_PAGE_CACHE_TIMEOUT=0)
+    def test_conditional_get(self):
+        post_000 = create_post(
+            title='The First Post',
+            content='Hello World, We are the world',
+            author=self.author_000,
+        )
+
+        for url in (post_000.get_absolute_url(), '/blog/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+            last_modified = response['Last-Modified']
+
+            # 템플릿을 렌더링하지 않고 ETag 계산 쿼리 하나만으로 304 를 돌려준다.
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 304)
+
+        # 댓글이 달리면 상세 페이지의 ETag 가 바뀐다.
+        response = self.client.get(post_000.get_absolute_url())
+        etag = response['ETag']
+        create_comment(post_000, text='a new comment', author=self.user_benny)
+        response = self.client.get(post_000.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('a new comment', response.content.decode())
+
+    def test_feeds_and_sitemap(self):
+        category = create_category(name='정치/사회')
+        tag = create_tag(name='hello')
+        post_000 = create_post(title='The First & Post', content='Hello <World>', author=self.author_000,
+                               category=category)
+        post_000.tags.add(tag)
+        post_001 = create_post(title='The Second Post', content='Second', author=self.user_benny)
+
+        for url in ('/blog/feed/rss/', '/blog/feed/atom/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            root = ElementTree.fromstring(b''.join(response.streaming_content))
+            if url.endswith('rss/'):
+                titles = [item.findtext('title') for item in root.iter('item')]
+            else:
+                titles = [entry.findtext('{http://www.w3.org/2005/Atom}title')
+                          for entry in root.iter('{http://www.w3.org/2005/Atom}entry')]
+            self.assertEqual(titles, ['The Second Post', 'The First & Post'])
+
+            # 본문을 만들지 않고 ETag 계산 쿼리 하나만으로 304 를 돌려준다.
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+
+        # 카테고리 / 태그 feed 에는 그 글만 들어간다.
+        for url in (category.get_absolute_url() + 'feed/rss/', tag.get_absolute_url() + 'feed/atom/'):
+            content = b''.join(self.client.get(url).streaming_content).decode()
+            self.assertIn('The First &amp; Post', content)
+            self.assertNotIn('The Second Post', content)
+        content = b''.join(self.client.get('/blog/category/_none/feed/rss/').streaming_content).decode()
+        self.assertIn('The Second Post', content)
+        self.assertEqual(self.client.get('/blog/tag/no-such-tag/feed/rss/').status_code, 404)
+
+        # sitemap 은 pk 구간별 파일로 나뉜다.
+        with patch('blog.feeds.SITEMAP_PAGE_SIZE', post_000.pk):
+            content = b''.join(self.client.get('/sitemap.xml').streaming_content).decode()
+            self.assertIn('http://testserver/sitemap-taxonomy.xml', content)
+            self.assertIn('http://testserver/sitemap-posts-1.xml', content)
+            self.assertIn('http://testserver/sitemap-posts-2.xml', content)
+            self.assertNotIn('sitemap-posts-3.xml', content)
+
+            response = self.client.get('/sitemap-posts-2.xml')
+            content = b''.join(response.streaming_content).decode()
+            self.assertIn('<loc>http://testserver{}</loc>'.format(post_001.get_absolute_url()), content)
+            self.assertNotIn('<loc>http://testserver{}</loc>'.format(post_000.get_absolute_url()), content)
+            self.assertEqual(self.client.get('/sitemap-posts-2.xml', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+            self.assertEqual(self.client.get('/sitemap-posts-3.xml').status_code, 404)
+
+        content = b''.join(self.client.get('/sitemap-taxonomy.xml').streaming_content).decode()
+        self.assertIn('/blog/category/%EC%A0%95%EC%B9%98%EC%82%AC%ED%9A%8C/', content)
+        self.assertIn('/blog/tag/hello/', content)
+
+    def test_json_api(self):
+        category = create_category(name='programming')
+        tag_000 = create_tag(name='python')
+        tag_001 = create_tag(name='django')
+        posts = [create_post(title='Post {}'.format(i), content='본문 {}'.format(i), author=self.author_000,
+                             category=category) for i in range(5)]
+        posts[0].tags.add(tag_000, tag_001)
+        create_comment(posts[0], text='첫 댓글', author=self.user_benny)
+
+        # cursor 를 따라가면 pk 순으로 빠짐없이 받는다. (태그는 페이지마다 쿼리 하나로 가져온다)
+        ids = []
+        url = '/api/v1/posts/?limit=2'
+        while url:
+            with self.assertNumQueries(2):
+                data = self.client.get(url).json()
+            ids += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(ids, [post.pk for post in posts])
+
+        data = self.client.get('/api/v1/posts/{}/'.format(posts[0].pk)).json()
+        self.assertEqual(data['tags'], ['django', 'python'])
+        self.assertEqual(data['category'], 'programming')
+        self.assertEqual(data['url'], posts[0].get_absolute_url())
+        self.assertNotIn('content', data)
+
+        data = self.client.get('/api/v1/posts/?fields=title,content').json()
+        self.assertEqual(data['results'][0], {'id': posts[0].pk, 'title': 'Post 0', 'content': '본문 0'})
+        self.assertEqual(self.client.get('/api/v1/posts/?fields=password').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/posts/?cursor=%%%').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/tags/?updated_since=2021-01-01').status_code, 400)
+        self.assertEqual(self.client.post('/api/v1/posts/').status_code, 405)
+
+        # updated_since: 그 뒤에 바뀐 글만
+        since = timezone.now()
+        posts[3].title = 'Post 3 (edited)'
+        posts[3].save()
+        data = self.client.get('/api/v1/posts/', {'updated_since': since.isoformat()}).json()
+        self.assertEqual([row['title'] for row in data['results']], ['Post 3 (edited)'])
+
+        # save() 없이 태그만 바뀐 글도 updated_at 이 바뀐다.
+        since = timezone.now()
+        posts[1].tags.add(tag_000)
+        tag_001.slug = 'django-framework'
+        tag_001.save()
+        data = self.client.get('/api/v1/posts/', {'updated_since': since.isoformat(), 'fields': 'id,tags'}).json()
+        self.assertEqual(data['results'], [
+            {'id': posts[0].pk, 'tags': ['django-framework', 'python']},
+            {'id': posts[1].pk, 'tags': ['python']},
+        ])
+
+        data = self.client.get('/api/v1/comments/', {'post': posts[0].pk}).json()
+        self.assertEqual([(row['author'], row['text']) for row in data['results']], [('benny', '첫 댓글')])
+
+        # 지워진 글 / 댓글은 deleted 로 알 수 있다.
+        since = timezone.now()
+        comment = create_comment(posts[4], author=self.user_benny)
+        deleted_post_id, deleted_comment_id = posts[4].pk, comment.pk
+        posts[4].delete()
+        data = self.client.get('/api/v1/deleted/', {'updated_since': since.isoformat()}).json()
+        self.assertEqual(
+            sorted((row['resource'], row['object_id']) for row in data['results']),
+            [('comments', deleted_comment_id), ('posts', deleted_post_id)],
+        )
+        data = self.client.get('/api/v1/deleted/', {'resource': 'posts'}).json()
+        self.assertEqual([row['object_id'] for row in data['results']], [deleted_post_id])
+        posts = posts[:4]
+        data = self.client.get('/api/v1/tags/').json()
+        self.assertEqual([row['url'] for row in data['results']], [tag_000.get_absolute_url(), tag_001.get_absolute_url()])
+
+        # NDJSON 내보내기: 한 줄에 객체 하나
+        with patch('blog.api.EXPORT_CHUNK_SIZE', 2):
+            response = self.client.get('/api/v1/export/posts.ndjson?fields=id,tags')
+            self.assertTrue(response.streaming)
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['id'] for row in rows], [post.pk for post in posts])
+        self.assertEqual(rows[0]['tags'], ['django-framework', 'python'])
+
+    def test_related_posts(self):
+        programming = create_category(name='programming')
+        python = create_tag(name='python')
+        django = create_tag(name='django')
+        travel = create_tag(name='travel')
+
+        post_000 = create_post(title='Post 0', content='a', author=self.author_000)
+        post_001 = create_post(title='Post 1', content='b', author=self.author_000)
+        post_002 = create_post(title='Post 2', content='c', author=self.author_000, category=programming)
+        post_003 = create_post(title='Post 3', content='d', author=self.author_000)
+        post_000.tags.add(python, django)
+        post_001.tags.add(python, django)
+        post_002.tags.add(python)
+        post_003.tags.add(travel)
+
+        def related_titles(post):
+            return [related.title for related in get_related_posts(post.pk)]
+
+        # 태그가 많이 겹칠수록 먼저, 겹치지 않으면 들어가지 않는다.
+        self.assertEqual(related_titles(post_000), ['Post 1', 'Post 2'])
+        self.assertEqual(related_titles(post_002), ['Post 1', 'Post 0'])
+        self.assertEqual(related_titles(post_003), [])
+
+        # 카테고리가 바뀌면 같은 카테고리 글이 앞으로 온다.
+        post_000.category = programming
+        post_000.save()
+        self.assertEqual(related_titles(post_002), ['Post 0', 'Post 1'])
+
+        # 태그를 빼면 그 글을 보여주던 목록에서도 빠진다.
+        post_001.tags.clear()
+        self.assertEqual(related_titles(post_000), ['Post 2'])
+        travel.post_set.add(post_000)
+        self.assertEqual(related_titles(post_003), ['Post 0'])
+
+        # 상세 페이지는 쿼리 하나로 읽고, 목록이 바뀌면 ETag 가 바뀐다.
+        response = self.client.get(post_003.get_absolute_url())
+        soup = BeautifulSoup(response.content, 'html.parser')
+        self.assertIn('Post 0', soup.find('div', id='related-posts-card').text)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            get_related_posts(post_003.pk)
+
+        post_000.delete()
+        response = self.client.get(post_003.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(BeautifulSoup(response.content, 'html.parser').find('div', id='related-posts-card'))
+        self.assertEqual(related_titles(post_002), [])
+
+        # bulk_create 처럼 signal 없이 바뀐 뒤에는 rebuild_related_posts 로 다시 만든다.
+        post_001.tags.add(python)
+        RelatedPost.objects.all().delete()
+        call_command('rebuild_related_posts', stdout=StringIO())
+        self.assertEqual(related_titles(post_002), ['Post 1'])
+        self.assertEqual(related_titles(post_001), ['Post 2'])
+
+    def test_archive(self):
+        programming = create_category(name='programming')
+        post_000 = create_post(title='Post 0', content='a', author=self.author_000, category=programming)
+        post_001 = create_post(title='Post 1', content='b', author=self.author_000)
+        post_002 = create_post(title='Post 2', content='c', author=self.author_000, category=programming)
+        # 서울 시간으로 3월 1일 0시 30분 (UTC 로는 2월)
+        Post.objects.filter(pk=post_002.pk).update(created=timezone.make_aware(timezone.datetime(2020, 3, 1, 0, 30)))
+        call_command('rebuild_archive', stdout=StringIO())
+
+        this_month = timezone.localtime(post_000.created)
+        self.assertEqual(
+            [(row.year, row.month, row.count) for row in MonthlyPostCount.objects.all()],
+            [(this_month.year, this_month.month, 2), (2020, 3, 1)],
+        )
+
+        response = self.client.get('/blog/')
+        archive_card = BeautifulSoup(response.content, 'html.parser').find('div', id='archive-card')
+        self.assertIn('{}년 {}월 (2)'.format(this_month.year, this_month.month), archive_card.text)
+        self.assertIn('2020년 3월 (1)', archive_card.text)
+
+        response = self.client.get('/blog/archive/2020/3/')
+        soup = BeautifulSoup(response.content, 'html.parser')
+        self.assertIn('2020년 3월', soup.find('h1', id='blog-list-title').text)
+        self.assertIsNotNone(soup.find('div', id='post-card-{}'.format(post_002.pk)))
+        self.assertIsNone(soup.find('div', id='post-card-{}'.format(post_000.pk)))
+        self.assertEqual(self.client.get('/blog/archive/2020/13/').status_code, 404)
+
+        # 카테고리 페이지의 보관함은 그 카테고리의 월별 글 수
+        response = self.client.get(programming.get_absolute_url())
+        archive_card = BeautifulSoup(response.content, 'html.parser').find('div', id='archive-card')
+        self.assertIn('{}년 {}월 (1)'.format(this_month.year, this_month.month), archive_card.text)
+        response = self.client.get(programming.get_absolute_url() + 'archive/{}/{}/'.format(this_month.year, this_month.month))
+        soup = BeautifulSoup(response.content, 'html.parser')
+        self.assertIsNotNone(soup.find('div', id='post-card-{}'.format(post_000.pk)))
+        self.assertIsNone(soup.find('div', id='post-card-{}'.format(post_001.pk)))
+
+        # 저장/삭제 signal 로 개수가 바로 고쳐진다.
+        def counts():
+            return (
+                {(row.year, row.month): row.count for row in MonthlyPostCount.objects.all()},
+                {(row.category_id, row.year, row.month): row.count for row in CategoryMonthlyPostCount.objects.all()},
+            )
+
+        post_001.category = programming
+        post_001.save()
+        Post.objects.get(pk=post_002.pk).delete()
+        expected = counts()
+        self.assertEqual(expected, (
+            {(this_month.year, this_month.month): 2},
+            {(programming.pk, this_month.year, this_month.month): 2},
+        ))
+        call_command('rebuild_archive', stdout=StringIO())
+        self.assertEqual(counts(), expected)
+
+    def test_view_count(self):
+        post_000 = create_post(title='Post 0', content='a', author=self.author_000)
+        post_001 = create_post(title='Post 1', content='b', author=self.author_000)
+        browser = {'HTTP_USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0'}
+        # 실패해도 모아 둔 조회가 테스트 DB 가 지워진 뒤(atexit)에 기록되지 않도록
+        self.addCleanup(viewcount.counter.flush)
+
+        # 요청 중에는 기록하지 않고 모아 둔다. (두 번째 요청은 page cache 에서 나가도 센다)
+        viewcount.counter.flush()
+        with override_settings(BLOG_VIEW_COUNT_FLUSH_SECONDS=60):
+            for _ in range(2):
+                self.client.get(post_000.get_absolute_url(), **browser)
+            self.client.get(
+                post_000.get_absolute_url(), HTTP_USER_AGENT='Googlebot/2.1 (+http://www.google.com/bot.html)'
+            )
+            self.client.get(post_000.get_absolute_url())
+            self.client.get('/blog/', **browser)
+        self.assertFalse(PostStats.objects.exists())
+
+        self.assertEqual(viewcount.counter.flush(), 2)
+        self.assertEqual(PostStats.objects.get(post=post_000).view_count, 2)
+
+        # 간격이 지나면 요청을 처리한 뒤 한 번의 executemany 로 기록한다.
+        with override_settings(BLOG_VIEW_COUNT_FLUSH_SECONDS=0):
+            self.client.get(post_001.get_absolute_url(), **browser)
+        self.assertEqual(PostStats.objects.get(post=post_001).view_count, 1)
+        cache.clear()
+        response = self.client.get(post_000.get_absolute_url(), **browser)
+        self.assertEqual(BeautifulSoup(response.content, 'html.parser').find(id='view-count').text, 'Views 2')
+        viewcount.counter.flush()
+
+        # 인기 점수는 시간이 지나면 줄어든다: 반감기 세 번 전의 조회 3 번 < 지금의 조회 1 번
+        PostStats.objects.all().delete()
+        now = time.time()
+        half_life = settings.BLOG_POPULARITY_HALF_LIFE
+        with patch('blog.viewcount.time.time', return_value=now - half_life * 3):
+            for _ in range(3):
+                viewcount.counter.add(post_000.pk)
+            viewcount.counter.flush()
+        with patch('blog.viewcount.time.time', return_value=now):
+            viewcount.counter.add(post_001.pk)
+            viewcount.counter.flush()
+        # 사이드바는 POPULAR_POSTS_CACHE_TIMEOUT 동안 캐시한 목록을 보여준다.
+        viewcount.invalidate_popular_posts()
+        self.assertEqual([post.title for post in viewcount.get_popular_posts()], ['Post 1', 'Post 0'])
+
+        response = self.client.get('/blog/')
+        popular_card = BeautifulSoup(response.content, 'html.parser').find('div', id='popular-card')
+        self.assertEqual([a.text for a in popular_card.find_all('a')], ['Post 1', 'Post 0'])
+
+        # 계속 보면 다시 올라간다.
+        viewcount.invalidate_popular_posts()
+        with patch('blog.viewcount.time.time', return_value=now):
+            for _ in range(2):
+                viewcount.counter.add(post_000.pk)
+            viewcount.counter.flush()
+        self.assertEqual([post.title for post in viewcount.get_popular_posts()], ['Post 0', 'Post 1'])
+
+    def test_object_cache(self):
+        category_life = create_category(name='life')
+        tag_django = create_tag(name='django')
+        post_000 = create_post(title='Post 0', content='a', author=self.author_000, category=category_life)
+        post_000.tags.add(tag_django)
+
+        # 처음에는 slug 로 객체까지 한 번에 읽고, 그 뒤에는 쿼리 없이 (새 객체로) 돌려준다.
+        with self.assertNumQueries(1):
+            category = objectcache.get_by_slug(Category, 'life')
+        with self.assertNumQueries(0):
+            self.assertEqual(objectcache.get_by_slug(Category, 'life').name, 'life')
+            self.assertIsNot(objectcache.get_by_slug(Category, 'life'), category)
+        with self.assertNumQueries(2):
+            post = objectcache.get_object(Post, post_000.pk)
+        with self.assertNumQueries(0):
+            post = objectcache.get_object(Post, post_000.pk)
+            self.assertEqual(post.category.name, 'life')
+            self.assertEqual([tag.name for tag in post.tags.all()], ['django'])
+
+        # 없는 slug 도 기억해 두고 Http404 를 낸다.
+        with self.assertNumQueries(1), self.assertRaises(Http404):
+            objectcache.get_by_slug(Tag, 'python')
+        with self.assertNumQueries(0), self.assertRaises(Http404):
+            objectcache.get_by_slug(Tag, 'python')
+        self.assertEqual(self.client.get('/blog/tag/python/').status_code, 404)
+        self.assertEqual(self.client.get('/blog/category/python/').status_code, 404)
+
+        # 저장/삭제하면 그 항목을 지운다.
+        tag_python = create_tag(name='python')
+        self.assertEqual(objectcache.get_by_slug(Tag, 'python'), tag_python)
+        post_000.tags.add(tag_python)
+        self.assertEqual(len(objectcache.get_object(Post, post_000.pk).tags.all()), 2)
+        category_life.name = 'daily life'
+        category_life.save()
+        self.assertEqual(objectcache.get_by_slug(Category, 'life').name, 'daily life')
+        self.assertEqual(objectcache.get_object(Post, post_000.pk).category.name, 'daily life')
+        post_000.title = 'Post 0 (edited)'
+        post_000.save()
+        self.assertEqual(objectcache.get_object(Post, post_000.pk).title, 'Post 0 (edited)')
+        # 다른 프로세스에서 바뀐 글(signal 이 오지 않는다)도 상세 페이지는 ETag 를 만든 DB 의 글과 비교해서 다시 읽는다.
+        self.client.get(post_000.get_absolute_url())
+        Post.objects.filter(pk=post_000.pk).update(title='Post 0 (elsewhere)', updated_at=timezone.now())
+        with override_settings(BLOG_PAGE_CACHE_TIMEOUT=0):
+            response = self.client.get(post_000.get_absolute_url())
+        self.assertIn('Post 0 (elsewhere)', response.content.decode())
+
+        post_000.delete()
+        with self.assertRaises(Http404):
+            objectcache.get_object(Post, post_000.pk)
+
+        # 요청 하나에서 카테고리는 한 번만 읽는다.
+        create_post(title='Post 1', content='b', author=self.author_000, category=category_life)
+        objectcache.clear()
+        with override_settings(BLOG_PAGE_CACHE_TIMEOUT=0), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(category_life.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([query for query in queries if 'FROM "blog_category" WHERE' in query['sql']]), 1)
+
+    def test_head_image_renditions(self):
+        image = BytesIO()
+        Image.new('RGB', (2000, 1200), (200, 100, 50)).save(image, 'JPEG')
+        upload = SimpleUploadedFile('photo.jpg', image.getvalue(), content_type='image/jpeg')
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root, BLOG_THUMBNAIL_WORKERS=0):
+            post_000 = Post.objects.create(
+                title='The First Post',
+                content='Hello World, We are the world',
+                author=self.author_000,
+                head_image=upload,
+            )
+            self.assertNotEqual(post_000.head_image_hash, '')
+
+            name = thumbnails.get_rendition_name(post_000.head_image_hash, 'card', 750, 'webp')
+            with Image.open(os.path.join(media_root, name)) as rendition:
+                self.assertEqual(rendition.size, (750, 300))
+
+            response = self.client.get('/blog/')
+            soup = BeautifulSoup(response.content, 'html.parser')
+            card_img = soup.find('div', id='post-card-{}'.format(post_000.pk)).find('img')
+            self.assertIn('750w', card_img['srcset'])
+            self.assertNotIn(post_000.head_image.url, card_img['src'])
+
+            # 같은 원본이면 다시 만들지 않고 같은 해시를 쓴다.
+            self.assertEqual(thumbnails.generate_for_post(post_000), post_000.head_image_hash)
+
     def test_comment(self):
         post_000 = create_post(
             title='The First Post',
@@ -535,6 +1142,164 @@ class TestView(TestCase):
         self.assertIn('Older', soup.body.text)
         self.assertIn('Newer', soup.body.text)
 
+    def test_cursor_pagination(self):
+        posts = [
+            create_post(
+                title='The Post No. {}'.format(i),
+                content='Content {}'.format(i),
+                author=self.author_000,
+            )
+            for i in range(12)
+        ]
+        posts.reverse()
+
+        def get_page(url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            page_obj = response.context['page_obj']
+            return [p.pk for p in page_obj], page_obj
+
+        # Older 링크를 따라가면 모든 글을 한 번씩 보게 된다.
+        seen = []
+        pks, page_obj = get_page('/blog/')
+        seen += pks
+        while page_obj.has_next():
+            pks, page_obj = get_page('/blog/?' + page_obj.next_query)
+            seen += pks
+        self.assertEqual(seen, [p.pk for p in posts])
+
+        # 마지막 페이지에서 Newer 로 돌아가면 바로 앞 페이지가 나온다.
+        pks, page_obj = get_page('/blog/?' + page_obj.previous_query)
+        self.assertEqual(pks, [p.pk for p in posts[5:10]])
+        self.assertTrue(page_obj.has_previous())
+
+        # 예전 ?page=N 링크도 동작한다.
+        pks, page_obj = get_page('/blog/?page=2')
+        self.assertEqual(pks, [p.pk for p in posts[5:10]])
+
+        response = self.client.get('/blog/?cursor=invalid')
+        self.assertEqual(response.status_code, 404)
+
+    def test_post_list_query_count(self):
+        category_politics = create_category(name='정치/사회')
+        tag_america = create_tag(name='america')
+
+        def add_posts(count):
+            for i in range(count):
+                post = create_post(
+                    title='The Post No. {}'.format(i),
+                    content='Content {}'.format(i),
+                    author=self.author_000,
+                    category=category_politics,
+                )
+                post.tags.add(tag_america)
+
+        # ETag 계산 1 + posts 1 + tags prefetch 1 + sidebar 2 + 인기 글 1 (캐시가 비어 있을 때)
+        add_posts(1)
+        cache.clear()
+        with self.assertNumQueries(6):
+            self.client.get('/blog/')
+
+        # 한 페이지에 보이는 글 수가 늘어도 쿼리 수는 같다.
+        add_posts(10)
+        cache.clear()
+        with self.assertNumQueries(6):
+            response = self.client.get('/blog/')
+        self.assertEqual(len(response.context['page_obj']), 5)
+
+        cache.clear()
+        with self.assertNumQueries(6):
+            self.client.get('/blog/?' + response.context['page_obj'].next_query)
+
+    def test_generate_dataset_and_bench(self):
+        call_command(
+            'generate_dataset', posts=30, comments=100, tags=5, categories=3, users=3, batch_size=7,
+            stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 100)
+        post = Post.objects.order_by('?').first()
+        self.assertTrue(post.content_html)
+        self.assertTrue(post.excerpt)
+        # 작성 시각은 덮어쓰지 않고 여러 날짜에 흩어져 있다.
+        self.assertGreater(Post.objects.dates('created', 'day').count(), 1)
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as f:
+            call_command('bench_urls', requests=2, warmup=0, output=f.name, stdout=StringIO())
+            report = json.load(f)
+
+        self.assertEqual(report['dataset']['posts'], 30)
+        results = {result['route']: result for result in report['results']}
+        self.assertEqual(results['/blog/<int:pk>/new_comment/']['skipped'], 'write')
+        for route in ('/blog/', '/blog/<int:pk>/', '/blog/category/<str:slug>/', '/blog/tag/<str:slug>/'):
+            self.assertEqual(results[route]['status'], [200])
+            self.assertGreater(results[route]['queries'], 0)
+
+    def test_import_posts(self):
+        category = create_category(name='programming')
+        source = tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+
+        with open(os.path.join(source.name, '001-hello.md'), 'w', encoding='utf-8') as f:
+            f.write('---\ntitle: 파이썬 시작하기\nauthor: smith\ncategory: programming\n'
+                    'tags: [python, 입문]\ncreated: 2019-03-01\n---\n# 안녕하세요\n\n첫 글입니다.\n')
+        with open(os.path.join(source.name, '002-plain.md'), 'w', encoding='utf-8') as f:
+            f.write('No front matter here.\n')
+
+        since = timezone.now()
+        call_command(
+            'import_posts', source.name, author='benny', batch_size=1,
+            checkpoint=os.path.join(source.name, 'md.checkpoint'), stdout=StringIO(),
+        )
+        post = Post.objects.get(title='파이썬 시작하기')
+        self.assertEqual(post.author, self.author_000)
+        self.assertEqual(post.category, category)
+        self.assertEqual(sorted(tag.name for tag in post.tags.all()), ['python', '입문'])
+        self.assertEqual(post.created.year, 2019)
+        self.assertIn('<h1>안녕하세요</h1>', post.content_html)
+        self.assertEqual(Post.objects.get(title='002-plain').author, self.user_benny)
+        self.assertEqual(search_post_ids('파이썬'), [post.pk])
+        # 작성 시각이 예전이어도 updated_since 로 동기화하는 쪽에는 새로 바뀐 글로 보인다.
+        response = self.client.get('/api/v1/posts/', {'updated_since': since.isoformat(), 'fields': 'id,title'})
+        self.assertEqual(
+            sorted(row['title'] for row in response.json()['results']), ['002-plain', '파이썬 시작하기']
+        )
+
+        # JSONL: 세 번째 줄에서 실패하면 앞의 두 글은 남고, 고친 뒤 다시 실행하면 세 번째부터 넣는다.
+        jsonl_path = os.path.join(source.name, 'posts.jsonl')
+        records = [
+            {'title': 'Post A', 'content': 'a', 'author': 'smith', 'tags': ['python', 'django']},
+            {'title': 'Post B', 'content': 'b', 'author': 'smith', 'category': '새 카테고리'},
+            {'title': 'Post C' * 10, 'content': 'c', 'author': 'smith'},
+        ]
+        with open(jsonl_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+
+        with self.assertRaises(CommandError):
+            call_command('import_posts', jsonl_path, batch_size=1, stdout=StringIO())
+        self.assertTrue(Post.objects.filter(title='Post B', category__name='새 카테고리').exists())
+        self.assertEqual(Tag.objects.filter(name='python').count(), 1)
+
+        records[2]['title'] = 'Post C'
+        with open(jsonl_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        call_command('import_posts', jsonl_path, batch_size=2, stdout=StringIO())
+        self.assertEqual(Post.objects.filter(title__in=['Post A', 'Post B', 'Post C']).count(), 3)
+
+        # 맨 뒤의 글이 지워져도 그 pk 를 다시 쓰지 않는다. (JSON API 의 deleted 에 남아 있다)
+        deleted_pk = Post.objects.get(title='Post C').pk
+        Post.objects.filter(pk=deleted_pk).delete()
+        with open(jsonl_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'title': 'Post D', 'author': 'smith'}) + '\n')
+        call_command('import_posts', jsonl_path, restart=True, stdout=StringIO())
+        self.assertGreater(Post.objects.get(title='Post D').pk, deleted_pk)
+
+        # 정한 pk 를 그 사이에 다른 곳에서 썼으면 CommandError 로 멈추고 아무것도 넣지 않는다.
+        with patch('blog.management.commands.import_posts.next_pk', return_value=post.pk):
+            with self.assertRaises(CommandError):
+                call_command('import_posts', jsonl_path, restart=True, stdout=StringIO())
+        self.assertEqual(Post.objects.filter(title='Post D').count(), 1)
+
     def test_search(self):
         post_000 = create_post(
             title='Are you Hungry?',
@@ -562,3 +1327,231 @@ class TestView(TestCase):
         self.assertIn(post_000.content, soup.body.text)
         self.assertNotIn(post_001.content, soup.body.text)
 
+        # 개수는 FTS 에서 세고, 페이지마다 그 페이지의 결과만 가져온다.
+        for i in range(5):
+            create_post(title='Food {}'.format(i), content='food', author=self.author_000)
+        response = self.client.get('/blog/search/food/')
+        self.assertEqual(response.context['search_count'], 7)
+        # 제목에 있는 글이 먼저 나온다.
+        self.assertTrue(all(post.title.startswith('Food') for post in response.context['post_list']))
+        response = self.client.get('/blog/search/food/?page=2')
+        self.assertEqual(len(response.context['post_list']), 2)
+        self.assertTrue(response.context['page_obj'].has_previous())
+        self.assertFalse(response.context['page_obj'].has_next())
+
+    def test_search_korean(self):
+        post_000 = create_post(
+            title='파이썬 공부',
+            content='오늘은 장고를 배웠습니다.',
+            author=self.author_000,
+        )
+
+        post_001 = create_post(
+            title='자바스크립트',
+            content='프론트엔드 이야기',
+            author=self.author_000,
+        )
+
+        # 띄어쓰기 단위가 아닌 단어 일부(조사가 붙은 경우)로도 찾을 수 있다.
+        response = self.client.get('/blog/search/장고/')
+        self.assertEqual(response.status_code, 200)
+
+        soup = BeautifulSoup(response.content, 'html.parser')
+        main_div = soup.find('div', id='main-div')
+        self.assertIn(post_000.title, main_div.text)
+        self.assertNotIn(post_001.title, main_div.text)
+
+        # 제목에 있는 단어가 본문에 있는 단어보다 먼저 나온다.
+        post_002 = create_post(
+            title='장고 입문',
+            content='시작하기',
+            author=self.author_000,
+        )
+        self.assertEqual(search_post_ids('장고'), [post_002.pk, post_000.pk])
+
+        # 삭제된 Post 는 인덱스에서도 빠진다.
+        post_002.delete()
+        self.assertEqual(search_post_ids('장고'), [post_000.pk])
+
+
+@override_settings(ROOT_URLCONF='my_proj.asgi_urls', BLOG_PAGE_CACHE_TIMEOUT=0)
+class TestAsyncView(TransactionTestCase):
+    # async view 는 쿼리를 다른 thread(다른 DB 연결)에서 실행하므로 데이터가 commit 되어 있어야 한다.
+    def setUp(self):
+        cache.clear()
+        objectcache.clear()
+        self.client = AsyncClient()
+        # 쿼리를 실행한 worker thread 의 연결이 테스트 DB 를 지운 뒤까지 남지 않도록 바로 닫게 한다.
+        conn_max_age = patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 0})
+        conn_max_age.start()
+        self.addCleanup(conn_max_age.stop)
+        self.author_000 = User.objects.create(username='smith', password='nopassword')
+        # AsyncClient(3.1)는 path 를 latin-1 로 넘기므로 slug 는 영문으로 만든다.
+        self.category = create_category(name='programming')
+        self.tag = create_tag(name='django')
+        self.post_000 = create_post(
+            title='The first post',
+            content='Hello World. We are the world.',
+            author=self.author_000,
+            category=self.category,
+        )
+        self.post_000.tags.add(self.tag)
+        self.post_001 = create_post(title='The second post', content='Second', author=self.author_000)
+        create_comment(self.post_000, text='첫 댓글', author=self.author_000)
+
+    async def test_post_list(self):
+        response = await self.client.get('/blog/')
+        self.assertEqual(response.status_code, 200)
+        soup = BeautifulSoup(response.content, 'html.parser')
+        self.assertIn(self.post_000.title, soup.body.text)
+        self.assertIn(self.post_001.title, soup.body.text)
+        # 사이드바도 함께 채워진다.
+        self.assertIn('{} (1)'.format(self.category.name), soup.find('div', id='category-card').text)
+
+        response = await self.client.get('/blog/', **{'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_taxonomy(self):
+        response = await self.client.get(self.category.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.post_000.title, response.content.decode())
+        self.assertNotIn(self.post_001.title, response.content.decode())
+
+        response = await self.client.get('/blog/category/_none/')
+        self.assertIn(self.post_001.title, response.content.decode())
+        self.assertNotIn(self.post_000.title, response.content.decode())
+
+        response = await self.client.get(self.tag.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.post_000.title, response.content.decode())
+
+        response = await self.client.get('/blog/category/no-such-category/')
+        self.assertEqual(response.status_code, 404)
+        response = await self.client.get('/blog/tag/no-such-tag/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_post_detail(self):
+        response = await self.client.get(self.post_000.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        soup = BeautifulSoup(response.content, 'html.parser')
+        self.assertIn(self.post_000.title, soup.find('h1').text)
+        self.assertIn('첫 댓글', soup.find('div', id='comment-list').text)
+
+        response = await self.client.get('/blog/{}/'.format(self.post_001.pk + 100))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_search(self):
+        response = await self.client.get('/blog/search/first/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.post_000.title, response.content.decode())
+        self.assertNotIn(self.post_001.title, response.content.decode())
+
+    async def asgi_get(self, path):
+        """my_proj.asgi 의 application 에 직접 요청한다. (AsyncClient 는 스트리밍 본문을 event loop 밖에서 읽는다)"""
+        from my_proj.asgi import application
+
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http',
+            'method': 'GET',
+            'path': path,
+            'query_string': b'',
+            'headers': [(b'host', b'testserver')],
+            'server': ('testserver', 80),
+            'client': ('127.0.0.1', 0),
+        })
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(5)
+        body = b''
+        while True:
+            message = await communicator.receive_output(5)
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        return start['status'], body.decode()
+
+    async def test_streaming_responses(self):
+        # feed / sitemap 은 본문을 흘려보내면서 쿼리를 실행한다.
+        status, content = await self.asgi_get('/blog/feed/rss/')
+        self.assertEqual(status, 200)
+        self.assertIn(self.post_000.title, content)
+        self.assertIn(self.post_001.title, content)
+
+        status, content = await self.asgi_get('/sitemap.xml')
+        self.assertEqual(status, 200)
+        self.assertIn('http://testserver/sitemap-posts-1.xml', content)
+
+        status, content = await self.asgi_get('/sitemap-posts-1.xml')
+        self.assertEqual(status, 200)
+        self.assertIn('http://testserver{}'.format(self.post_000.get_absolute_url()), content)
+
+        status, content = await self.asgi_get('/sitemap-taxonomy.xml')
+        self.assertEqual(status, 200)
+        self.assertIn('http://testserver{}'.format(self.tag.get_absolute_url()), content)
+
+    async def test_lifespan_shutdown_flushes_view_counts(self):
+        from my_proj.asgi import application
+
+        self.addCleanup(viewcount.counter.flush)
+        await sync_to_async(viewcount.counter.flush)()
+        viewcount.counter.add(self.post_000.pk)
+        viewcount.counter.add(self.post_000.pk)
+
+        communicator = ApplicationCommunicator(application, {'type': 'lifespan'})
+        await communicator.send_input({'type': 'lifespan.startup'})
+        self.assertEqual((await communicator.receive_output(5))['type'], 'lifespan.startup.complete')
+        await communicator.send_input({'type': 'lifespan.shutdown'})
+        self.assertEqual((await communicator.receive_output(5))['type'], 'lifespan.shutdown.complete')
+
+        stats = await sync_to_async(PostStats.objects.get)(post=self.post_000)
+        self.assertEqual(stats.view_count, 2)
+
+    async def test_export(self):
+        status, content = await self.asgi_get('/api/v1/export/posts.ndjson')
+        self.assertEqual(status, 200)
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.post_000.pk, self.post_001.pk])
+        self.assertEqual(rows[0]['tags'], [self.tag.slug])
+
+        status, content = await self.asgi_get('/api/v1/export/comments.ndjson')
+        self.assertEqual(status, 200)
+        self.assertEqual([json.loads(line)['text'] for line in content.splitlines()], ['첫 댓글'])
+
+
+class TestConcurrentComments(TransactionTestCase):
+    THREADS = 8
+    COMMENTS_PER_THREAD = 10
+
+    def test_journal_mode(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+    def test_new_comment_from_threads(self):
+        author = User.objects.create_user(username='smith', password='nopassword')
+        post_000 = create_post(title='The First Post', content='Hello World', author=author)
+        errors = []
+
+        def post_comments(number):
+            client = Client()
+            try:
+                client.force_login(author)
+                for i in range(self.COMMENTS_PER_THREAD):
+                    response = client.post(
+                        post_000.get_absolute_url() + 'new_comment/',
+                        {'text': 'comment {}-{}'.format(number, i)},
+                    )
+                    if response.status_code != 302:
+                        errors.append(response.status_code)
+            except OperationalError as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=post_comments, args=(number,)) for number in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(post_000.comment_set.count(), self.THREADS * self.COMMENTS_PER_THREAD)
@@ -0,0 +1,151 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.utils import timezone
+
+from . import pagecache
+
+# Post.head_image 원본에서 목록 카드/상세 페이지용 축소본(JPEG, WebP)을 만든다.
+# 축소본은 원본 파일 내용의 해시로 경로가 정해지므로 같은 원본은 몇 번을 돌려도 같은 결과가 된다.
+# 요청 처리 중에는 만들지 않고, 업로드가 커밋된 뒤 별도 프로세스에서 만든다.
+
+RENDITION_DIR = 'renditions'
+
+# 이름: (너비 목록, 너비:높이 비율 또는 None)
+RENDITIONS = {
+    'card': ([375, 750, 1500], (5, 2)),  # post_list.html 의 카드 (750x300)
+    'detail': ([900, 1800], None),
+}
+FORMATS = {
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+}
+
+_executor = None
+
+
+def get_worker_count():
+    return getattr(settings, 'BLOG_THUMBNAIL_WORKERS', 2)
+
+
+def get_source_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_rendition_name(source_hash, kind, width, ext):
+    return '{}/{}/{}/{}-{}.{}'.format(RENDITION_DIR, source_hash[:2], source_hash, kind, width, ext)
+
+
+def get_srcset(source_hash, kind, ext):
+    widths, ratio = RENDITIONS[kind]
+    return ', '.join(
+        '{}{} {}w'.format(settings.MEDIA_URL, get_rendition_name(source_hash, kind, width, ext), width)
+        for width in widths
+    )
+
+
+def get_url(source_hash, kind, ext='jpg'):
+    widths, ratio = RENDITIONS[kind]
+    return settings.MEDIA_URL + get_rendition_name(source_hash, kind, widths[len(widths) // 2], ext)
+
+
+def render_renditions(source_path, media_root):
+    """
+    worker 프로세스에서 실행된다. (Django ORM 을 쓰지 않는다)
+    이미 모든 축소본이 있으면 아무것도 하지 않고 원본 해시를 돌려준다.
+    """
+    from PIL import Image, ImageOps
+
+    source_hash = get_source_hash(source_path)
+    targets = [
+        (kind, width, ext)
+        for kind, (widths, ratio) in RENDITIONS.items()
+        for width in widths
+        for ext in FORMATS
+    ]
+    missing = [
+        target for target in targets
+        if not os.path.exists(os.path.join(media_root, get_rendition_name(source_hash, *target)))
+    ]
+    if not missing:
+        return source_hash
+
+    with Image.open(source_path) as source:
+        image = ImageOps.exif_transpose(source).convert('RGB')
+
+    for kind, width, ext in missing:
+        ratio = RENDITIONS[kind][1]
+        if ratio:
+            height = width * ratio[1] // ratio[0]
+            rendition = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            rendition = image.copy()
+            # 원본보다 크게 늘리지는 않는다.
+            rendition.thumbnail((width, width * 10), Image.LANCZOS)
+
+        path = os.path.join(media_root, get_rendition_name(source_hash, kind, width, ext))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 다른 worker 가 같은 파일을 쓰는 중이어도 깨진 파일이 보이지 않도록 임시 파일에 쓰고 바꾼다.
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        image_format, options = FORMATS[ext]
+        rendition.save(tmp_path, image_format, **options)
+        os.replace(tmp_path, path)
+
+    return source_hash
+
+
+def mark_renditions_ready(post_pk, image_name, source_hash):
+    from .models import Post  # models 가 이 모듈을 import 하므로 여기서 가져온다.
+
+    # 그 사이 이미지가 바뀌었다면 기록하지 않는다.
+    updated = Post.objects.filter(pk=post_pk, head_image=image_name).update(
+        head_image_hash=source_hash, updated_at=timezone.now()
+    )
+    if updated:
+        pagecache.invalidate('post:{}'.format(post_pk))
+    return updated
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=get_worker_count())
+    return _executor
+
+
+def generate_for_post(post):
+    """축소본을 바로 만든다. (backfill 명령, BLOG_THUMBNAIL_WORKERS = 0 일 때)"""
+    source_hash = render_renditions(post.head_image.path, settings.MEDIA_ROOT)
+    if mark_renditions_ready(post.pk, post.head_image.name, source_hash):
+        post.head_image_hash = source_hash
+    return source_hash
+
+
+def enqueue_for_post(post):
+    if not post.head_image:
+        return
+
+    if get_worker_count() <= 0:
+        generate_for_post(post)
+        return
+
+    post_pk, image_name, source_path = post.pk, post.head_image.name, post.head_image.path
+
+    def on_done(future):
+        # ProcessPoolExecutor 의 결과 처리 thread 에서 실행되므로 이 thread 의 DB 연결을 정리한다.
+        try:
+            mark_renditions_ready(post_pk, image_name, future.result())
+        finally:
+            close_old_connections()
+
+    def submit():
+        get_executor().submit(render_renditions, source_path, settings.MEDIA_ROOT).add_done_callback(on_done)
+
+    transaction.on_commit(submit)
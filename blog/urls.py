@@ -14,16 +14,26 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.urls import path
-from blog import views
+from blog import views, feeds
 
 urlpatterns = [
     path('search/<str:q>/', views.PostSearch.as_view()),
     path('category/<str:slug>/', views.PostListByCategory.as_view()),
     path('tag/<str:slug>/', views.PostListByTag.as_view()),
+    path('archive/<int:year>/<int:month>/', views.PostListByMonth.as_view()),
+    path('category/<str:slug>/archive/<int:year>/<int:month>/', views.PostListByMonth.as_view()),
+    # RSS / Atom feed (blog/feeds.py)
+    path('feed/rss/', feeds.post_feed, {'kind': 'rss'}),
+    path('feed/atom/', feeds.post_feed, {'kind': 'atom'}),
+    path('category/<str:slug>/feed/rss/', feeds.category_feed, {'kind': 'rss'}),
+    path('category/<str:slug>/feed/atom/', feeds.category_feed, {'kind': 'atom'}),
+    path('tag/<str:slug>/feed/rss/', feeds.tag_feed, {'kind': 'rss'}),
+    path('tag/<str:slug>/feed/atom/', feeds.tag_feed, {'kind': 'atom'}),
     # integer type으로 숫자가 들어올 때 pk를 의미한다. -> post_detail을 실행한다.
     path('<int:pk>/', views.PostDetail.as_view()),
     path('<int:pk>/update/', views.PostUpdate.as_view()),
     path('<int:pk>/new_comment/', views.new_comment),
+    path('<int:pk>/comments/', views.comment_list),
     # path('delete_comment/<int:pk>/', views.CommentDelete.as_view()),  # Class Based View
     path('delete_comment/<int:pk>/', views.delete_comment),  # Function Based View
     path('edit_comment/<int:pk>/', views.CommentUpdate.as_view()),
@@ -0,0 +1,139 @@
+import atexit
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, DEFAULT_DB_ALIAS, DatabaseError, transaction
+
+from . import objectcache
+from .models import Post, PostStats
+
+# 글 조회수와 인기 점수.
+# 상세 페이지를 볼 때마다 UPDATE 하면 모든 읽기 요청이 SQLite 의 쓰기 잠금을 기다리게 되므로
+# 프로세스 안에서 글마다 세어 두었다가 BLOG_VIEW_COUNT_FLUSH_SECONDS 마다 한 번의 executemany 로 기록한다.
+# 기록은 조회를 셀 때 확인하므로 조회가 더 없으면 다음 조회 때, 또는 프로세스가 끝날 때(atexit, ASGI lifespan.shutdown) 기록한다.
+# (프로세스가 비정상 종료되면 기록하지 못한 만큼은 잃는다)
+#
+# 화면의 조회수 / 인기 글은 실시간이 아니다. 조회수를 기록해도 page cache 는 무효화하지 않으므로 (많이 보는 글일수록
+# 캐시가 계속 깨진다) 캐시에서 나간 상세 페이지의 조회수는 BLOG_VIEW_COUNT_FLUSH_SECONDS + BLOG_PAGE_CACHE_TIMEOUT,
+# 인기 글은 거기에 POPULAR_POSTS_CACHE_TIMEOUT 만큼 늦을 수 있다. 304 이면 브라우저에 있던 페이지의 값 그대로이다.
+#
+# 인기 점수는 조회 하나마다 exp(조회 시각 / tau) 를 더한 값의 log 로 저장한다. (PostStats.popularity)
+# 지금의 점수 exp(popularity - 지금 / tau) 는 모든 글이 같은 비율로 줄어드므로 popularity 순서가 곧 인기 순서이고,
+# 사이드바는 popularity 인덱스로 상위 몇 개만 읽으면 된다.
+
+logger = logging.getLogger(__name__)
+
+# ViewCountMiddleware 가 이 속성이 있는 응답을 조회로 센다. (pagecache.KEPT_ATTRIBUTES 에도 있으므로 캐시에서 나간 응답도 센다)
+VIEW_ATTR = 'counted_post_id'
+
+# 검색 엔진, 링크 미리보기, 스크립트
+BOT_RE = re.compile(
+    r'bot|crawl|spider|slurp|fetch|preview|scan|monitor|headless|python|curl|wget|http-?client|java/|go-http|facebookexternalhit',
+    re.IGNORECASE,
+)
+
+POPULAR_POSTS_COUNT = 5
+POPULAR_POSTS_CACHE_KEY = 'blog:popular_posts'
+POPULAR_POSTS_CACHE_TIMEOUT = 60 * 5
+
+UPSERT_SQL = (
+    'INSERT INTO {table} (post_id, view_count, popularity) '
+    'SELECT id, %s, %s FROM {post_table} WHERE id = %s '
+    'ON CONFLICT(post_id) DO UPDATE SET '
+    'view_count = view_count + excluded.view_count, '
+    # log(exp(a) + exp(b)) 를 넘치지 않게 계산한다. (LN, EXP 는 Django 가 SQLite 연결에 등록해 둔다)
+    'popularity = MAX(popularity, excluded.popularity) + LN(1 + EXP(-ABS(popularity - excluded.popularity)))'
+)
+
+
+def get_flush_seconds():
+    return getattr(settings, 'BLOG_VIEW_COUNT_FLUSH_SECONDS', 10)
+
+
+def get_tau():
+    return getattr(settings, 'BLOG_POPULARITY_HALF_LIFE', 60 * 60 * 24 * 3) / math.log(2)
+
+
+def count_view(response, post_id):
+    setattr(response, VIEW_ATTR, post_id)
+    return response
+
+
+def is_countable(request):
+    if request.method != 'GET':
+        return False
+    # 브라우저의 미리 가져오기(prefetch)는 실제로 본 것이 아니다.
+    if 'prefetch' in request.META.get('HTTP_PURPOSE', '') + request.META.get('HTTP_SEC_PURPOSE', ''):
+        return False
+    user_agent = request.META.get('HTTP_USER_AGENT', '')
+    return bool(user_agent) and not BOT_RE.search(user_agent)
+
+
+class ViewCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.last_flush = time.monotonic()
+
+    def add(self, post_id):
+        """조회 하나를 세고, 기록할 때가 되었으면 True"""
+        with self.lock:
+            self.pending[post_id] += 1
+            return time.monotonic() - self.last_flush >= get_flush_seconds()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        # 모아 둔 조회는 모두 지금 본 것으로 친다. log(n * exp(지금 / tau)) = 지금 / tau + log(n)
+        now = time.time() / get_tau()
+        params = [(count, now + math.log(count), post_id) for post_id, count in pending.items()]
+        sql = UPSERT_SQL.format(table=PostStats._meta.db_table, post_table=Post._meta.db_table)
+        try:
+            # 라우터를 거치면 지금 요청이 쓰기를 한 것으로 기록되므로(복제본 고정) default 연결을 바로 쓴다.
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+                    cursor.executemany(sql, params)
+        except DatabaseError:
+            # 잠금 등으로 실패하면 다음 번에 다시 기록한다.
+            logger.warning('view count flush failed', exc_info=True)
+            with self.lock:
+                self.pending.update(pending)
+            return 0
+        # 캐시해 둔 글의 stats(조회수)도 바뀌었다.
+        objectcache.invalidate(Post, *pending)
+        return sum(pending.values())
+
+
+counter = ViewCounter()
+
+
+@atexit.register
+def flush_on_exit():
+    """프로세스(worker)가 끝날 때 모아 둔 조회를 기록한다. (my_proj.asgi 의 lifespan.shutdown 에서도 부른다)"""
+    try:
+        counter.flush()
+    except Exception:
+        logger.warning('view count flush on exit failed', exc_info=True)
+
+
+def invalidate_popular_posts():
+    cache.delete(POPULAR_POSTS_CACHE_KEY)
+
+
+def get_popular_posts():
+    posts = cache.get(POPULAR_POSTS_CACHE_KEY)
+    if posts is None:
+        rows = PostStats.objects.select_related('post').only('post__title', 'post__created').order_by('-popularity')
+        posts = [row.post for row in rows[:POPULAR_POSTS_COUNT]]
+        cache.set(POPULAR_POSTS_CACHE_KEY, posts, POPULAR_POSTS_CACHE_TIMEOUT)
+    return posts
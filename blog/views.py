@@ -1,51 +1,123 @@
+from datetime import date
+
 from django.shortcuts import render, redirect
 from .models import Post, Category, Tag, Comment
 from django.views.generic import ListView, DetailView, UpdateView, CreateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q
+from django.utils.http import urlencode
+from basecamp.routers import use_replica
+from .archive import get_month_range, get_category_archive_list
+from .avatars import attach_avatar_urls
+from .conditional import ConditionalGetMixin, get_list_validator, get_post_versions, get_versions_of, make_post_validator
 from .forms import CommentForm
+from .objectcache import get_object, get_by_slug
+from .pagecache import PageCacheMixin, category_list_tag, tag_list_tag, get_card_tags
+from .pagination import CursorPaginationMixin, paginate_comments
+from .related import get_related_posts
+from .search import search_posts
+from .viewcount import count_view
+
+COMMENTS_PER_PAGE = 20
 
 
 # Create your views here.
-class PostList(ListView):
+class PostList(ConditionalGetMixin, PageCacheMixin, CursorPaginationMixin, ListView):
     model = Post
     paginate_by = 5
+    use_replica = True  # 읽기 전용 복제본에서 읽는다. (basecamp/routers.py)
 
-    # 작성일을 기준 역순 정렬 (models.py 에서 동작하도록 수정)
-    # def get_queryset(self):
-    #     return Post.objects.order_by('-created')
+    # 작성일을 기준 역순 정렬은 models.py 의 Meta.ordering, 카드에 필요한 필드/관계는 for_list() 가 가져온다.
+    def get_queryset(self):
+        return Post.objects.for_list()
 
-    def get_context_data(self, *, object_list=None, **kwargs):
-        context = super(PostList, self).get_context_data(**kwargs)
-        context['category_list'] = Category.objects.all()
-        context['posts_without_category'] = Post.objects.filter(category=None).count()
+    # 사이드바(category_list, posts_without_category)는 blog.context_processors.sidebar 가 채운다.
 
-        return context
+    def get_validator(self):
+        return get_list_validator(self.get_queryset())
+
+    def get_page_cache_tags(self, context):
+        return ['list', 'sidebar'] + get_card_tags(context['object_list'])
 
 
 class PostSearch(PostList):
+    # 검색 결과는 created 순이 아니라 검색 순위 순이므로 ?page=N 으로 넘긴다.
+    cursor_pagination = False
+    conditional_get = False
+
     def get_queryset(self):
         q = self.kwargs['q']
-        object_list = Post.objects.filter(Q(title__contains=q) | Q(content__contains=q))
+        object_list = search_posts(Post.objects.for_list(), q)
         return object_list
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super(PostSearch, self).get_context_data()
         context['search_info'] = 'Search: "{}"'.format(self.kwargs['q'])
+        context['search_count'] = self.object_list.count()
         return context
 
 
-class PostDetail(DetailView):
+def get_comment_queryset(post_pk):
+    return Comment.objects.filter(post_id=post_pk).select_related('author').only(
+        'post', 'text_html', 'created_at', 'author', 'author__username'
+    )
+
+
+def get_comment_context(post_pk, cursor=None):
+    comments, next_cursor = paginate_comments(get_comment_queryset(post_pk), cursor, COMMENTS_PER_PAGE)
+    # 아바타 URL 은 페이지의 댓글 작성자 전체를 한 번에 (캐시에서) 가져온다.
+    attach_avatar_urls(comments)
+    next_comments_url = None
+    if next_cursor:
+        next_comments_url = '/blog/{}/comments/?{}'.format(post_pk, urlencode({'cursor': next_cursor}))
+    return {
+        'comments': comments,
+        'next_comments_url': next_comments_url,
+    }
+
+
+class PostDetail(ConditionalGetMixin, PageCacheMixin, DetailView):
     model = Post
+    use_replica = True
+
+    def get_object(self, queryset=None):
+        # 작성자, 카테고리, 태그까지 같이 읽어 둔 글을 캐시에서 가져온다. (blog.objectcache)
+        # 캐시의 글이 ETag 를 만든 DB 의 글과 다르면(다른 프로세스에서 바뀐 것) 다시 읽어서 ETag 와 본문을 맞춘다.
+        versions = self.post_versions
+        return get_object(Post, self.kwargs['pk'], is_current=lambda post: get_versions_of(post) == versions)
+
+    def get_validator(self):
+        self.post_versions = get_post_versions(self.kwargs['pk'])
+        return make_post_validator(self.kwargs['pk'], self.post_versions)
+
+    def get(self, request, *args, **kwargs):
+        response = super(PostDetail, self).get(request, *args, **kwargs)
+        # 조회수는 ViewCountMiddleware 가 모아 두었다가 기록한다. (304 도 센다)
+        return count_view(response, self.kwargs['pk'])
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super(PostDetail, self).get_context_data(**kwargs)
-        context['category_list'] = Category.objects.all()
-        context['posts_without_category'] = Post.objects.filter(category=None).count()
         context['comment_form'] = CommentForm()
+        # 댓글은 처음 COMMENTS_PER_PAGE 개만 넣고, 나머지는 comment_list 로 나눠서 가져온다.
+        context.update(get_comment_context(self.object.pk))
+        context['related_posts'] = get_related_posts(self.object.pk)
 
         return context
 
+    def get_page_cache_tags(self, context):
+        tags = ['post:{}'.format(self.object.pk), 'comments:{}'.format(self.object.pk), 'sidebar']
+        return tags + ['tag:{}'.format(tag.pk) for tag in self.object.tags.all()]
+
+
+@use_replica
+def comment_list(request, pk):
+    get_object(Post, pk)
+    request.page_cache_tags = ['post:{}'.format(pk), 'comments:{}'.format(pk)]
+    return render(
+        request,
+        'blog/comment_list.html',
+        get_comment_context(pk, request.GET.get('cursor'))
+    )
+
 
 class PostCreate(LoginRequiredMixin, CreateView):
     model = Post
@@ -70,51 +142,97 @@ class PostUpdate(UpdateView):
     ]
 
 
-class PostListByCategory(ListView):
+class PostListByCategory(ConditionalGetMixin, PageCacheMixin, CursorPaginationMixin, ListView):
+    use_replica = True
+
     def get_queryset(self):
         slug = self.kwargs['slug']  # kwargs: 딕셔너리 형태로 입력 가능 하게 해준다.
 
         if slug == '_none':
             category = None
         else:
-            category = Category.objects.get(slug=slug)
-        return Post.objects.filter(category=category).order_by('-created')
+            category = get_by_slug(Category, slug)
+        return Post.objects.for_list().filter(category=category)
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super(type(self), self).get_context_data(**kwargs)
-        context['category_list'] = Category.objects.all()
-        context['posts_without_category'] = Post.objects.filter(category=None).count()
 
         slug = self.kwargs['slug']
 
         if slug == '_none':
             context['category'] = '미분류'
         else:
-            category = Category.objects.get(slug=slug)
+            category = get_by_slug(Category, slug)
             context['title'] = 'Blog - {}'.format(category.name)
             context['category'] = category
+            # 사이드바의 보관함은 이 카테고리의 월별 글 수로 바꾼다.
+            context['archive_list'] = get_category_archive_list(slug)
         return context
 
+    def get_validator(self):
+        return get_list_validator(self.get_queryset())
+
+    def get_page_cache_tags(self, context):
+        category = context['category']
+        category_id = category.pk if isinstance(category, Category) else None
+        return [category_list_tag(category_id), 'sidebar'] + get_card_tags(context['object_list'])
+
+
+class PostListByTag(ConditionalGetMixin, PageCacheMixin, CursorPaginationMixin, ListView):
+    use_replica = True
 
-class PostListByTag(ListView):
     def get_queryset(self):
         tag_slug = self.kwargs['slug']
-        tag = Tag.objects.get(slug=tag_slug)
+        tag = get_by_slug(Tag, tag_slug)
 
-        return tag.post_set.order_by('-created')
+        return Post.objects.for_list().filter(tags=tag)
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super(type(self), self).get_context_data(**kwargs)
-        context['category_list'] = Category.objects.all()
-        context['posts_without_category'] = Post.objects.filter(category=None).count()
         tag_slug = self.kwargs['slug']
-        context['tag'] = Tag.objects.get(slug=tag_slug)
+        context['tag'] = get_by_slug(Tag, tag_slug)
 
         return context
 
+    def get_validator(self):
+        return get_list_validator(self.get_queryset())
+
+    def get_page_cache_tags(self, context):
+        return [tag_list_tag(context['tag'].pk), 'sidebar'] + get_card_tags(context['object_list'])
+
+
+class PostListByMonth(ConditionalGetMixin, PageCacheMixin, CursorPaginationMixin, ListView):
+    """/blog/archive/<year>/<month>/, /blog/category/<slug>/archive/<year>/<month>/"""
+    use_replica = True
+
+    def get_queryset(self):
+        # created 인덱스로 그 달의 범위만 읽는다.
+        start, end = get_month_range(self.kwargs['year'], self.kwargs['month'])
+        queryset = Post.objects.for_list().filter(created__gte=start, created__lt=end)
+        if 'slug' in self.kwargs:
+            queryset = queryset.filter(category__slug=self.kwargs['slug'])
+        return queryset
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        context = super(type(self), self).get_context_data(**kwargs)
+        context['archive_month'] = date(self.kwargs['year'], self.kwargs['month'], 1)
+        if 'slug' in self.kwargs:
+            context['category'] = get_by_slug(Category, self.kwargs['slug'])
+            context['archive_list'] = get_category_archive_list(self.kwargs['slug'])
+        return context
+
+    def get_validator(self):
+        return get_list_validator(self.get_queryset())
+
+    def get_page_cache_tags(self, context):
+        tags = ['list', 'sidebar']
+        if 'slug' in self.kwargs:
+            tags.append(category_list_tag(context['category'].pk))
+        return tags + get_card_tags(context['object_list'])
+
 
 def new_comment(request, pk):
-    post = Post.objects.get(pk=pk)
+    post = get_object(Post, pk)
 
     if request.method == 'POST':
         comment_form = CommentForm(request.POST)
@@ -135,18 +253,18 @@ class CommentUpdate(UpdateView):
 
     def get_object(self, queryset=None):
         comment = super(CommentUpdate, self).get_object()
-        if comment.author != self.request.user:
+        # comment.author 를 읽으면 request.user 와 같은 사용자를 한 번 더 읽는다.
+        if comment.author_id != self.request.user.pk:
             raise PermissionError('Comment 수정 권한이 없습니다.')
         return comment
 
 
 def delete_comment(request, pk):
-    comment = Comment.objects.get(pk=pk)
-    post = comment.post
+    comment = get_object(Comment, pk)
 
-    if request.user == comment.author:
+    if request.user.pk == comment.author_id:
         comment.delete()
-        return redirect(post.get_absolute_url() + '#comment-list')
+        return redirect(Post(pk=comment.post_id).get_absolute_url() + '#comment-list')
     else:
         raise PermissionError('Comment 삭제 권한이 없습니다.')
 
@@ -9,8 +9,80 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_proj.settings')
 
-application = get_asgi_application()
+ASGI_URLCONF = 'my_proj.asgi_urls'
+
+
+class BlogASGIHandler(ASGIHandler):
+    # ASGI 로 들어온 요청은 blog 목록/상세를 async view 로 처리한다. (WSGI 는 my_proj/urls.py 그대로)
+    def create_request(self, scope, body_file):
+        request, error_response = super(BlogASGIHandler, self).create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = ASGI_URLCONF
+        return request, error_response
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.handle_lifespan(receive, send)
+        return await super(BlogASGIHandler, self).__call__(scope, receive, send)
+
+    async def handle_lifespan(self, receive, send):
+        # uvicorn 등은 worker 를 시작 / 끝낼 때 lifespan 을 보낸다. (Django 3.1 의 ASGIHandler 는 받지 않는다)
+        # 끝낼 때 모아 둔 조회수를 기록한다. (blog.viewcount)
+        from blog import viewcount
+
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await sync_to_async(viewcount.flush_on_exit, thread_sensitive=True)()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def send_response(self, response, send):
+        # Django 3.1 은 StreamingHttpResponse 의 본문을 event loop 에서 그대로 읽는다.
+        # feed / sitemap / export 는 본문을 읽으면서 쿼리를 실행하므로 (SynchronousOnlyOperation)
+        # 한 조각씩 view 를 실행한 sync thread 에서 꺼낸다. 나머지는 ASGIHandler.send_response 그대로.
+        if not response.streaming:
+            return await super(BlogASGIHandler, self).send_response(response, send)
+
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            response_headers.append((bytes(header), bytes(value)))
+        for c in response.cookies.values():
+            response_headers.append((b'Set-Cookie', c.output(header='').encode('ascii').strip()))
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers,
+        })
+
+        parts = iter(response)
+        next_part = sync_to_async(next, thread_sensitive=True)
+        while True:
+            part = await next_part(parts, None)
+            if part is None:
+                break
+            for chunk, _ in self.chunk_bytes(part):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def get_application():
+    # django.core.asgi.get_asgi_application() 과 같되 handler 만 바꾼다.
+    django.setup(set_prefix=False)
+    return BlogASGIHandler()
+
+
+application = get_application()
@@ -0,0 +1,12 @@
+"""
+ASGI 용 URL Configuration. (my_proj/asgi.py 에서 request.urlconf 로 지정한다)
+
+목록/상세 페이지는 blog.async_views 로 보내고 나머지는 my_proj/urls.py 를 그대로 쓴다.
+"""
+from django.urls import path, include
+
+from . import urls
+
+urlpatterns = [
+    path('blog/', include('blog.async_urls')),
+] + urls.urlpatterns
@@ -69,6 +69,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'basecamp.middleware.RequestTimingMiddleware',
+    'blog.middleware.ViewCountMiddleware',
+    'blog.middleware.PageCacheMiddleware',
+    'basecamp.middleware.ReplicaRoutingMiddleware',
+    'blog.middleware.ObjectCacheMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,6 +85,9 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'my_proj.urls'
 
+# 응답에 Server-Timing 헤더(쿼리 수, DB / Markdown / 템플릿 시간)를 붙인다. 로그('basecamp.timing')는 항상 남긴다.
+REQUEST_TIMING_HEADER = True
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -91,6 +99,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'blog.context_processors.sidebar',
             ],
         },
     },
@@ -102,13 +111,58 @@ WSGI_APPLICATION = 'my_proj.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# 연결마다 실행할 SQLite PRAGMA (basecamp/db.py)
+SQLITE_PRAGMAS = {
+    'busy_timeout': 20000,  # ms, OPTIONS['timeout'] 과 같게
+    'journal_mode': 'WAL',  # 읽기와 쓰기가 서로 막지 않는다.
+    'synchronous': 'NORMAL',  # WAL 에서는 NORMAL 이어도 DB 가 깨지지 않는다. (전원 장애 시 마지막 commit 만 잃을 수 있음)
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,  # 음수는 KiB 단위 (약 20MB)
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # 요청마다 새로 연결하지 않고 60초 동안 재사용한다. 재사용 전에 연결 상태를 확인한다. (basecamp/db.py)
+        # (SQLite 에서는 확인할 것이 없어 CONN_HEALTH_CHECKS 가 아무 일도 하지 않는다. 서버 DB 로 바꿨을 때 쓰인다)
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # 다른 연결이 쓰는 중이면 바로 'database is locked' 를 내지 않고 기다린다. (초)
+            'timeout': 20,
+        },
+        'PRAGMAS': SQLITE_PRAGMAS,
+        'TEST': {
+            # WAL / 동시 쓰기를 실제와 같게 시험하도록 메모리 DB 대신 파일을 쓴다.
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    # 읽기 전용 복제본. 로컬에서는 python manage.py sync_replica 로 db.sqlite3 를 복사한 파일로 흉내 낸다.
+    # DATABASE_REPLICAS 에 넣어야 실제로 쓰인다.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+        },
+        'PRAGMAS': SQLITE_PRAGMAS,
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db_replica.sqlite3',
+        },
+    },
 }
 
+DATABASE_ROUTERS = ['basecamp.routers.PrimaryReplicaRouter']
+
+# 목록/상세 view 가 읽을 복제본 alias 목록. 비어 있으면 모두 default 에서 읽는다.
+DATABASE_REPLICAS = []
+
+# 쓰기가 있었던 브라우저는 이 시간(초) 동안 복제본 대신 default 에서 읽는다. (복제 지연 대비)
+DATABASE_PRIMARY_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -155,13 +209,60 @@ AUTHENTICATION_BACKENDS = [
 # https://docs.djangoproject.com/en/3.1/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, '_static')
+
+# 배포(DEBUG = False)에서는 collectstatic 때 해시 파일명 + .gz/.br 을 만든다.
+# 개발 서버는 app 의 static 폴더를 그대로 쓴다.
+if not DEBUG:
+    STATICFILES_STORAGE = 'basecamp.storage.CompressedManifestStaticFilesStorage'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, '_media')
 MEDIA_URL = '/media/'
 
+# 업로드 파일 전송을 앞단 서버에 넘길 때: None, 'x-accel-redirect'(nginx), 'x-sendfile'(apache)
+MEDIA_SENDFILE_BACKEND = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/_media/'
+
 # Markdown settings
 MARKDOWNX_MEDIA_PATH = datetime.now().strftime('markdownx/%Y/%m/%d')
 
+# Cache
+# page cache / 사이드바 / 아바타 / ETag 의 공통 변경 시각은 signal 과 관리 명령(import_posts, rerender_markdown ...)이
+# 캐시의 값을 바꿔 무효화하므로 모든 worker 와 관리 명령이 같은 캐시를 봐야 한다.
+# (프로세스마다 따로인 LocMemCache 로 바꾸면 page cache 는 꺼진다 - blog.pagecache.get_timeout)
+#
+# 파일 캐시는 개발 / 작은 서버 한 대용이다. 저장할 때마다 디렉터리 전체를 훑고(MAX_ENTRIES 를 넘으면 무작위로 지운다)
+# 파일을 읽고 쓰므로, 운영에서는 memcached / redis 로 바꾼다. (서버가 여러 대이면 반드시)
+# 테스트는 임시 디렉터리를 쓴다. (basecamp.testing.TestRunner)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {
+            # 기본값 300 이면 page cache 몇 페이지만으로 넘쳐서 태그 버전까지 무작위로 지워진다.
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+TEST_RUNNER = 'basecamp.testing.TestRunner'
+
+# Blog page cache (로그인하지 않은 사용자용, 0 이면 사용하지 않음. 공유 캐시가 있어야 한다)
+BLOG_PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Post.head_image 축소본을 만드는 worker 프로세스 수 (0 이면 저장할 때 바로 만든다)
+BLOG_THUMBNAIL_WORKERS = 2
+
+# 조회수: 프로세스마다 모아 두었다가 이 간격(초)마다 한 번에 기록한다.
+# (화면의 조회수는 이 간격 + BLOG_PAGE_CACHE_TIMEOUT 만큼 늦을 수 있다 - blog/viewcount.py)
+BLOG_VIEW_COUNT_FLUSH_SECONDS = 10
+# 인기 글 점수의 반감기(초)
+BLOG_POPULARITY_HALF_LIFE = 60 * 60 * 24 * 3
+
+# pk / slug 로 찾는 글, 카테고리, 태그, 댓글을 프로세스마다 이 개수만큼 이 시간(초) 동안 기억한다. (blog.objectcache)
+BLOG_OBJECT_CACHE_SIZE = 1000
+BLOG_OBJECT_CACHE_TIMEOUT = 60
+
 # Crispy settings
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
@@ -170,3 +271,22 @@ ACCOUNT_EMAIL_REQUIRED = True
 ACCOUNT_EMAIL_VERIFICATION = 'none'  # Email 유효성 검사
 SITE_ID = 1
 LOGIN_REDIRECT_URL = '/blog/'
+
+# Logging
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # 요청마다 JSON 한 줄(INFO)과 중복 쿼리 경고(WARNING). 개발 중에는 경고만 본다. (basecamp/instrumentation.py)
+        'basecamp.timing': {
+            'handlers': ['console'],
+            'level': 'WARNING' if DEBUG else 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -13,17 +13,33 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
-from django.conf.urls.static import static
+from django.urls import path, re_path, include
 from django.conf import settings
+from basecamp.media import serve_media, serve_static
+from blog import feeds
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('blog/', include('blog.urls')),
+    path('api/v1/', include('blog.api_urls')),
     path('markdownx/', include('markdownx.urls')),
     path('accounts/', include('allauth.urls')),
+    path('sitemap.xml', feeds.sitemap_index),
+    path('sitemap-posts-<int:page>.xml', feeds.sitemap_posts),
+    path('sitemap-taxonomy.xml', feeds.sitemap_taxonomy),
     path('', include('basecamp.urls')),
 ]
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# 업로드 파일: Range / 조건부 요청 / 캐시 헤더 처리, 설정에 따라 X-Accel-Redirect, X-Sendfile 로 넘긴다.
+urlpatterns += [
+    re_path(r'^{}(?P<path>.+)$'.format(re.escape(settings.MEDIA_URL.lstrip('/'))), serve_media),
+]
+
+# 정적 파일: 개발 서버(DEBUG)는 staticfiles 앱이 내려주고, 그 외에는 collectstatic 결과를 미리 압축된 파일과 함께 내려준다.
+if not settings.DEBUG:
+    urlpatterns += [
+        re_path(r'^{}(?P<path>.+)$'.format(re.escape(settings.STATIC_URL.lstrip('/'))), serve_static),
+    ]